@@ -0,0 +1,75 @@
+'''
+Cost of NetworkCheckpoint.save for the polychrony network
+
+Builds the polychrony network (RingBufferDelayConnection + RingBufferSTDP)
+with 1000 neurons as in simulations/polychrony.py and scaled up to 100k
+neurons with 100 synapses per neuron, runs it briefly so that traces
+and delay buffers are filled, then reports the time per checkpoint and
+the size of a checkpoint.  The first save of each slot also writes the
+static connectivity arrays, so it is reported separately.
+
+usage: python checkpoint.py [checkpoint_dir]
+'''
+import os
+import sys
+import time
+import shutil
+import tempfile
+import numpy as np
+from brian import *
+from cortex import *
+
+
+def build(N, p):
+    np.random.seed(1)
+    sim_clock = Clock(dt=.5*ms)
+    Ne = int(.8*N)
+    G = IzhikevichGroup(N, 'a', 0.2/ms, -65*mV, 'd', 1*ms, 1*ms,
+                        engine='numpy', clock=sim_clock)
+    Ge, Gi = G.subgroup(Ne), G.subgroup(N - Ne)
+    Ge.a, Ge.d = 0.02/ms, 8*mV/ms
+    Gi.a, Gi.d = 0.1/ms, 2*mV/ms
+    Ce = RingBufferDelayConnection(Ge, G, 'ge', max_delay=20*ms)
+    Ce.connect_random(Ge, G, p, weight=6.0*mV, delay=(0*ms, 20*ms), seed=2)
+    Ci = RingBufferDelayConnection(Gi, Ge, 'gi', max_delay=1*ms)
+    Ci.connect_random(Gi, Ge, p, weight=5.0*mV, delay=1*ms, seed=3)
+    stdp = RingBufferSTDP(Ce, 20*ms, 20*ms, .1, -.1, wmax=10*mV,
+                          interactions='nearest')
+
+    I = G.state_('I')
+    @network_operation(Clock(dt=1*ms, order=-1))
+    def thalamic_input():
+        I[:] = 0
+        I[np.random.randint(N, size=max(1, N//1000))] = 20e-9
+
+    net = Network(G, Ce, Ci, stdp, thalamic_input)
+    return net, [G, Ce, Ci, stdp]
+
+
+def bench(N, p, path, repeats=5):
+    net, objects = build(N, p)
+    net.run(50*ms)
+    checkpoint = NetworkCheckpoint(path, net, objects)
+    times = []
+    for _ in range(2 + repeats):
+        start = time.time()
+        checkpoint.save()
+        times.append(time.time() - start)
+    size = sum(os.path.getsize(os.path.join(checkpoint.latest(), f))
+               for f in os.listdir(checkpoint.latest()))
+    start = time.time()
+    checkpoint.restore()
+    restored = time.time() - start
+    return max(times[:2]), np.mean(times[2:]), restored, size
+
+
+if __name__ == '__main__':
+    root = sys.argv[1] if len(sys.argv) > 1 else tempfile.mkdtemp()
+    print '%8s %10s %12s %12s %12s' % ('N', 'size (MB)', 'first (ms)',
+                                       'save (ms)', 'restore (ms)')
+    for N, p in [(1000, .05), (100000, 100./100000)]:
+        path = os.path.join(root, 'polychrony_%d' % N)
+        first, save, restored, size = bench(N, p, path)
+        print '%8d %10.1f %12.1f %12.1f %12.1f' % (N, size/1e6, first*1e3,
+                                                  save*1e3, restored*1e3)
+        shutil.rmtree(path)
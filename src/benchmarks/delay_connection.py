@@ -0,0 +1,63 @@
+'''
+Benchmark of RingBufferDelayConnection against DelayConnection
+
+Runs the excitatory part of the polychrony network (random delays of
+1-20 ms at dt = 0.5 ms, 2% of the neurons driven each ms) with either
+connection type, without STDP, and reports run time and whether the
+spike trains are identical.  Neurons use the numpy engine so that the
+run time is dominated by spike propagation.
+
+usage: python delay_connection.py [sim_len_ms]
+'''
+import sys
+import time
+import numpy as np
+from brian import *
+from cortex import IzhikevichGroup, RingBufferDelayConnection
+from utils import random_weights_delays, connect_csr
+
+
+def bench(N, p, kind, duration):
+    np.random.seed(2)
+    sim_clock = Clock(dt=.5*ms)
+    G = IzhikevichGroup(N, 0.02/ms, 0.2/ms, -65*mV, 8*mV/ms, 1*ms, 1*ms,
+                        engine='numpy', clock=sim_clock)
+    Ne = int(.8*N)
+    Ge = G.subgroup(Ne)
+    start = time.time()
+    w,d = random_weights_delays(Ne, N, p, 6.0*mV, 20*ms, seed=1)
+    if kind == 'ring':
+        C = RingBufferDelayConnection(Ge, G, max_delay=20*ms)
+        C.connect(Ge, G, w, delay=d)
+    else:
+        C = DelayConnection(Ge, G, max_delay=20*ms)
+        connect_csr(C, Ge, G, w, delay=d)
+    C.compress()
+    built = time.time() - start
+
+    I = G.state_('I')
+    @network_operation(Clock(dt=1*ms, order=-1))
+    def thalamic_input():
+        I[:] = 0
+        I[np.random.randint(N, size=N//50)] = 20e-9
+
+    M = SpikeMonitor(G)
+    start = time.time()
+    Network(G, C, thalamic_input, M).run(duration)
+    return built, time.time() - start, M.spikes
+
+
+if __name__ == '__main__':
+    sim_len = float(sys.argv[1]) if len(sys.argv) > 1 else 500.
+    print '%8s %8s %10s %10s %10s' % ('N', 'kind', 'build (s)', 'run (s)',
+                                     'spikes')
+    for N, p in [(1000, .05), (10000, .01)]:
+        results = {}
+        for kind in ['brian', 'ring']:
+            built, ran, spikes = bench(N, p, kind, sim_len*ms)
+            results[kind] = ran, spikes
+            print '%8d %8s %10.2f %10.2f %10d' % (N, kind, built, ran,
+                                                 len(spikes))
+        print '%8d identical spikes: %s, speedup %.2fx' % (
+            N, results['brian'][1] == results['ring'][1],
+            results['brian'][0]/results['ring'][0])
@@ -0,0 +1,55 @@
+'''
+Benchmark of InputSchedule against rebuilding the input array
+
+Drives one random neuron of N with 20 nA every ms, either as in
+polychrony.py before (np.zeros_like and reassignment of G.I in a network
+operation) or with an InputSchedule of random_pulses, and reports the
+time per ms of input for growing N (minus the time of the group
+alone).  Also gives the memory of dense noise input to 1000 neurons
+over the 200 s of polychrony.py, as a TimedArray (steps x N) against
+one block of 100 steps of a gaussian_noise schedule.
+
+usage: python input_schedule.py [sim_len_ms]
+'''
+import sys
+import time
+import numpy as np
+from brian import *
+from utils import InputSchedule, random_pulses, gaussian_noise
+
+
+def bench(N, kind, duration):
+    clk = Clock(dt=1*ms)
+    G = NeuronGroup(N, 'I : amp', clock=clk)
+    if kind == 'none':
+        thalamic_input = []
+    elif kind == 'zeros_like':
+        @network_operation(clk)
+        def thalamic_input():
+            stim = np.zeros_like(G.I)
+            stim[np.random.randint(stim.shape[0])] = 20 * nA
+            G.I = stim
+    else:
+        thalamic_input = InputSchedule(G, 'I', random_pulses(N, 20*nA, seed=1),
+                                       clock=clk)
+    net = Network(G, thalamic_input)
+    start = time.time()
+    net.run(duration)
+    return (time.time() - start) / (float(duration) / 1e-3)
+
+
+if __name__ == '__main__':
+    sim_len = float(sys.argv[1]) if len(sys.argv) > 1 else 2000.
+    print '%10s %14s %14s' % ('N', 'zeros_like (us)', 'schedule (us)')
+    for N in [1000, 100000, 1000000]:
+        base = bench(N, 'none', sim_len*ms)
+        old = bench(N, 'zeros_like', sim_len*ms) - base
+        new = bench(N, 'schedule', sim_len*ms) - base
+        print '%10d %14.1f %14.1f' % (N, old*1e6, new*1e6)
+    N, steps, block = 1000, 200000, 100
+    source = gaussian_noise(N, 5*nA, seed=1)
+    kept = sum(a.nbytes for a in source(0, block))
+    print
+    print 'gaussian input to %d neurons for %d ms:' % (N, steps)
+    print '  TimedArray %.1f MB, schedule block %.1f MB' % (
+        steps * N * 8 / 2.**20, kept / 2.**20)
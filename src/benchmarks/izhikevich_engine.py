@@ -0,0 +1,105 @@
+'''
+Benchmark of IzhikevichGroup(engine='numpy') against engine='brian'
+
+Runs the 1000 neuron network of Izhikevich (2003), as in
+brian_practice/izhikevich_2003_net.py, and a 100k neuron scale-up
+with sparse connectivity (100 synapses per neuron), both for
+sim_len ms so that the large network fires too.  Synapses go
+through ge/gi with taue = taui = 1 ms, which integrates to the same
+jump in v as the direct 'v' connections of the original script.
+
+Before timing, both engines are run on an uncoupled group with
+constant currents to check that they agree.
+
+usage: python izhikevich_engine.py [sim_len_ms]
+'''
+import sys
+import time
+import numpy as np
+from brian import *
+from cortex import IzhikevichGroup
+from utils import sparse_rand_indices, connect_csr
+from scipy.sparse import csr_matrix
+
+
+def check(duration=500*ms):
+    '''max |v| difference and equality of spikes between engines'''
+    results = []
+    for engine in ['brian', 'numpy']:
+        clk = Clock(dt=.5*ms)
+        G = IzhikevichGroup(200, 0.02/ms, 0.2/ms, -65*mV, 8*mV/ms, 1*ms,
+                            1*ms, rand_init=False, engine=engine, clock=clk)
+        G.v, G.u = -65*mV, -13*mV/ms
+        G.I = linspace(0, 15, len(G))*nA
+        M = SpikeMonitor(G)
+        Mv = StateMonitor(G, 'v', record=True, clock=clk)
+        Network(G, M, Mv).run(duration)
+        results.append((M.spikes, Mv.values))
+    (s0, v0), (s1, v1) = results
+    return s0 == s1, abs(v0-v1).max()
+
+
+def build(N, engine, p):
+    '''the Izhikevich (2003) network with N neurons, connection prob. p'''
+    sim_clock = Clock(dt=.5*ms)
+    input_clock = Clock(dt=1*ms)
+    Ne = int(.8*N)
+    Ni = N - Ne
+    re, ri = rand(Ne), rand(Ni)
+    a = hstack((0.02*ones(Ne), 0.02+0.08*ri))/ms
+    b = hstack((0.2*ones(Ne), 0.25-0.05*ri))/ms
+    c = hstack((-65+15*re**2, -65*ones(Ni)))*mV
+    d = hstack((8-6*re**2, 2*ones(Ni)))*mV/ms
+    G = IzhikevichGroup(N, a, b, c, d, 1*ms, 1*ms, engine=engine,
+                        clock=sim_clock)
+    Ge, Gi = G.subgroup(Ne), G.subgroup(Ni)
+
+    Ce, Ci = Connection(Ge, G, 'ge'), Connection(Gi, G, 'gi')
+    if p >= 1:
+        Ce.connect(Ge, G, .4*rand(Ne, N)*mV)
+        Ci.connect(Gi, G, 1*rand(Ni, N)*mV)
+    else:
+        for C, P, w in [(Ce, Ge, .4*mV), (Ci, Gi, 1*mV)]:
+            indptr, indices, rng = sparse_rand_indices(len(P), N, p)
+            data = float(w) * rng.rand(len(indices))
+            connect_csr(C, P, G, csr_matrix((data, indices, indptr),
+                                            (len(P), N)))
+
+    I = G.state_('I')
+    @network_operation(input_clock)
+    def thalamic_input():
+        I[:Ne] = 5e-9*randn(Ne)
+        I[Ne:] = 2e-9*randn(Ni)
+
+    M = SpikeMonitor(G)
+    return Network(G, Ce, Ci, thalamic_input, M), M
+
+
+def bench(N, engine, p, duration):
+    np.random.seed(1)
+    start = time.time()
+    net, M = build(N, engine, p)
+    net.prepare()
+    built = time.time() - start
+    start = time.time()
+    net.run(duration)
+    return built, time.time() - start, M.nspikes
+
+
+if __name__ == '__main__':
+    sim_len = float(sys.argv[1]) if len(sys.argv) > 1 else 1000.
+    same_spikes, dv = check()
+    print 'uncoupled check: identical spikes %s, max |dv| = %g V' % (
+        same_spikes, dv)
+    print '%8s %7s %8s %10s %10s %10s' % ('N', 'engine', 'sim (ms)',
+                                         'build (s)', 'run (s)', 'spikes')
+    for N, p, duration in [(1000, 1., sim_len),
+                           (100000, 100./100000, sim_len)]:
+        times = {}
+        for engine in ['brian', 'numpy']:
+            built, ran, nspikes = bench(N, engine, p, duration*ms)
+            times[engine] = ran
+            print '%8d %7s %8d %10.2f %10.2f %10d' % (N, engine, duration,
+                                                     built, ran, nspikes)
+        print '%8d speedup of numpy engine: %.2fx' % (
+            N, times['brian']/times['numpy'])
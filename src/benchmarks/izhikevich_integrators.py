@@ -0,0 +1,113 @@
+'''
+Accuracy and speed of the IzhikevichGroup engines at dt = 0.5 and 1 ms
+
+Single neurons: the six usual firing classes (RS, IB, CH, FS, LTS, RZ
+parameters) at 9 constant currents from 4 to 20 nA, for 1 s, with
+izhikevich_sweep.  Spike trains are compared to a 0.01 ms Euler
+reference and to the 0.5 ms Euler baseline: relative error of the
+spike count, of the mean of the last 4 interspike intervals, and mean
+error of the first spike time.
+
+Network: the Izhikevich (2003) network of 1000 neurons with noisy
+thalamic input (as in benchmarks/izhikevich_engine.py), for sim_len ms.
+Spike times of a chaotic network cannot be compared one by one, so the
+mean rate and the correlation of the spike counts per neuron with the
+0.5 ms Euler run are reported, with the run time.
+
+usage: python izhikevich_integrators.py [sim_len_ms]
+'''
+import sys
+import time
+import numpy as np
+from brian import *
+from cortex import IzhikevichGroup, izhikevich_sweep
+
+CLASSES = [(0.02, 0.2, -65, 8), (0.02, 0.2, -55, 4), (0.02, 0.2, -50, 2),
+           (0.1, 0.2, -65, 8), (0.02, 0.25, -65, 8), (0.1, 0.25, -65, 2)]
+CURRENTS = np.linspace(4, 20, 9)
+RUNS = [('numpy', .5), ('numpy', 1.), ('exponential', .5),
+        ('exponential', 1.)]
+
+
+def errors(spikes, ref):
+    '''spike count, interspike interval and first spike errors'''
+    count, isi, first = [], [], []
+    for s, r in zip(spikes, ref):
+        count.append(abs(float(len(s)) - len(r)) / max(len(r), 1))
+        if len(s) > 4 and len(r) > 4:
+            isi.append(abs(np.diff(s[-5:]).mean() / np.diff(r[-5:]).mean()
+                           - 1))
+        if len(s) and len(r):
+            first.append(abs(s[0] - r[0]))
+    return np.mean(count), np.mean(isi), np.mean(first)
+
+
+def single_neurons():
+    params = np.array([p for p in CLASSES for I in CURRENTS])
+    stimulus = np.repeat(np.tile(CURRENTS, len(CLASSES))[:, None], 1000, 1)
+    def sweep(engine, dt):
+        start = time.time()
+        _, spikes, _ = izhikevich_sweep(params, stimulus, 1*second,
+                                        dt=dt*ms, record=(), engine=engine,
+                                        v0=-65*mV)
+        return spikes, time.time() - start
+    ref, _ = sweep('numpy', .01)
+    base, _ = sweep('numpy', .5)
+    print 'single neurons, errors against the 0.01 ms Euler reference ' \
+          '| the 0.5 ms Euler baseline'
+    print '%12s %5s %8s %8s %9s | %8s %8s %9s %8s' % (
+        'engine', 'dt', 'count', 'ISI', 'first ms', 'count', 'ISI',
+        'first ms', 'run (s)')
+    for engine, dt in RUNS:
+        spikes, ran = sweep(engine, dt)
+        e_ref, e_base = errors(spikes, ref), errors(spikes, base)
+        print '%12s %5.2g %8.3f %8.3f %9.2f | %8.3f %8.3f %9.2f %8.2f' % (
+            engine, dt, e_ref[0], e_ref[1], e_ref[2] * 1e3, e_base[0],
+            e_base[1], e_base[2] * 1e3, ran)
+
+
+def network(engine, dt, duration, N=1000):
+    '''spike counts per neuron and run time of the 2003 network'''
+    np.random.seed(1)
+    sim_clock, input_clock = Clock(dt=dt*ms), Clock(dt=1*ms)
+    Ne, Ni = int(.8*N), N - int(.8*N)
+    re, ri = rand(Ne), rand(Ni)
+    a = hstack((0.02*ones(Ne), 0.02+0.08*ri))/ms
+    b = hstack((0.2*ones(Ne), 0.25-0.05*ri))/ms
+    c = hstack((-65+15*re**2, -65*ones(Ni)))*mV
+    d = hstack((8-6*re**2, 2*ones(Ni)))*mV/ms
+    G = IzhikevichGroup(N, a, b, c, d, 1*ms, 1*ms, engine=engine,
+                        clock=sim_clock)
+    Ge, Gi = G.subgroup(Ne), G.subgroup(Ni)
+    Ce, Ci = Connection(Ge, G, 'ge'), Connection(Gi, G, 'gi')
+    Ce.connect(Ge, G, .4*rand(Ne, N)*mV)
+    Ci.connect(Gi, G, 1*rand(Ni, N)*mV)
+    I = G.state_('I')
+    noise = np.random.RandomState(2)
+    @network_operation(input_clock, when='start')
+    def thalamic_input():
+        I[:Ne] = 5e-9*noise.randn(Ne)
+        I[Ne:] = 2e-9*noise.randn(Ni)
+    M = SpikeCounter(G)
+    net = Network(G, Ce, Ci, thalamic_input, M)
+    net.prepare()
+    start = time.time()
+    net.run(duration)
+    return np.array(M.count, dtype=float), time.time() - start
+
+
+if __name__ == '__main__':
+    sim_len = float(sys.argv[1]) if len(sys.argv) > 1 else 2000.
+    single_neurons()
+    print
+    print 'network of 1000 neurons, %d ms' % sim_len
+    print '%12s %5s %10s %12s %8s' % ('engine', 'dt', 'rate (Hz)',
+                                      'count corr.', 'run (s)')
+    base = None
+    for engine, dt in RUNS:
+        counts, ran = network(engine, dt, sim_len*ms)
+        if base is None:
+            base = counts
+        print '%12s %5.2g %10.2f %12.3f %8.2f' % (
+            engine, dt, counts.mean() / (sim_len / 1e3),
+            np.corrcoef(counts, base)[0, 1], ran)
@@ -0,0 +1,83 @@
+'''
+Micro-benchmark of utils.IzhikevichReset
+
+Compares the reset against the original try/except implementation for
+groups of 1k, 100k and 1M neurons, with c,d as scalars, per-neuron
+arrays and state variables.  About 1% of the group spikes per call.
+
+usage: python izhikevich_reset.py [calls]
+'''
+import sys
+import time
+import numpy as np
+from brian import *
+from utils import IzhikevichReset
+
+
+class LegacyIzhikevichReset(object):
+    '''the original reset, kept here as the reference'''
+    def __init__(self, c, d):
+        self.c = c
+        self.d = d
+
+    def __call__(self, P):
+        spikes = P.LS.lastspikes()
+        if len(spikes) == 0:
+            return
+        try:
+            P.v[spikes] = P.c[spikes]
+            P.u[spikes] += P.d[spikes]
+        except IndexError:
+            P.v[spikes] = P.c
+            P.u[spikes] += P.d
+        except AttributeError:
+            try:
+                P.v[spikes] = self.c
+                P.u[spikes] += self.d
+            except (IndexError, ValueError): # ValueError on newer numpy
+                P.v[spikes] = self.c[spikes]
+                P.u[spikes] += self.d[spikes]
+
+
+def make_group(N, with_params):
+    eqs = '''
+          dv/dt = 0*volt/second : volt
+          du/dt = 0*volt/second**2 : volt/second
+          '''
+    if with_params:
+        eqs += '''
+               c : volt
+               d : volt/second
+               '''
+    G = NeuronGroup(N, eqs)
+    if with_params:
+        G.c, G.d = -65*mV, 8*mV/ms
+    G.LS.push(np.sort(np.random.permutation(N)[:max(N//100,1)]))
+    return G
+
+
+def time_reset(reset, G, calls):
+    start = time.time()
+    for _ in xrange(calls):
+        reset(G)
+    return (time.time()-start)/calls
+
+
+if __name__ == '__main__':
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    print '%8s %8s %14s %14s %8s' % ('N', 'layout', 'legacy (us)',
+                                     'new (us)', 'speedup')
+    for N in [1000, 100000, 1000000]:
+        c, d = (-65+15*rand(N)**2)*mV, (8-6*rand(N)**2)*mV/ms
+        layouts = [('scalar', -65*mV, 8*mV/ms, False),
+                   ('array', c, d, False),
+                   ('state', 'c', 'd', True)]
+        for name, c, d, with_params in layouts:
+            G = make_group(N, with_params)
+            legacy_c = c if not with_params else -65*mV
+            legacy_d = d if not with_params else 8*mV/ms
+            t_old = time_reset(LegacyIzhikevichReset(legacy_c, legacy_d), G,
+                               calls)
+            t_new = time_reset(IzhikevichReset(c, d), G, calls)
+            print '%8d %8s %14.1f %14.1f %8.1f' % (N, name, 1e6*t_old,
+                                                   1e6*t_new, t_old/t_new)
@@ -0,0 +1,58 @@
+'''
+Benchmark of izhikevich_sweep against one network per parameter set
+
+Simulates K random (a, b, c, d) parameter sets for 500 ms with the
+input of plot_Izhikevich, one network of one neuron at a time as
+plot_Izhikevich does (only for the smallest K), and with
+izhikevich_sweep.
+
+usage: python parameter_sweep.py
+'''
+import time
+import numpy as np
+from brian import *
+from utils import IzhikevichReset
+from cortex import izhikevich_sweep
+
+stim = np.zeros(500)
+stim[100:400] = 10
+
+
+def one_network(a, b, c, d):
+    '''the simulation of plot_Izhikevich, without plotting'''
+    a, b, c, d = a/ms, b/ms, c*mV, d*mV/ms
+    eqs = Equations('''
+                    dv/dt = (0.04/ms/mV)*v**2+(5/ms)*v+140*mV/ms-u+I/nF  : volt
+                    du/dt = a*(b*v-u)                                    : volt/second
+                    I                                                    : amp
+                    ''')
+    clock = Clock(dt=.1*ms)
+    G = NeuronGroup(1, eqs, threshold=30*mV, reset=IzhikevichReset(c, d),
+                    clock=clock)
+    G.v = -80*mV
+    G.u = 0
+    Mv = StateMonitor(G, 'v', record=0, clock=clock)
+    M = SpikeMonitor(G)
+    G.I = TimedArray(stim*nA, dt=1*ms)
+    Network(G, Mv, M).run(500*ms)
+    return M[0]
+
+
+if __name__ == '__main__':
+    rng = np.random.RandomState(1)
+    print '%8s %12s %12s %12s' % ('K', 'one by one', 'brian', 'numpy')
+    for K in [10, 100, 1000, 10000]:
+        params = rng.rand(K, 4) * [.08, .05, 15, 6] + [.02, .2, -65, 2]
+        if K <= 100:
+            start = time.time()
+            for p in params:
+                one_network(*p)
+            slow = '%12.2f' % (time.time() - start)
+        else:
+            slow = '%12s' % '-'
+        times = []
+        for engine in ['brian', 'numpy']:
+            start = time.time()
+            izhikevich_sweep(params, stim, 500*ms, engine=engine)
+            times.append(time.time() - start)
+        print '%8d %s %12.2f %12.2f' % (K, slow, times[0], times[1])
@@ -0,0 +1,92 @@
+'''
+Strong and weak scaling of PartitionedGranuleGolgi
+
+Strong scaling runs one GranuleGolgi layer of N granule cells on 1..S
+shards (one process each), and checks that every run gives the spikes
+of the 1-shard run.  Weak scaling runs N_shard granule cells per shard.
+Layers get 1 mossy fibre per 20 granule cells at 20 Hz and a random
+tonic current, so that the granule cells fire.  The default shard
+counts are the powers of 2 up to the number of CPUs; more shards than
+CPUs only measure the cost of the exchange.  By default the synapses
+act after one time step, as in the layer itself, and spikes are
+exchanged every step; --delay (ms) opts into a longer delay and fewer
+exchanges, which changes the model.
+
+usage: python partitioned.py [--N 100000] [--weak-N 25000]
+                             [--duration .1] [--shards 1 2 4]
+                             [--delay 1]
+'''
+import time
+import argparse
+import multiprocessing
+import numpy as np
+from brian import *
+from cerebellum import GranuleGolgi, PartitionedGranuleGolgi
+
+
+def layer(N):
+    np.random.seed(1)
+    G = GranuleGolgi(N, seed=1)
+    MF = PoissonGroup(N // 20, 20*Hz)
+    G.connect_mf(MF)
+    G.I = np.random.rand(len(G)) * 8*nA
+    return G
+
+def run(N, shards, duration, delay=None):
+    '''(setup s, run s, spikes (i, t)) of a partitioned run'''
+    G = layer(N)
+    start = time.time()
+    net = PartitionedGranuleGolgi(G, shards=shards, delay=delay)
+    built = time.time() - start
+    start = time.time()
+    spikes = net.run(duration)
+    return built, time.time() - start, spikes
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='PartitionedGranuleGolgi '
+                                     'scaling')
+    parser.add_argument('--N', type=int, default=100000,
+                        help='granule cells of the strong scaling runs')
+    parser.add_argument('--weak-N', type=int, default=25000,
+                        help='granule cells per shard of the weak scaling '
+                        'runs')
+    parser.add_argument('--duration', type=float, default=.1,
+                        help='simulated seconds')
+    parser.add_argument('--shards', type=int, nargs='+')
+    parser.add_argument('--delay', type=float,
+                        help='synaptic delay in ms (one dt by default)')
+    args = parser.parse_args()
+    cpus = multiprocessing.cpu_count()
+    shards = args.shards or [2**k for k in range(cpus.bit_length())
+                             if 2**k <= cpus]
+    duration = args.duration * second
+    delay = None if args.delay is None else args.delay * ms
+    print '%d CPUs, %g s simulated, delay %s' % (
+        cpus, args.duration, 'one dt' if delay is None else delay)
+
+    print '\nstrong scaling, N_gc = %d' % args.N
+    print '%8s %10s %10s %10s %10s %10s %10s' % (
+        'shards', 'setup (s)', 'run (s)', 'speedup', 'efficiency',
+        'spikes', 'identical')
+    reference = None
+    for S in shards:
+        built, wall, (i, t) = run(args.N, S, duration, delay)
+        if reference is None:
+            reference = wall, i, t
+        same = np.array_equal(i, reference[1]) and \
+            np.array_equal(t, reference[2])
+        speedup = reference[0] / wall
+        print '%8d %10.2f %10.2f %10.2f %10.2f %10d %10s' % (
+            S, built, wall, speedup, speedup * shards[0] / S, len(i), same)
+
+    print '\nweak scaling, N_gc = %d per shard' % args.weak_N
+    print '%8s %10s %10s %10s %10s %10s' % ('shards', 'N_gc', 'setup (s)',
+                                            'run (s)', 'efficiency',
+                                            'spikes')
+    first = None
+    for S in shards:
+        built, wall, (i, t) = run(args.weak_N * S, S, duration, delay)
+        first = first or wall
+        print '%8d %10d %10.2f %10.2f %10.2f %10d' % (
+            S, args.weak_N * S, built, wall, first / wall, len(i))
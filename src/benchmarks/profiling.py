@@ -0,0 +1,39 @@
+'''
+Benchmark of the overhead of NetworkProfiler
+
+Runs the polychrony network of the benchmark suite (1000 neurons)
+for duration seconds without profiling, profiled and after detaching
+the profiler, and prints the wall-clock times and the breakdown.
+
+usage: python profiling.py [duration]
+'''
+import sys
+import time
+from brian import *
+from utils import NetworkProfiler
+from suite import polychrony
+
+
+def timed_run(net, duration):
+    start = time.time()
+    net.run(duration)
+    return time.time() - start
+
+
+if __name__ == '__main__':
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+    objects, _ = polychrony(1000, .05)
+    net = Network(*objects)
+    net.prepare()
+    plain = timed_run(net, duration*second)
+    profiler = NetworkProfiler(net, names=dict(zip(
+        ['G', 'Ce', 'Ci', 'stdp', 'thalamic_input'], objects)))
+    profiler.attach()
+    profiled = timed_run(net, duration*second)
+    profiler.detach()
+    detached = timed_run(net, duration*second)
+    profiler.runs.append({'duration_s': duration, 'wall_s': profiled})
+    print profiler.table()
+    print
+    print '%12s %12s %12s' % ('plain', 'profiled', 'detached')
+    print '%12.3f %12.3f %12.3f' % (plain, profiled, detached)
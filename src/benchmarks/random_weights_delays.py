@@ -0,0 +1,32 @@
+'''
+Benchmark of utils.random_weights_delays
+
+Times the construction of random weight/delay matrices for an
+increasing number of synapses (nnz) and reports the cost per synapse,
+which should stay roughly flat if construction is near-linear in nnz.
+
+usage: python random_weights_delays.py [max_exponent]
+    builds matrices with 10^4 ... 10^max_exponent synapses
+    (default 7; 8 needs several GB of RAM)
+'''
+import sys
+import time
+import numpy as np
+from utils import *
+
+
+def bench(nnz, p=.001, seed=1):
+    '''build a square nnz-synapse weight/delay pair, return seconds'''
+    n = int(np.sqrt(nnz/p))
+    start = time.time()
+    w,d = random_weights_delays(n,n,p,max_weight=6.0*mV,max_delay=20*ms,
+                                seed=seed)
+    return w.nnz, time.time()-start
+
+
+if __name__ == '__main__':
+    max_exponent = int(sys.argv[1]) if len(sys.argv) > 1 else 7
+    print '%12s %10s %14s' % ('nnz', 'seconds', 'ns/synapse')
+    for e in range(4, max_exponent+1):
+        nnz, elapsed = bench(10**e)
+        print '%12d %10.3f %14.1f' % (nnz, elapsed, 1e9*elapsed/nnz)
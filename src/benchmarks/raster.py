@@ -0,0 +1,67 @@
+'''
+Benchmark of raster against one plot call per spike
+
+Draws random spikes of 10000 neurons over 10 s and saves the figure,
+for growing numbers of spikes: with a marker per spike as
+RealToSpikes.spike_raster used to (only for the smallest numbers), and
+with raster from arrays and from a SpikeLog of the same spikes.
+
+usage: python raster.py
+'''
+import os
+import time
+import tempfile
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+import pylab
+from brian import *
+from utils import raster, SpikeLogger, SpikeLog
+
+dt = .1e-3
+
+
+def draw(f):
+    pylab.figure()
+    start = time.time()
+    f()
+    pylab.savefig(os.path.join(tempfile.gettempdir(), 'raster.png'))
+    pylab.close('all')
+    return time.time() - start
+
+
+def write_log(path, i, steps):
+    '''a spike log of the spikes (i, steps), sorted by step'''
+    clk = Clock(dt=dt*second)
+    G = NeuronGroup(10000, 'v : 1', clock=clk)
+    log = SpikeLogger(G, path)
+    log._block = np.empty(len(i), dtype=log._block.dtype)
+    log._block['i'], log._block['step'] = i, steps
+    log._n = len(i)
+    log.nspikes = len(i)
+    log.close()
+    return SpikeLog(path)
+
+
+if __name__ == '__main__':
+    np.random.seed(1)
+    path = os.path.join(tempfile.mkdtemp(), 'raster.spikes')
+    print '%10s %12s %12s %12s' % ('spikes', 'per spike', 'arrays', 'log')
+    for n in [1000, 10000, 10**6, 10**7]:
+        steps = np.sort(np.random.randint(100000, size=n))
+        i = np.random.randint(10000, size=n)
+        t = steps * dt
+        if n <= 10000:
+            def per_spike():
+                for k in range(n):
+                    pylab.plot(t[k], i[k], 'o', color='b')
+            slow = '%12.2f' % draw(per_spike)
+        else:
+            slow = '%12s' % '-'
+        fast = draw(lambda: raster((i, t)))
+        log = write_log(path, i, steps)
+        logged = draw(lambda: raster(log))
+        del log
+        print '%10d %s %12.2f %12.2f' % (n, slow, fast, logged)
+    os.remove(path)
+    os.remove(path + '.idx')
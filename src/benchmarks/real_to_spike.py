@@ -0,0 +1,52 @@
+'''
+Benchmark of RealToSpikes.spikes_batch against spikes
+
+Encodes num_samples random vectors of 20 features with 10 receptive
+fields each, one sample at a time with spikes or in one call of
+spikes_batch, and checks that both give the same spikes.  Then compares
+the dense and sparse evaluation of spikes_batch for more receptive
+fields.
+
+usage: python real_to_spike.py [num_samples]
+'''
+import sys
+import time
+import numpy as np
+from feature_encoding import RealToSpikes
+
+
+if __name__ == '__main__':
+    num_samples = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    np.random.seed(1)
+    X = np.random.randn(20, num_samples)
+    R = RealToSpikes(10, data=X, online=False)
+
+    start = time.time()
+    spikes = [R.spikes(X[:, k], 5.0) for k in range(num_samples)]
+    loop = time.time() - start
+
+    start = time.time()
+    offsets, neurons, times = R.spikes_batch(X, 5.0)
+    batch = time.time() - start
+
+    same = all(spikes[k] == zip(neurons[offsets[k]:offsets[k+1]],
+                                times[offsets[k]:offsets[k+1]])
+               for k in range(num_samples))
+    print '%d samples, %d spikes' % (num_samples, len(neurons))
+    print 'spikes:       %.2f s' % loop
+    print 'spikes_batch: %.2f s (%.0fx), same spikes: %s' % (batch,
+                                                           loop/batch, same)
+
+    for num_RFs in [10, 100, 1000]:
+        R = RealToSpikes(num_RFs, data=X, online=False)
+        n = min(num_samples, 10**7 // (20 * num_RFs))
+        start = time.time()
+        dense = R.spikes_batch(X[:, :n], 5.0)
+        t_dense = time.time() - start
+        start = time.time()
+        sparse = R.spikes_batch(X[:, :n], 5.0, sparse=True)
+        t_sparse = time.time() - start
+        same = all((a == b).all() for a, b in zip(dense, sparse))
+        print '%4d RFs, %6d samples: dense %.3f s, sparse %.3f s (%d RFs ' \
+              'per value), same spikes: %s' % (num_RFs, n, t_dense, t_sparse,
+                                               R.RFs.window_size(.2), same)
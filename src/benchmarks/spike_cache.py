@@ -0,0 +1,33 @@
+'''
+Benchmark of SpikeCache
+
+Encodes num_samples vectors of 20 features (10 receptive fields each)
+with spikes_batch three times: without a cache, with an empty cache
+(encoding and storing) and again (loading the memory-mapped entry),
+and reports the times and the size of the entry.
+
+usage: python spike_cache.py [num_samples]
+'''
+import sys
+import time
+import shutil
+import tempfile
+import numpy as np
+from feature_encoding import RealToSpikes, SpikeCache
+
+
+if __name__ == '__main__':
+    num_samples = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    np.random.seed(1)
+    X = np.random.randn(20, num_samples)
+    R = RealToSpikes(10, data=X, online=False)
+    path = tempfile.mkdtemp()
+    cache = SpikeCache(path)
+    for label, c in [('no cache', None), ('cache miss', cache),
+                     ('cache hit', cache)]:
+        start = time.time()
+        offsets, neurons, times = R.spikes_batch(X, 5.0, cache=c)
+        print '%10s %8.3f s' % (label, time.time() - start)
+    print '%d spikes, entry of %.1f MB' % (len(neurons),
+                                          cache.entries()[0][1] / 2.**20)
+    shutil.rmtree(path)
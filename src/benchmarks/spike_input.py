@@ -0,0 +1,54 @@
+'''
+Benchmark of SpikeArrayGroup against SpikeGeneratorGroup
+
+Encodes num_samples vectors of 100 features (10 receptive fields each)
+presented every 10 ms, either as (neuron, time) tuples from spikes fed
+to a SpikeGeneratorGroup or as arrays from binned_spikes fed to a
+SpikeArrayGroup, and reports the setup time (encoding and building the
+group), the run time and whether both groups fire the same spikes.
+
+usage: python spike_input.py [num_samples]
+'''
+import sys
+import time
+import numpy as np
+from brian import *
+from feature_encoding import RealToSpikes
+from utils import SpikeArrayGroup
+
+period, window = 10*ms, 8*ms
+
+
+def setup(kind, R, X, clk):
+    start = time.time()
+    N = X.shape[0] * R.num_RFs
+    if kind == 'tuples':
+        spikes = []
+        for k in range(X.shape[1]):
+            spikes += [(i, k*float(period) + t)
+                       for i, t in R.spikes(X[:, k], float(window))]
+        G = SpikeGeneratorGroup(N, spikes, clock=clk)
+    else:
+        neurons, steps = R.binned_spikes(X, float(window), clk.dt,
+                                         period=period)
+        G = SpikeArrayGroup(N, neurons, steps, clock=clk)
+    return G, time.time() - start
+
+
+if __name__ == '__main__':
+    num_samples = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    np.random.seed(1)
+    X = np.random.randn(100, num_samples)
+    R = RealToSpikes(10, data=X, online=False)
+    print '%8s %10s %10s %10s' % ('kind', 'setup (s)', 'run (s)', 'spikes')
+    counts = {}
+    for kind in ['tuples', 'arrays']:
+        clk = Clock(dt=.1*ms)
+        G, built = setup(kind, R, X, clk)
+        M = SpikeCounter(G)
+        start = time.time()
+        Network(G, M).run(num_samples * period)
+        ran = time.time() - start
+        counts[kind] = M.count
+        print '%8s %10.2f %10.2f %10d' % (kind, built, ran, M.count.sum())
+    print 'same spike counts:', (counts['tuples'] == counts['arrays']).all()
@@ -0,0 +1,69 @@
+'''
+Benchmark of SpikeLogger against SpikeMonitor
+
+Records 10000 Poisson neurons at 20 Hz for 10 s (about 2M spikes) with
+either recorder, each in its own process, and reports run time, peak
+resident memory of the process and, for the log, the time of a 100 ms
+window query and a 100 neuron range query over the whole run.
+
+usage: python spike_log.py [duration_s]
+'''
+import os
+import sys
+import time
+import resource
+import tempfile
+import subprocess
+import numpy as np
+from brian import *
+from utils import SpikeLogger, SpikeLog
+
+
+def record(kind, duration, path):
+    clk = Clock(dt=.5*ms)
+    P = PoissonGroup(10000, 20*Hz, clock=clk)
+    if kind == 'log':
+        M = SpikeLogger(P, path)
+    else:
+        M = SpikeMonitor(P)
+    start = time.time()
+    Network(P, M).run(duration)
+    if kind == 'log':
+        M.close()
+    ran = time.time() - start
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.
+    return ran, rss, M.nspikes
+
+
+def query(path, duration):
+    log = SpikeLog(path)
+    start = time.time()
+    for k in range(10):
+        t = (k + .5) * float(duration) / 10
+        log.spikes(t, t + .1)
+    window = (time.time() - start) / 10
+    start = time.time()
+    i, t = log.spikes(imin=5000, imax=5100)
+    neurons = time.time() - start
+    return window, neurons
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2:
+        # child process: python spike_log.py duration kind path
+        duration, kind, path = float(sys.argv[1])*second, sys.argv[2], sys.argv[3]
+        print '%f %f %d' % record(kind, duration, path)
+        sys.exit()
+    duration = sys.argv[1] if len(sys.argv) > 1 else '10'
+    path = os.path.join(tempfile.mkdtemp(), 'bench.spikes')
+    print '%8s %10s %12s %10s' % ('kind', 'run (s)', 'peak RSS (MB)', 'spikes')
+    for kind in ['monitor', 'log']:
+        out = subprocess.check_output([sys.executable, __file__, duration,
+                                       kind, path])
+        ran, rss, n = out.split()[-3:]
+        print '%8s %10.2f %12.1f %10s' % (kind, float(ran), float(rss), n)
+    window, neurons = query(path, float(duration))
+    print 'log query: 100 ms window %.2f ms, 100 neurons %.1f ms' % (
+        window*1e3, neurons*1e3)
+    os.remove(path)
+    os.remove(path + '.idx')
@@ -0,0 +1,74 @@
+'''
+Benchmark of RingBufferSTDP against ExponentialSTDP
+
+Runs the excitatory part of the polychrony network (random delays of
+1-20 ms at dt = 0.5 ms, 2% of the neurons driven each ms) with nearest
+neighbour STDP, either ExponentialSTDP on a DelayConnection or
+RingBufferSTDP on a RingBufferDelayConnection, and reports run time and
+the total weight at the end.
+
+The totals are close but not identical: ExponentialSTDP reads its
+delayed traces one time step late on a DelayConnection, so each pair
+contributes exp(dt/tau) (2.5%) more, and coincident pre arrivals and
+post spikes cancel instead of counting as pre before post.
+
+usage: python stdp.py [sim_len_ms]
+'''
+import sys
+import time
+import numpy as np
+from brian import *
+from cortex import IzhikevichGroup, RingBufferDelayConnection, \
+    RingBufferSTDP, connection_arrays
+from utils import random_weights_delays, connect_csr
+
+smax = 10*mV
+
+
+def bench(N, p, kind, duration):
+    np.random.seed(2)
+    sim_clock = Clock(dt=.5*ms)
+    G = IzhikevichGroup(N, 0.02/ms, 0.2/ms, -65*mV, 8*mV/ms, 1*ms, 1*ms,
+                        engine='numpy', clock=sim_clock)
+    Ne = int(.8*N)
+    Ge = G.subgroup(Ne)
+    start = time.time()
+    w,d = random_weights_delays(Ne, N, p, 6.0*mV, 20*ms, seed=1)
+    if kind == 'ring':
+        C = RingBufferDelayConnection(Ge, G, max_delay=20*ms)
+        C.connect(Ge, G, w, delay=d)
+        stdp = RingBufferSTDP(C, 20*ms, 20*ms, .1, -.1, wmax=smax,
+                              interactions='nearest')
+    else:
+        C = DelayConnection(Ge, G, max_delay=20*ms)
+        connect_csr(C, Ge, G, w, delay=d)
+        stdp = ExponentialSTDP(C, 20*ms, 20*ms, .1, -.1, wmax=smax,
+                               interactions='nearest', clock=sim_clock)
+    C.compress()
+    built = time.time() - start
+
+    I = G.state_('I')
+    @network_operation(Clock(dt=1*ms, order=-1))
+    def thalamic_input():
+        I[:] = 0
+        I[np.random.randint(N, size=N//50)] = 20e-9
+
+    M = SpikeMonitor(G)
+    start = time.time()
+    Network(G, C, stdp, thalamic_input, M).run(duration)
+    total = connection_arrays(C)[2].sum()
+    return built, time.time() - start, M.nspikes, total
+
+
+if __name__ == '__main__':
+    sim_len = float(sys.argv[1]) if len(sys.argv) > 1 else 500.
+    print '%8s %8s %10s %10s %10s %12s' % ('N', 'kind', 'build (s)',
+                                          'run (s)', 'spikes', 'total w (V)')
+    for N, p in [(1000, .05), (10000, .01)]:
+        times = {}
+        for kind in ['brian', 'ring']:
+            built, ran, nspikes, total = bench(N, p, kind, sim_len*ms)
+            times[kind] = ran
+            print '%8d %8s %10.2f %10.2f %10d %12.4f' % (N, kind, built, ran,
+                                                        nspikes, total)
+        print '%8d speedup %.2fx' % (N, times['brian']/times['ring'])
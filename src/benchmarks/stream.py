@@ -0,0 +1,75 @@
+'''
+Benchmark of streaming encoded input into a running network
+
+Presents num_samples vectors of 50 features (10 receptive fields each)
+every 10 ms to 1000 Izhikevich neurons through a random connection,
+with the spikes encoded all at once (binned_spikes + SpikeArrayGroup),
+streamed block by block (RealToSpikes.stream + SpikeStreamGroup), or
+streamed from a background thread (prefetch).  Reports the total time
+(encoding and simulation), the largest number of spikes held at once
+and the number of spikes fired by the network.
+
+usage: python stream.py [num_samples]
+'''
+import sys
+import time
+import numpy as np
+from brian import *
+from cortex import IzhikevichGroup
+from feature_encoding import RealToSpikes
+from utils import SpikeArrayGroup, SpikeStreamGroup, prefetch, \
+    procedural_random_matrix, connect_csr
+
+period, window = 10*ms, 8*ms
+
+
+class _Largest(object):
+    '''passes blocks through, keeping the size of the largest'''
+    def __init__(self, blocks):
+        self.blocks, self.largest = blocks, 0
+
+    def __iter__(self):
+        for block in self.blocks:
+            self.largest = max(self.largest, len(block[0]))
+            yield block
+
+
+def bench(kind, X):
+    np.random.seed(2)
+    start = time.time()
+    clk = Clock(dt=.5*ms)
+    R = RealToSpikes(10, data=X, online=False)
+    N = X.shape[0] * R.num_RFs
+    if kind == 'array':
+        neurons, steps = R.binned_spikes(X, float(window), clk.dt,
+                                         period=period)
+        inputs = SpikeArrayGroup(N, neurons, steps, clock=clk)
+        largest = len(neurons)
+    else:
+        blocks = _Largest(R.stream(iter(X.T), float(window), clk.dt,
+                                   period=period))
+        if kind == 'prefetch':
+            inputs = SpikeStreamGroup(N, prefetch(blocks), clock=clk)
+        else:
+            inputs = SpikeStreamGroup(N, iter(blocks), clock=clk)
+    G = IzhikevichGroup(1000, 0.02/ms, 0.2/ms, -65*mV, 8*mV/ms, 1*ms, 1*ms,
+                        engine='numpy', clock=clk)
+    C = Connection(inputs, G, 'ge')
+    connect_csr(C, inputs, G, procedural_random_matrix(N, 1000, .05, 2e-3,
+                                                       seed=3))
+    M = SpikeCounter(G)
+    Network(inputs, G, C, M).run(X.shape[1] * period)
+    if kind != 'array':
+        largest = blocks.largest
+    return time.time() - start, largest, M.count.sum()
+
+
+if __name__ == '__main__':
+    num_samples = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    np.random.seed(1)
+    X = np.random.randn(50, num_samples)
+    print '%10s %10s %14s %10s' % ('kind', 'total (s)', 'spikes held',
+                                   'output')
+    for kind in ['array', 'stream', 'prefetch']:
+        total, largest, fired = bench(kind, X)
+        print '%10s %10.2f %14d %10d' % (kind, total, largest, fired)
@@ -0,0 +1,243 @@
+'''
+Benchmark suite of the models of brian_practice and simulations
+
+Builds and runs, headless and without monitors or plots,
+    cuba            brian_practice/cuba_net.py (4000 neurons, p = .02)
+    izhikevich_2003 brian_practice/izhikevich_2003_net.py
+    polychrony      the network of simulations/polychrony.py (ring
+                    buffer delays, STDP, thalamic input), without the
+                    group search and checkpoints
+    granule_golgi   cerebellum.GranuleGolgi driven by Poisson mossy
+                    fibres, with its connection probabilities scaled
+                    by p
+over a grid of sizes N and connection probabilities p.  Each case runs
+in its own process, and records the build time, simulated seconds per
+wall-clock second, the peak resident memory of the process and the
+number of synapses.
+
+Results are written as JSON.  Given a baseline (a results file of an
+earlier run), cases slower, larger or slower to build than the baseline
+by more than the tolerance are flagged and the exit status is 1.
+
+usage: python suite.py [--quick] [--output results.json]
+                       [--baseline baseline.json] [--tolerance .2]
+                       [--update-baseline] [--only model]
+'''
+import sys
+import json
+import time
+import socket
+import argparse
+import resource
+import subprocess
+import numpy as np
+import scipy
+from brian import *
+import brian
+from cortex import IzhikevichGroup, RingBufferDelayConnection, \
+    RingBufferSTDP
+from cerebellum import GranuleGolgi
+from utils import IzhikevichReset, InputSchedule, gaussian_noise, \
+    random_pulses, random_weights_delays, connect_csr
+
+# (model, N, p) of each case, and of each case with --quick
+CASES = [('cuba', 4000, .02), ('cuba', 16000, .005),
+         ('izhikevich_2003', 1000, 1.), ('izhikevich_2003', 4000, .1),
+         ('polychrony', 1000, .05), ('polychrony', 4000, .0125),
+         ('granule_golgi', 10000, 1.), ('granule_golgi', 100000, 1.)]
+QUICK = [('cuba', 4000, .02), ('izhikevich_2003', 1000, 1.),
+         ('polychrony', 1000, .05), ('granule_golgi', 10000, 1.)]
+DURATION, QUICK_DURATION = 1.0, .2
+
+
+def cuba(N, p):
+    taum, taue, taui = 20*ms, 5*ms, 10*ms
+    Vt, Vr, El = -50*mV, -60*mV, -49*mV
+    we, wi = (60*0.27/10)*mV, (20*4.5/10)*mV
+    eqs = Equations('''
+                    dV/dt  = (ge-gi-(V-El))/taum : volt
+                    dge/dt = -ge/taue            : volt
+                    dgi/dt = -gi/taui            : volt
+                    ''')
+    G = NeuronGroup(N, model=eqs, threshold=Vt, reset=Vr)
+    Ne = int(.8*N)
+    Ge, Gi = G.subgroup(Ne), G.subgroup(N - Ne)
+    G.V = Vr + (Vt - Vr) * rand(len(G))
+    Ce = Connection(Ge, G, 'ge', sparseness=p, weight=we)
+    Ci = Connection(Gi, G, 'gi', sparseness=p, weight=wi)
+    return [G, Ce, Ci], [Ce, Ci]
+
+def izhikevich_2003(N, p):
+    Ne = int(.8*N)
+    Ni = N - Ne
+    a, b = (0.02+0.08*rand(N))/ms, (0.25-0.05*rand(N))/ms
+    c, d = (-65+15*rand(N)**2)*mV, (8-6*rand(N)**2)*mV/ms
+    eqs = Equations('''
+                    dv/dt = (0.04/ms/mV)*v**2+(5/ms)*v+140*mV/ms-u+thal/nF : volt
+                    du/dt = a*(b*v-u) : volt/second
+                    thal : amp
+                    ''')
+    G = NeuronGroup(N, eqs, threshold=30*mV, reset=IzhikevichReset(c, d),
+                    freeze=False)
+    Ge, Gi = G.subgroup(Ne), G.subgroup(Ni)
+    G.v = (-80 + randn(N))*mV
+    G.u = randn(N)*mV/ms
+    input_clock = Clock(dt=1*ms)
+    thal_e = InputSchedule(Ge, 'thal', gaussian_noise(Ne, 5*nA, seed=1),
+                           clock=input_clock)
+    thal_i = InputSchedule(Gi, 'thal', gaussian_noise(Ni, 3*nA, seed=2),
+                           clock=input_clock)
+    C = Connection(G, G, 'v')
+    w, _ = random_weights_delays(Ne, N, p, .4*mV, 1*ms, seed=1)
+    connect_csr(C, Ge, G, w)
+    w, _ = random_weights_delays(Ni, N, p, 1*mV, 1*ms, seed=2)
+    connect_csr(C, Gi, G, -w)
+    return [G, C, thal_e, thal_i], [C]
+
+def polychrony(N, p):
+    sim_clock, input_clock = Clock(dt=.5*ms), Clock(dt=1*ms)
+    Ne = int(.8*N)
+    G = IzhikevichGroup(N, 'a', 0.2/ms, -65*mV, 'd', 1*ms, 1*ms,
+                        clock=sim_clock)
+    Ge, Gi = G.subgroup(Ne), G.subgroup(N - Ne)
+    Ge.a, Ge.d = 0.02/ms, 8*mV/ms
+    Gi.a, Gi.d = 0.1/ms, 2*mV/ms
+    Ce = RingBufferDelayConnection(Ge, G, max_delay=20*ms)
+    Ce.connect_random(Ge, G, p, weight=6.0*mV, delay=(0*ms, 20*ms), seed=1)
+    Ci = DelayConnection(Gi, Ge, max_delay=1*ms)
+    Ci.connect_random(Gi, Ge, p, weight=-5.0*mV, delay=1*ms, seed=2)
+    stdp = RingBufferSTDP(Ce, 20*ms, 20*ms, .1, -.1, wmax=10*mV,
+                          clock=sim_clock, interactions='nearest',
+                          weight_stats=True)
+    thalamic_input = InputSchedule(G, 'I', random_pulses(N, 20*nA, seed=1),
+                                   clock=input_clock)
+    return [G, Ce, Ci, stdp, thalamic_input], [Ce, Ci]
+
+def granule_golgi(N, p):
+    class Scaled(GranuleGolgi):
+        '''GranuleGolgi with its connection probabilities times p'''
+        def setup(self):
+            for name in ['p_mf2gc', 'p_gg2gc', 'p_gc2gg', 'p_mf2gg']:
+                setattr(self, name, getattr(self, name) * p)
+            GranuleGolgi.setup(self)
+    G = Scaled(N, seed=1)
+    MF = PoissonGroup(N // 20, 20*Hz)
+    G.connect_mf(MF)
+    return [G, G.C_gc_gg, MF, G.C_input], [G.C_gc_gg, G.C_input]
+
+MODELS = {'cuba': cuba, 'izhikevich_2003': izhikevich_2003,
+          'polychrony': polychrony, 'granule_golgi': granule_golgi}
+
+
+def synapses(C):
+    '''number of synapses of a connection'''
+    if hasattr(C, 'delay_steps'):
+        return len(C.w)
+    W = getattr(C, 'W', None)
+    if hasattr(W, 'alldata'):
+        return len(W.alldata)
+    if hasattr(W, 'nnz'):
+        return int(W.nnz)
+    if W is not None:
+        return int(np.count_nonzero(np.asarray(W)))
+    return 0
+
+def run_case(model, N, p, duration):
+    '''build and run one case in this process'''
+    np.random.seed(1)
+    start = time.time()
+    objects, connections = MODELS[model](N, p)
+    net = Network(*objects)
+    net.prepare()
+    built = time.time() - start
+    start = time.time()
+    net.run(duration*second)
+    ran = time.time() - start
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.
+    return {'model': model, 'N': N, 'p': p, 'duration': duration,
+            'build_s': built, 'sim_per_wall': duration / ran,
+            'peak_rss_mb': rss,
+            'synapses': sum(synapses(C) for C in connections)}
+
+def case_key(r):
+    return '%s N=%d p=%g' % (r['model'], r['N'], r['p'])
+
+def compare(results, baseline, tolerance):
+    '''the regressions of results against baseline, as strings'''
+    base = dict((case_key(r), r) for r in baseline['results'])
+    flags = []
+    for r in results:
+        b = base.get(case_key(r))
+        if b is None:
+            continue
+        for name, worse in [('sim_per_wall', r['sim_per_wall'] <
+                             b['sim_per_wall'] * (1 - tolerance)),
+                            ('build_s', r['build_s'] >
+                             b['build_s'] * (1 + tolerance)),
+                            ('peak_rss_mb', r['peak_rss_mb'] >
+                             b['peak_rss_mb'] * (1 + tolerance))]:
+            if worse:
+                flags.append('%s: %s %.3g -> %.3g' % (case_key(r), name,
+                                                      b[name], r[name]))
+    return flags
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='model benchmark suite')
+    parser.add_argument('--quick', action='store_true',
+                        help='small cases and short runs')
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', help='results to compare against')
+    parser.add_argument('--tolerance', type=float, default=.2)
+    parser.add_argument('--update-baseline', action='store_true',
+                        help='also write the results to --baseline')
+    parser.add_argument('--only', help='run the cases of this model only')
+    parser.add_argument('--case', nargs=4, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        # child process: one case, result as JSON on the last line
+        model, N, p, duration = args.case
+        print json.dumps(run_case(model, int(N), float(p), float(duration)))
+        sys.exit()
+
+    cases = QUICK if args.quick else CASES
+    duration = QUICK_DURATION if args.quick else DURATION
+    if args.only:
+        cases = [c for c in cases if c[0] == args.only]
+    results = []
+    print '%-32s %10s %12s %12s %12s' % ('case', 'build (s)', 'sim/wall',
+                                         'peak RSS MB', 'synapses')
+    for model, N, p in cases:
+        out = subprocess.check_output([sys.executable, __file__, '--case',
+                                       model, str(N), repr(p),
+                                       repr(duration)])
+        r = json.loads(out.strip().splitlines()[-1])
+        results.append(r)
+        print '%-32s %10.2f %12.3f %12.1f %12d' % (case_key(r), r['build_s'],
+                                                   r['sim_per_wall'],
+                                                   r['peak_rss_mb'],
+                                                   r['synapses'])
+    report = {'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+              'host': socket.gethostname(),
+              'versions': {'python': sys.version.split()[0],
+                           'numpy': np.__version__,
+                           'scipy': scipy.__version__,
+                           'brian': brian.__version__},
+              'results': results}
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=1, sort_keys=True)
+    print 'results written to', args.output
+
+    if args.baseline and args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=1, sort_keys=True)
+        print 'baseline updated:', args.baseline
+    elif args.baseline:
+        with open(args.baseline) as f:
+            flags = compare(results, json.load(f), args.tolerance)
+        for flag in flags:
+            print 'REGRESSION', flag
+        if flags:
+            sys.exit(1)
+        print 'no regressions against', args.baseline
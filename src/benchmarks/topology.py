@@ -0,0 +1,55 @@
+'''
+Benchmark of the distance-limited wiring of GranuleGolgi
+
+Builds GranuleGolgi layers with random and with spatial (topology=True)
+connectivity and 1 mossy fibre per 20 granule cells, and reports the
+build times and, for the spatial layers, the mean convergence and
+divergence of each projection against the p*N targets and the longest
+synapse against the projection's radius.
+
+usage: python topology.py [max_N_gc]   (10**5 by default; 10**6 builds
+       about 4*10**7 synapses and takes minutes)
+'''
+import sys
+import time
+import numpy as np
+from scipy.sparse import csr_matrix
+from brian import *
+from cerebellum import GranuleGolgi
+from utils import spatial_connect
+
+
+def report(G, MF):
+    '''conv./div. and longest synapse of each spatial projection'''
+    for name, P, Q, p, r in [('mf2gc', MF, G.GC, G.p_mf2gc, G.r_mf2gc),
+                             ('mf2gg', MF, G.GG, G.p_mf2gg, G.r_mf2gg),
+                             ('gc2gg', G.GC, G.GG, G.p_gc2gg, G.r_gc2gg),
+                             ('gg2gc', G.GG, G.GC, G.p_gg2gc, G.r_gg2gc)]:
+        W = spatial_connect(G.positions[P], G.positions[Q], G.box, p, r,
+                            seed=1)
+        i, j = W.nonzero()
+        d = G.positions[P][i] - G.positions[Q][j]
+        d -= G.box * np.round(d / float(G.box))
+        longest = np.sqrt((d * d).sum(1)).max() if len(d) else 0
+        print '    %s conv %8.2f (%8.2f)  div %8.2f (%8.2f)  ' \
+              'longest %5.1f um (r = %g um)' % (
+                  name, W.nnz / float(len(Q)), p * len(P),
+                  W.nnz / float(len(P)), p * len(Q), longest / 1e-6,
+                  r / um)
+
+
+if __name__ == '__main__':
+    max_N = int(sys.argv[1]) if len(sys.argv) > 1 else 10**5
+    N = 10000
+    while N <= max_N:
+        times = []
+        for topology in [False, True]:
+            start = time.time()
+            G = GranuleGolgi(N, seed=1, topology=topology)
+            MF = PoissonGroup(N // 20, 20*Hz)
+            G.connect_mf(MF)
+            times.append(time.time() - start)
+        print 'N_gc %8d build: random %.2f s, spatial %.2f s' % (N, times[0],
+                                                               times[1])
+        report(G, MF)
+        N *= 10
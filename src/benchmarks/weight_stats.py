@@ -0,0 +1,102 @@
+'''
+Benchmark of WeightStats against full scans of the weights
+
+Runs the network of stdp.py with RingBufferSTDP, with and without
+weight_stats, and reports the run time (the cost of the incremental
+updates) and the drift of the running statistics from a full
+recomputation at the end.  Then times reading the total, row and column
+sums and histogram from the statistics against computing them from the
+weight arrays, for a connection of 20 million synapses.
+
+usage: python weight_stats.py [sim_len_ms]
+'''
+import sys
+import time
+import numpy as np
+from brian import *
+from cortex import IzhikevichGroup, RingBufferDelayConnection, \
+    RingBufferSTDP, WeightStats
+from utils import random_weights_delays
+
+smax = 10*mV
+
+
+def bench(N, p, stats, duration):
+    np.random.seed(2)
+    sim_clock = Clock(dt=.5*ms)
+    G = IzhikevichGroup(N, 0.02/ms, 0.2/ms, -65*mV, 8*mV/ms, 1*ms, 1*ms,
+                        engine='numpy', clock=sim_clock)
+    Ne = int(.8*N)
+    Ge = G.subgroup(Ne)
+    w,d = random_weights_delays(Ne, N, p, 6.0*mV, 20*ms, seed=1)
+    C = RingBufferDelayConnection(Ge, G, max_delay=20*ms)
+    C.connect(Ge, G, w, delay=d)
+    stdp = RingBufferSTDP(C, 20*ms, 20*ms, .1, -.1, wmax=smax,
+                          interactions='nearest', weight_stats=stats)
+    C.compress()
+
+    I = G.state_('I')
+    @network_operation(Clock(dt=1*ms, order=-1))
+    def thalamic_input():
+        I[:] = 0
+        I[np.random.randint(N, size=N//50)] = 20e-9
+
+    start = time.time()
+    Network(G, C, stdp, thalamic_input).run(duration)
+    ran = time.time() - start
+    if not stats:
+        return ran, None
+    s = stdp.stats
+    running = s.total, s.row_sums.copy(), s.col_sums.copy(), s.histogram.copy()
+    s.recompute()
+    drift = max(abs(running[0] - s.total),
+                abs(running[1] - s.row_sums).max(),
+                abs(running[2] - s.col_sums).max())
+    assert (running[3] == s.histogram).all()
+    return ran, drift
+
+
+class _Arrays(object):
+    '''stand-in for a compressed connection, for WeightStats'''
+    def __init__(self, n, m, nnz):
+        self.source, self.target = np.zeros(n), np.zeros(m)
+        self.indptr = np.linspace(0, nnz, n + 1).astype(np.int64)
+        self.indices = np.random.randint(m, size=nnz).astype(np.int32)
+        self.w = np.random.rand(nnz) * float(smax)
+
+
+def reads(n, m, nnz):
+    C = _Arrays(n, m, nnz)
+    rows = np.repeat(np.arange(n), np.diff(C.indptr))
+    scans = [
+        lambda: C.w.sum(),
+        lambda: np.bincount(rows, weights=C.w, minlength=n),
+        lambda: np.bincount(C.indices, weights=C.w, minlength=m),
+        lambda: np.histogram(C.w, 50, (0, float(smax)))[0]]
+    s = WeightStats(C, 50, (0, float(smax)))
+    kept = [lambda: s.total, lambda: s.row_sums.copy(),
+            lambda: s.col_sums.copy(), lambda: s.histogram.copy()]
+    for name, scan, read in zip(['total', 'row sums', 'col sums',
+                                 'histogram'], scans, kept):
+        start = time.time()
+        scan()
+        t_scan = time.time() - start
+        start = time.time()
+        read()
+        t_read = time.time() - start
+        print '%10s %12.1f %12.4f' % (name, t_scan*1e3, t_read*1e3)
+
+
+if __name__ == '__main__':
+    sim_len = float(sys.argv[1]) if len(sys.argv) > 1 else 500.
+    print '%8s %8s %10s %12s' % ('N', 'stats', 'run (s)', 'drift (V)')
+    for N, p in [(1000, .05), (10000, .01)]:
+        for stats in [False, True]:
+            ran, drift = bench(N, p, stats, sim_len*ms)
+            print '%8d %8s %10.2f %12s' % (N, stats, ran,
+                                           '-' if drift is None else
+                                           '%.2e' % drift)
+    print
+    print '20M synapses, 20k x 20k'
+    print '%10s %12s %12s' % ('', 'scan (ms)', 'read (ms)')
+    reads(20000, 20000, 2*10**7)
@@ -7,7 +7,7 @@ Izhikevich - 2003 - Simple Model of Spiking Neurons
 from brian.library.IF import *
 from brian.neurongroup import *
 from brian import *
-from utils import IzhikevichReset
+from utils import IzhikevichReset, InputSchedule, gaussian_noise
 import time
 
 defaultclock.dt = .5*ms
@@ -42,9 +42,10 @@ Gi = G.subgroup(Ni)
 G.v = (-80 + randn(N))* mV
 G.u = randn(N) * mV/ms
 
-# random thalamic input
-Ge.thal = TimedArray(5*randn(sim_len,Ne)*nA,dt=1*ms)
-Gi.thal = TimedArray(3*randn(sim_len,Ni)*nA,dt=1*ms)
+# random thalamic input, drawn a block of steps at a time
+input_clock = Clock(dt=1*ms)
+thal_e = InputSchedule(Ge, 'thal', gaussian_noise(Ne, 5*nA), clock=input_clock)
+thal_i = InputSchedule(Gi, 'thal', gaussian_noise(Ni, 3*nA), clock=input_clock)
 
 
 ########################################################################    
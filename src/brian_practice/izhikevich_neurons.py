@@ -1,10 +1,15 @@
 '''
 This will model and plot a set of Izhikevich neuron models
+
+plot_Izhikevich simulates one neuron; plot_Izhikevich_sweep simulates
+all the parameter sets at once as one group (see
+cortex.parameter_sweep), which is how the example below runs.
 '''
 from brian.library.IF import *
 from brian.neurongroup import *
 from brian import *
 from utils import IzhikevichReset
+from cortex import izhikevich_sweep
         
 def plot_Izhikevich(name,a,b,c,d):
     a,b,c,d = a/ms, b/ms, c*mV, d*mV/ms
@@ -40,6 +45,24 @@ def plot_Izhikevich(name,a,b,c,d):
     ylabel('v (mV), I (nA)')
     title(name)
 
+def plot_Izhikevich_sweep(neurons):
+    '''
+    plot the neurons, a dict of name: (a,b,c,d), in one subplot each,
+    simulated together with the input of plot_Izhikevich
+    '''
+    names = sorted(neurons)
+    stim = zeros(500)
+    stim[100:400] = 10
+    times, spikes, traces = izhikevich_sweep([neurons[n] for n in names],
+                                             stim, 500*ms, record=('v',),
+                                             engine='brian')
+    for i, name in enumerate(names):
+        subplot(len(names),1,i+1)
+        plot(times/ms, traces['v'][i]/mV, 'b', arange(500), stim - 95, 'r')
+        xlabel('time (ms)')
+        ylabel('v (mV), I (nA)')
+        title(name)
+
 
 if __name__ == '__main__':
     # Neuron Parameters
@@ -50,12 +73,6 @@ if __name__ == '__main__':
                'low-threshold spiking':(0.02,0.25,-65,8)}
 
     figure()
-    i = 1
-    for n,tup in neurons.iteritems():
-        a,b,c,d = tup
-        subplot(5,1,i)
-        plot_Izhikevich(n, a, b, c, d)
-        reinit()
-        i += 1
+    plot_Izhikevich_sweep(neurons)
     subplots_adjust(hspace=0.5)
     show()
\ No newline at end of file
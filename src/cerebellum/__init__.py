@@ -1 +1,2 @@
-from granule_layer import *
\ No newline at end of file
+from granule_layer import *
+from partitioned import *
\ No newline at end of file
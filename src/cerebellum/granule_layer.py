@@ -4,6 +4,8 @@ Created on Jun 25, 2012
 @author: bill
 '''
 from cortex.neuron_groups import IzhikevichGroup
+from utils import ProceduralConnection, procedural_random_matrix, \
+    connect_csr, place_cells, spatial_connect
 from brian.neurongroup import *
 from brian import *
 
@@ -19,8 +21,9 @@ class GranuleGolgi(IzhikevichGroup):
         1 neuron parameters: a,b,c,d to match physiology
         2 model AMPA, NMDA and GABA channels with different
           time constants
-        3 model topology with connection set algebra using 
-          python-csa
+        3 express the connectivity with connection set algebra
+          using python-csa (topology=True gives distance-limited
+          wiring, see utils.topology)
         
         see [Buonomano and Mauk, 1994; Yamazaki and Tanaka, 2007]
         for physiological parameters
@@ -49,6 +52,15 @@ class GranuleGolgi(IzhikevichGroup):
     - ==> N*div = M*conv = nnz(C) ==> p = N*div/(N*M) = M*conv/(N*M)
     - ==> p = conv/N = div/M (by substitution)
     
+    With topology=True the cells are placed uniformly in a periodic cube
+    of the volume holding N_gg golgi cells (1 mm^3 per 1000), and each
+    projection only connects cells within its radius r_* (see
+    utils.topology), keeping the mean convergence and divergence given
+    by p.
+    
+    A built layer can be simulated over several processes with
+    PartitionedGranuleGolgi (see cerebellum.partitioned).
+    
     Derived parameters:
       => MF -> GC sparsity: 500/1000000 ~= 5/N_mf
           => N_mf = 5*1000000/500 = 100000
@@ -62,11 +74,30 @@ class GranuleGolgi(IzhikevichGroup):
     a_gg, b_gg, c_gg, d_gg = 0.02/ms, 0.2/ms, -65*mV, 8*mV/ms
     taue_gc, taui_gc, taue_gg, taui_gg = 1*ms, 1*ms, 1*ms, 1*ms
     
-    def __init__(self, N_gc, gc_gg_ratio = 1000):
+    # Topology (radius of each projection, with topology=True)
+    r_mf2gc, r_gg2gc, r_gc2gg, r_mf2gg = 100*um, 150*um, 200*um, 200*um
+    
+    def __init__(self, N_gc, gc_gg_ratio = 1000, procedural=False, seed=None,
+                 topology=False):
         '''
         N_gc: number of granule cells
+        procedural: if True, random connections are regenerated from their
+                    seed at spike time (ProceduralConnection) instead of
+                    being stored, so synapse memory is O(1)
+        seed: connectivity seed.  the same seed gives bit-identical
+              synapses (and simulations) with procedural True or False
+        topology: if True, cells are placed in space and connected
+                  within the radius of each projection only
         '''
+        if procedural and topology:
+            raise ValueError('procedural connections cannot have topology')
         self.N_gc, self.N_gg = N_gc, int(N_gc/gc_gg_ratio)
+        self.procedural = procedural
+        self.topology = topology
+        if seed is None:
+            seed = np.random.randint(2**31)
+        self.seed = seed
+        self._block_seeds = np.random.RandomState(seed)
         super(GranuleGolgi, self).__init__(N_gc+self.N_gg,'a','b','c','d',
                                            'taue','taui')
             
@@ -86,6 +117,13 @@ class GranuleGolgi(IzhikevichGroup):
         
         self.GC = self.subgroup(N_gc)
         self.GG = self.subgroup(self.N_gg)
+        
+        # Positions (metres) in a cube holding N_gg golgi cells
+        self.positions = {}
+        if topology:
+            self.box = (max(self.N_gg, 1)/float(N_gg_hyp))**(1./3)*mm
+            self.place(self.GC)
+            self.place(self.GG)
         self.setup()
         
     def setup(self):
@@ -93,27 +131,71 @@ class GranuleGolgi(IzhikevichGroup):
         self.GC.a, self.GC.b = self.a_gc, self.b_gc
         self.GC.c, self.GC.d = self.c_gc, self.d_gc
         self.GC.taue, self.GC.taui = self.taue_gc, self.taui_gc
-        self.GC.a, self.GC.b = self.a_gc, self.b_gc
-        self.GC.c, self.GC.d = self.c_gc, self.d_gc
-        self.GC.taue, self.GC.taui = self.taue_gc, self.taui_gc
+        self.GG.a, self.GG.b = self.a_gg, self.b_gg
+        self.GG.c, self.GG.d = self.c_gg, self.d_gg
+        self.GG.taue, self.GG.taui = self.taue_gg, self.taui_gg
         self.connect_gc_gg()
 
+    def new_connection(self, source, state):
+        '''an empty connection from source to this layer'''
+        if self.procedural:
+            return ProceduralConnection(source, self, state)
+        return Connection(source, self, state)
+
+    def connect_random(self, C, P, Q, p, weight):
+        '''
+        randomly connect P to Q in C, with the next connectivity seed.
+        the synapses depend only on the seed, not on self.procedural
+        '''
+        seed = self._block_seeds.randint(2**31)
+        if self.procedural:
+            C.connect_random(P, Q, sparseness=p, weight=weight, seed=seed)
+        else:
+            connect_csr(C, P, Q, procedural_random_matrix(len(P), len(Q), p,
+                                                          float(weight),
+                                                          seed=seed))
+
+    def place(self, P):
+        '''place the cells of P uniformly in the layer's volume'''
+        seed = self._block_seeds.randint(2**31)
+        self.positions[P] = place_cells(len(P), self.box, seed=seed)
+
+    def connect_spatial(self, C, P, Q, p, weight, radius):
+        '''
+        connect P to Q in C within radius, with the next connectivity
+        seed and the mean convergence and divergence of probability p
+        '''
+        seed = self._block_seeds.randint(2**31)
+        connect_csr(C, P, Q, spatial_connect(self.positions[P],
+                                             self.positions[Q], self.box,
+                                             p, radius, float(weight),
+                                             seed=seed))
+
+    def connect(self, C, P, Q, p, weight, radius):
+        '''connect P to Q in C, within radius if the layer has topology'''
+        if self.topology:
+            self.connect_spatial(C, P, Q, p, weight, radius)
+        else:
+            self.connect_random(C, P, Q, p, weight)
+
     def connect_gc_gg(self):
         '''reciprocally connect the granule cells and golgi cells'''
-        self.C_gc_gg = Connection(self, self, 'ge')
-        self.C_gc_gg.connect_random(self.GC, self.GG, sparseness=self.p_gc2gg,
-                                    weight=self.w_gc2gg)
-        self.C_gc_gg.connect_random(self.GG, self.GC, sparseness=self.p_gg2gc,
-                                    weight=self.w_gg2gc)
+        self.C_gc_gg = self.new_connection(self, 'ge')
+        self.connect(self.C_gc_gg, self.GC, self.GG, self.p_gc2gg,
+                     self.w_gc2gg, self.r_gc2gg)
+        self.connect(self.C_gc_gg, self.GG, self.GC, self.p_gg2gc,
+                     self.w_gg2gc, self.r_gg2gc)
     
     def connect_mf(self, ng):
         '''Connect neuron group 'ng' to GC and GG acting as mossy fiber'''
         print 'Warning: connect_mf() only supports one neuron group as input for now'
-        self.C_input = Connection(ng,self,'ge')
-        self.C_input.connect_random(ng,self.GC, sparseness=self.p_mf2gc,
-                                    weight=self.w_mf2gc)
-        self.C_input.connect_random(ng, self.GC, sparseness=self.p_mf2GG,
-                                    weight=self.w_mf2gg)
+        self.C_input = self.new_connection(ng, 'ge')
+        if self.topology:
+            self.place(ng)
+        self.connect(self.C_input, ng, self.GC, self.p_mf2gc,
+                     self.w_mf2gc, self.r_mf2gc)
+        self.connect(self.C_input, ng, self.GG, self.p_mf2gg,
+                     self.w_mf2gg, self.r_mf2gg)
         print 'Connected %s to granule-golgi cell layer' % (ng)
 
 if __name__ == "__main__":
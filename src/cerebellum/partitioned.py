@@ -0,0 +1,427 @@
+'''
+Multi-process partitioned simulation of a GranuleGolgi layer
+
+PartitionedGranuleGolgi splits the granule and golgi cells of a built
+GranuleGolgi into contiguous shards, each made of a slice of the GC and
+a slice of the GG, and simulates each shard in its own worker process.
+A shard integrates only its own neurons, with IzhikevichEngine or
+ExponentialIzhikevichEngine, and holds only their incoming synapses,
+its columns of C_gc_gg and C_input.
+
+All synapses of the layer act after the same delay of D time steps: a
+spike of step n is added before the update of step n+D.  By default
+D = 1, which is what the layer's Connections (without delay) do, so
+the partitioned run is the layer's model, spike for spike.  Within a
+window of D steps no shard needs the spikes of another, so the shards
+write the spikes of a window into shared-memory buffers and meet at a
+barrier once per window.  A longer delay (e.g. 1 ms, a synaptic delay
+of the cerebellar cortex) is an explicit change of the model that
+makes the windows, and the exchanges, D times rarer.  The mossy fibres
+are not exchanged: every shard regenerates all their Poisson spikes
+from a counter-based hash of (seed, step), as procedural connections
+do.
+
+The spikes of a window are delivered in order of step and source,
+whatever the shards, and each target sums its input of a step from
+zero in that order.  So the spikes and final state are bit-identical
+for any number of shards.
+'''
+import traceback
+import multiprocessing
+from multiprocessing.sharedctypes import RawArray, RawValue
+import numpy as np
+from brian import *
+from scipy.sparse import csc_matrix, csr_matrix, hstack
+from cortex.neuron_groups import IzhikevichGroup
+from cortex.delay_connection import scatter_add, segment_positions
+from utils import ProceduralConnection, procedural_rows, procedural_weights
+
+# scipy.sparse.hstack must not leak through the star imports of cerebellum
+__all__ = ['PartitionedGranuleGolgi']
+
+# state variables copied into the shards, and back after a run
+_STATE = ['v', 'u', 'ge', 'gi', 'I', 'a', 'b', 'c', 'd', 'taue', 'taui']
+_DYNAMIC = ['v', 'u', 'ge', 'gi']
+
+
+def _bounds(n, shards):
+    '''first cell of each of the contiguous shards of n cells, then n'''
+    return np.array([n * s // shards for s in range(shards + 1)])
+
+def _stored_csc(C):
+    '''the weights of a connection with stored synapses, as a CSC matrix'''
+    W = C.W
+    shape = (len(C.source), len(C.target))
+    if hasattr(W, 'alldata'):
+        # compressed SparseConnectionMatrix
+        return csr_matrix((np.asarray(W.alldata), np.asarray(W.allj),
+                           np.asarray(W.rowind, dtype=np.int64)),
+                          shape).tocsc()
+    if hasattr(W, 'tocsc'):
+        return W.tocsc()
+    return csc_matrix(np.asarray(W))
+
+
+class _Barrier(object):
+    '''
+    reusable barrier of n processes (python 2 has no
+    multiprocessing.Barrier).  abort fails the waiting processes and all
+    later waits, so one failed shard does not hang the others.
+    '''
+    def __init__(self, n):
+        self.n = n
+        self._cond = multiprocessing.Condition()
+        self._count = RawValue('i', 0)
+        self._generation = RawValue('i', 0)
+        self._aborted = RawValue('i', 0)
+
+    def wait(self):
+        with self._cond:
+            generation = self._generation.value
+            self._count.value += 1
+            if self._count.value == self.n:
+                self._count.value = 0
+                self._generation.value += 1
+                self._cond.notify_all()
+            while generation == self._generation.value:
+                if self._aborted.value:
+                    raise RuntimeError('another shard failed')
+                self._cond.wait()
+
+    def abort(self):
+        with self._cond:
+            self._aborted.value = 1
+            self._cond.notify_all()
+
+
+class _StoredSynapses(object):
+    '''the stored synapses of W (CSC) onto the given column ranges'''
+    def __init__(self, W, ranges):
+        W = hstack([W[:, lo:hi] for lo, hi in ranges]).tocsr()
+        W.sort_indices()
+        self.indptr = W.indptr.astype(np.int64)
+        self.indices, self.data = W.indices, W.data
+
+    def targets(self, sources):
+        '''
+        (owner, target, weight) of the synapses of the sources: the
+        position of the source in sources, the local target id and the
+        weight, ordered by owner
+        '''
+        pos, counts = segment_positions(self.indptr, sources)
+        owner = np.repeat(np.arange(len(sources)), counts)
+        return owner, self.indices[pos], self.data[pos]
+
+
+class _ProceduralSynapses(object):
+    '''
+    the synapses of a ProceduralConnection onto the cells local maps to
+    shard ids (-1 elsewhere), regenerated from their seeds
+    '''
+    def __init__(self, C, local):
+        self.blocks = C._blocks
+        self.local = local
+
+    def targets(self, sources):
+        '''see _StoredSynapses.targets'''
+        owners, targets, weights = [], [], []
+        for i0, n, j0, m, p, weight, seed in self.blocks:
+            inside = np.flatnonzero((sources >= i0) & (sources < i0 + n))
+            if not len(inside):
+                continue
+            s = sources[inside] - i0
+            counts, ind = procedural_rows(seed, s, m, p)
+            w = procedural_weights(seed, s, counts, ind, weight)
+            j = self.local[ind + j0]
+            keep = j >= 0
+            owners.append(np.repeat(inside, counts)[keep])
+            targets.append(j[keep])
+            weights.append(w[keep])
+        if not owners:
+            return (np.zeros(0, dtype=int), np.zeros(0, dtype=int),
+                    np.zeros(0))
+        owner = np.concatenate(owners)
+        order = np.argsort(owner, kind='mergesort')
+        return (owner[order], np.concatenate(targets)[order],
+                np.concatenate(weights)[order])
+
+
+class _Shard(object):
+    '''the neurons of shard s, their incoming synapses and pending input'''
+    def __init__(self, net, s):
+        layer = net.layer
+        self.net, self.s = net, s
+        self.own = own = net.own(s)
+        local = -np.ones(len(layer), dtype=np.int64)
+        local[own] = np.arange(len(own))
+        self.G = IzhikevichGroup(len(own), 'a', 'b', 'c', 'd', 'taue',
+                                 'taui', Vt=net.Vt, rand_init=False,
+                                 engine=net.engine,
+                                 clock=Clock(dt=net.dt*second))
+        for name in _STATE:
+            self.G.state_(name)[:] = layer.state_(name)[own]
+        self.engine = self.G._state_updater
+        self.pending = net.pending[:, :, own].copy()
+        ranges = net.ranges(s)
+        self.synapses = []
+        for C, W, mossy in net.connections:
+            if W is None:
+                synapses = _ProceduralSynapses(C, local)
+            else:
+                synapses = _StoredSynapses(W, ranges)
+            self.synapses.append((synapses, net.vars.index(C.nstate),
+                                  mossy))
+
+    def run(self, step0, n_steps, barrier):
+        '''
+        simulate n_steps from step0, window by window; returns the
+        (steps, ids) of the spikes of all shards on shard 0
+        '''
+        net = self.net
+        D = net.delay_steps
+        S = self.G._S
+        record = []
+        for w0 in xrange(step0, step0 + n_steps, D):
+            L = min(D, step0 + n_steps - w0)
+            parity = (w0 - step0) // D % 2
+            ids = net._ids[parity][self.s]
+            counts = net._counts[parity][self.s]
+            c = 0
+            for k in xrange(L):
+                r = (w0 + k) % D
+                for var, pending in zip(net.vars, self.pending):
+                    S[var] += pending[r]
+                    pending[r] = 0
+                self.engine(self.G)
+                spikes = self.engine.spikes
+                ids[c:c + len(spikes)] = self.own[spikes]
+                counts[k] = len(spikes)
+                c += len(spikes)
+            barrier.wait()
+            k, i = net.exchanged(parity, L)
+            if self.s == 0:
+                record.append((k + w0, i))
+            self.deliver(w0, L, k, i)
+        if not record:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        return tuple(np.concatenate(x) for x in zip(*record))
+
+    def deliver(self, w0, L, k, i):
+        '''
+        add the synapses of the layer spikes (k, i) and of the mossy
+        fibre spikes of the window to the pending input of step
+        w0+k+D, that is to its slot (w0+k) % D.  the slots were freed
+        in the window, so each target sums from zero, in spike order.
+        '''
+        D, n = self.net.delay_steps, len(self.own)
+        sources = [(k, i), self.net.mossy_spikes(w0, L)]
+        slots = [([], []) for _ in self.net.vars]
+        for synapses, var, mossy in self.synapses:
+            steps, ids = sources[mossy]
+            owner, target, weight = synapses.targets(ids)
+            flat = (w0 + steps[owner]) % D * n
+            flat += target
+            slots[var][0].append(flat)
+            slots[var][1].append(weight)
+        for pending, (flat, weight) in zip(self.pending, slots):
+            if flat:
+                scatter_add(pending.reshape(-1), np.concatenate(flat),
+                            np.concatenate(weight))
+
+
+def _run_shard(net, s, n_steps, barrier):
+    shard = _Shard(net, s)
+    spikes = shard.run(net.step, n_steps, barrier)
+    state = dict((name, shard.G.state_(name).copy()) for name in _DYNAMIC)
+    return {'spikes': spikes, 'state': state, 'pending': shard.pending}
+
+def _worker(net, s, n_steps, barrier, conn):
+    '''worker process of shard s: its result, or the traceback'''
+    try:
+        result = _run_shard(net, s, n_steps, barrier)
+    except Exception:
+        barrier.abort()
+        result = traceback.format_exc()
+    conn.send(result)
+    conn.close()
+
+
+def _receive(pipes, workers, barrier):
+    '''
+    the results of the workers; if one dies without sending any, the
+    others are released from the barrier
+    '''
+    results = [None] * len(pipes)
+    while None in results:
+        for s, receive in enumerate(pipes):
+            if results[s] is not None or not receive.poll(.1):
+                continue
+            try:
+                results[s] = receive.recv()
+            except EOFError:
+                workers[s].join()
+                barrier.abort()
+                results[s] = 'shard %d died (exit code %s)' % (
+                    s, workers[s].exitcode)
+    return results
+
+
+class PartitionedGranuleGolgi(object):
+    '''
+    partitioned, multi-process simulation of the GranuleGolgi layer,
+    see the module docstring.
+
+    layer -- a GranuleGolgi, with connect_mf done if it has input.  its
+    mossy fibres must be a PoissonGroup with fixed rates.  the state of
+    the layer is the initial state, and is updated by each run.
+    shards -- number of shards and worker processes (all CPUs by
+    default); with 1 the layer is simulated in this process
+    delay -- delay of all synapses, a multiple of the layer's dt, and
+    the window between two exchanges of spikes.  None (one dt) keeps
+    the layer's model; a longer delay changes the model, for fewer
+    exchanges.
+    engine -- 'numpy' or 'exponential', see IzhikevichGroup
+    seed -- seed of the mossy fibre spikes (the layer's seed by default)
+
+    use:
+        net = PartitionedGranuleGolgi(layer, shards=4)
+        i, t = net.run(1*second)
+    '''
+    def __init__(self, layer, shards=None, delay=None, engine='numpy',
+                 Vt=30*mV, seed=None):
+        if engine not in ('numpy', 'exponential'):
+            raise ValueError("engine must be 'numpy' or 'exponential'")
+        self.layer = layer
+        self.shards = shards or multiprocessing.cpu_count()
+        self.dt = float(layer.clock.dt)
+        if delay is None:
+            self.delay_steps = 1
+        else:
+            self.delay_steps = int(round(float(delay) / self.dt))
+        if self.delay_steps < 1:
+            raise ValueError('delay must be at least one time step')
+        self.engine, self.Vt = engine, Vt
+        self.seed = layer.seed if seed is None else seed
+        self.step = 0
+
+        # (connection, CSC weights or None if procedural, from mossy fibres)
+        self.connections = [(layer.C_gc_gg, False)]
+        self.mf_rates = None
+        if hasattr(layer, 'C_input'):
+            P = layer.C_input.source
+            if not isinstance(P, PoissonGroup) or P._variable_rate:
+                raise ValueError('the mossy fibres must be a PoissonGroup '
+                                 'with fixed rates')
+            self.mf_rates = np.array(P.state_('rate'), dtype=float)
+            if self.mf_rates.max() * self.dt > 1:
+                raise ValueError('mossy fibre rates above 1/dt')
+            self.connections.append((layer.C_input, True))
+        self.connections = [(C, None if isinstance(C, ProceduralConnection)
+                             else _stored_csc(C), mossy)
+                            for C, mossy in self.connections]
+        self.vars = sorted(set(C.nstate for C, _, _ in self.connections))
+        self.pending = np.zeros((len(self.vars), self.delay_steps,
+                                 len(layer)))
+
+        self.gc_bounds = _bounds(layer.N_gc, self.shards)
+        self.gg_bounds = _bounds(layer.N_gg, self.shards) + layer.N_gc
+        # exchange buffers, two per shard (for even and odd windows) so
+        # that a shard can write a window while others read the last one
+        D = self.delay_steps
+        sizes = [D * len(self.own(s)) for s in range(self.shards)]
+        offsets = np.r_[0, np.cumsum(sizes)]
+        ids = np.frombuffer(RawArray('i', max(2 * offsets[-1], 1)),
+                            dtype=np.int32)
+        counts = np.frombuffer(RawArray('i', 2 * self.shards * D),
+                               dtype=np.int32).reshape(2, self.shards, D)
+        self._ids = [[ids[p * offsets[-1]:][offsets[s]:offsets[s + 1]]
+                      for s in range(self.shards)] for p in range(2)]
+        self._counts = counts
+
+    def ranges(self, s):
+        '''the (first, last+1) layer ids of the GC and GG of shard s'''
+        return [(self.gc_bounds[s], self.gc_bounds[s + 1]),
+                (self.gg_bounds[s], self.gg_bounds[s + 1])]
+
+    def own(self, s):
+        '''the layer ids of the neurons of shard s'''
+        return np.concatenate([np.arange(lo, hi) for lo, hi in
+                               self.ranges(s)])
+
+    @property
+    def t(self):
+        '''time simulated so far'''
+        return self.step * self.dt * second
+
+    def exchanged(self, parity, L):
+        '''
+        (k, i) of the spikes of all shards in a window of L steps, k the
+        step in the window: sorted by step and id, whatever the shards
+        '''
+        ks, ids = [], []
+        for s in range(self.shards):
+            counts = self._counts[parity][s][:L]
+            ks.append(np.repeat(np.arange(L), counts))
+            ids.append(self._ids[parity][s][:counts.sum()])
+        k, i = np.concatenate(ks), np.concatenate(ids).astype(np.int64)
+        order = np.lexsort((i, k))
+        return k[order], i[order]
+
+    def mossy_spikes(self, w0, L):
+        '''
+        (k, i) of the mossy fibre spikes of steps w0..w0+L-1, hashed
+        from (seed, step) and sorted by step and fibre: Bernoulli with
+        the largest rate, thinned by rate/largest rate
+        '''
+        rates = self.mf_rates
+        if rates is None or not len(rates) or rates.max() <= 0:
+            return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+        steps = np.arange(w0, w0 + L)
+        top = rates.max()
+        counts, i = procedural_rows(self.seed, steps, len(rates),
+                                    top * self.dt)
+        k = np.repeat(np.arange(L), counts)
+        if (rates < top).any():
+            u = procedural_weights(self.seed, steps, counts, i, (0., 1.))
+            keep = u * top < rates[i]
+            k, i = k[keep], i[keep]
+        return k, i.astype(np.int64)
+
+    def run(self, duration):
+        '''
+        simulate the layer for duration; returns the spikes (i, t) of
+        the run, sorted by time and neuron (as SpikeMonitor.it)
+        '''
+        n_steps = int(round(float(duration) / self.dt))
+        if self.shards == 1:
+            results = [_run_shard(self, 0, n_steps, _Barrier(1))]
+        else:
+            barrier = _Barrier(self.shards)
+            pipes, workers = [], []
+            for s in range(self.shards):
+                receive, send = multiprocessing.Pipe(False)
+                worker = multiprocessing.Process(
+                    target=_worker, args=(self, s, n_steps, barrier, send))
+                worker.start()
+                send.close()
+                pipes.append(receive)
+                workers.append(worker)
+            try:
+                results = _receive(pipes, workers, barrier)
+            finally:
+                for worker in workers:
+                    worker.join()
+            errors = [r for r in results if isinstance(r, str)]
+            if errors:
+                # the first error, not an abort it caused in other shards
+                errors.sort(key=lambda e: 'another shard failed' in e)
+                raise RuntimeError('shard failed:\n' + errors[0])
+
+        for s, result in enumerate(results):
+            own = self.own(s)
+            for name, x in result['state'].items():
+                self.layer.state_(name)[own] = x
+            self.pending[:, :, own] = result['pending']
+        self.step += n_steps
+        steps, i = results[0]['spikes']
+        return i, steps * self.dt
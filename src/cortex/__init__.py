@@ -1 +1,8 @@
-from neuron_groups import *
\ No newline at end of file
+from neuron_groups import *
+from izhikevich_engine import *
+from delay_connection import *
+from polychronous_groups import *
+from stdp import *
+from checkpoint import *
+from weight_stats import *
+from parameter_sweep import *
@@ -0,0 +1,226 @@
+'''
+Memory-mapped checkpoints of a running network
+
+A checkpoint is a directory holding one .npy file per state array,
+opened as memory maps.  Saving copies the live arrays into the maps and
+flushes them, so the cost is a memcpy of the state plus the disk write,
+with no pickling.  Two slots ('a' and 'b') are written alternately and
+a small 'latest' file is renamed over after the flush, so a crash while
+saving leaves the previous checkpoint intact.
+
+What is saved:
+    NeuronGroup                 the state matrix (v, u, ge, gi, I, ...)
+    RingBufferDelayConnection   CSR arrays, weights, ring buffer
+    DelayConnection             pending delayed input (and sparse weights)
+    RingBufferSTDP              traces, timestamps, queued arrivals
+    the network's clocks and numpy's global random state
+The spike logs (SpikeLogger) of the network are flushed at each save,
+so that a resumed run finds every spike before the checkpoint on disk.
+'''
+import os
+import numpy as np
+from brian import *
+from numpy.lib.format import open_memmap
+from delay_connection import RingBufferDelayConnection
+from stdp import RingBufferSTDP
+from utils import SpikeLogger
+
+
+def _state_arrays(obj):
+    '''
+    (name, array, static) triples describing the state of obj.  static
+    arrays do not change during a run and are written once per slot.
+    '''
+    if isinstance(obj, NeuronGroup):
+        return [('S', obj._S, False)]
+    if isinstance(obj, RingBufferDelayConnection):
+        obj.compress()
+        return [('indptr', obj.indptr, True),
+                ('indices', obj.indices, True),
+                ('delay_steps', obj.delay_steps, True),
+                ('w', obj.w, False),
+                ('buffer', obj._buffer, False),
+                ('cur', np.array([obj._cur]), False)]
+    if isinstance(obj, RingBufferSTDP):
+        if obj._w is not obj.C.w:
+            obj._bind()
+        pending = [np.concatenate(p) if p else np.zeros(0, dtype=np.int64)
+                   for p in obj._pending]
+        return [('A_pre', obj.A_pre, False), ('t_pre', obj.t_pre, False),
+                ('A_post', obj.A_post, False), ('t_post', obj.t_post, False),
+                ('steps', np.array([obj._cur, obj._step]), False),
+                ('pending', np.concatenate(pending), False),
+                ('pending_counts', np.array([len(p) for p in pending]), False)]
+    if isinstance(obj, Connection):
+        arrays = []
+        if isinstance(obj, DelayConnection):
+            arrays += [('buffer', obj._delayedreaction, False),
+                       ('cur', np.array([obj._cur_delay_ind]), False)]
+        if hasattr(obj.W, 'alldata'):
+            arrays.append(('w', obj.W.alldata, False))
+        return arrays
+    raise TypeError('cannot checkpoint %r' % obj)
+
+
+def _restore(obj, state):
+    '''copy the arrays of state (a dict name -> array) back into obj'''
+    if isinstance(obj, NeuronGroup):
+        obj._S[:] = state['S']
+    elif isinstance(obj, RingBufferDelayConnection):
+        obj.set_arrays(np.array(state['indptr']), np.array(state['indices']),
+                       np.array(state['w']), np.array(state['delay_steps']))
+        obj._buffer[:] = state['buffer']
+        obj._cur = int(state['cur'][0])
+    elif isinstance(obj, RingBufferSTDP):
+        obj._bind()
+        obj.A_pre[:], obj.t_pre[:] = state['A_pre'], state['t_pre']
+        obj.A_post[:], obj.t_post[:] = state['A_post'], state['t_post']
+        obj._cur, obj._step = [int(x) for x in state['steps']]
+        ends = np.cumsum(state['pending_counts'])
+        obj._pending = [[np.array(p)] if len(p) else []
+                        for p in np.split(state['pending'], ends[:-1])]
+    else:
+        if 'buffer' in state:
+            obj._delayedreaction[:] = state['buffer']
+            obj._cur_delay_ind = int(state['cur'][0])
+        if 'w' in state:
+            obj.W.alldata[:] = state['w']
+
+
+class NetworkCheckpoint(object):
+    '''
+    Periodic checkpoints of net to the directory path.
+
+    objects is the list of groups, connections and RingBufferSTDP
+    objects to save, in an order that does not change between the
+    original run and the resumed one.  To resume, rebuild the network
+    with the same script (and seeds), add every() to it, call restore()
+    and run for the remaining time.
+    '''
+    def __init__(self, path, net, objects):
+        self.path = path
+        self.net = net
+        self.objects = list(objects)
+        self._maps = {}
+        for slot in 'ab':
+            if not os.path.isdir(os.path.join(path, slot)):
+                os.makedirs(os.path.join(path, slot))
+
+    def every(self, period):
+        '''
+        network operation saving a checkpoint every period of simulated
+        time.  Its clock has the lowest order, so a checkpoint is taken
+        before anything else runs at that time step, and a restored
+        network restarts exactly there.
+        '''
+        @network_operation(Clock(dt=period, order=-1000))
+        def save_checkpoint():
+            self.save()
+        return save_checkpoint
+
+    def _clocks(self):
+        '''
+        the clocks of the network, in the order in which its groups and
+        operations first use them.  Brian keeps them in a set, whose
+        order can change from one process to the next, but this order
+        only depends on how the network is built.
+        '''
+        if not self.net.prepared:
+            self.net.prepare()
+        if not getattr(self.net, 'clocks', None):
+            return [self.net.clock]
+        clocks, seen = [], set()
+        for obj in self.net.groups + self.net.operations:
+            if id(obj.clock) not in seen:
+                seen.add(id(obj.clock))
+                clocks.append(obj.clock)
+        return clocks
+
+    def _entries(self):
+        '''(file name, array, static) for everything that is saved'''
+        entries = []
+        for k, obj in enumerate(self.objects):
+            for name, array, static in _state_arrays(obj):
+                entries.append(('%d.%s' % (k, name), array, static))
+        # clocks: the integer time step is private in Brian's Clock
+        clocks = [(c._dt, c.order, c._Clock__t, c._gridoffset)
+                  for c in self._clocks()]
+        entries.append(('clocks', np.array(clocks, dtype=float), False))
+        _, keys, pos, has_gauss, gauss = np.random.get_state()
+        entries.append(('rng.keys', keys, False))
+        entries.append(('rng.state', np.array([pos, has_gauss, gauss]), False))
+        return entries
+
+    def latest(self):
+        '''directory of the last complete checkpoint, or None'''
+        try:
+            with open(os.path.join(self.path, 'latest')) as f:
+                slot = f.read().strip()
+        except IOError:
+            return None
+        return os.path.join(self.path, slot)
+
+    def save(self):
+        '''write a checkpoint to the older slot and mark it as the latest'''
+        for obj in self.net.connections + self.net.operations:
+            # prepare merges connections of one source (monitors too)
+            for C in getattr(obj, 'connections', [obj]):
+                if isinstance(C, SpikeLogger):
+                    C.flush()
+        last = self.latest()
+        slot = 'b' if last and last.endswith('a') else 'a'
+        maps = []
+        for name, array, static in self._entries():
+            key = (slot, name)
+            m = self._maps.get(key)
+            fresh = (m is None or m.shape != array.shape or
+                     m.dtype != array.dtype)
+            if fresh:
+                m = open_memmap(os.path.join(self.path, slot, name + '.npy'),
+                                mode='w+', dtype=array.dtype, shape=array.shape)
+                self._maps[key] = m
+            if fresh or not static:
+                m[...] = array
+                maps.append(m)
+        for m in maps:
+            m.flush()
+        tmp = os.path.join(self.path, 'latest.tmp')
+        with open(tmp, 'w') as f:
+            f.write(slot)
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(tmp, os.path.join(self.path, 'latest'))
+
+    def restore(self):
+        '''
+        load the latest checkpoint into the network, returns the time
+        of the checkpoint or None if there is none
+        '''
+        last = self.latest()
+        if last is None:
+            return None
+        def load(name):
+            return np.load(os.path.join(last, name + '.npy'), mmap_mode='r')
+        # a restored RingBufferDelayConnection gets new arrays, which its
+        # RingBufferSTDP would rebind to (wiping its traces), so every
+        # STDP object is restored after the connections
+        order = sorted(enumerate(self.objects),
+                       key=lambda item: isinstance(item[1], RingBufferSTDP))
+        for k, obj in order:
+            names = [name for name, _, _ in _state_arrays(obj)]
+            _restore(obj, dict((name, load('%d.%s' % (k, name)))
+                               for name in names))
+        # clocks are matched by position: several can share dt and order
+        saved = load('clocks')
+        clocks = self._clocks()
+        if [(c._dt, c.order) for c in clocks] != \
+                [(dt, order) for dt, order, _, _ in saved]:
+            raise ValueError('the clocks of the network do not match those '
+                             'of the checkpoint')
+        for (_, _, t, offset), c in zip(saved, clocks):
+            c._Clock__t = int(t)
+            c._gridoffset = offset
+        pos, has_gauss, gauss = load('rng.state')
+        np.random.set_state(('MT19937', np.array(load('rng.keys')), int(pos),
+                             int(has_gauss), float(gauss)))
+        return min(c.t for c in self._clocks())
@@ -0,0 +1,192 @@
+'''
+Delayed connections delivered through a ring buffer
+
+RingBufferDelayConnection does what DelayConnection does for a sparse
+random network, but the delays are quantized once to uint8 numbers of
+time steps and the synapses are kept in plain CSR arrays.  When neurons
+spike, their CSR row segments are gathered in one vectorized pass and
+scatter-added into a circular buffer of pending input, indexed by
+arrival step.  The cost of a step is O(spikes x fan-out) plus one row
+of the buffer, independent of the number of synapses.
+'''
+import numpy as np
+from brian import *
+from scipy.sparse import csr_matrix
+from utils import sparse_rand_indices
+
+
+def scatter_add(out, index, values):
+    '''
+    out[index] += values, summing repeated indices, for a 1-d out.
+    uses a bincount over the touched range of out when the indices are
+    dense enough, and a sort otherwise, instead of the slow np.add.at
+    '''
+    if len(index) < 64:
+        np.add.at(out, index, values)
+        return
+    lo, hi = index.min(), index.max() + 1
+    if hi - lo <= 16 * len(index):
+        out[lo:hi] += np.bincount(index - lo, weights=values, minlength=hi-lo)
+        return
+    order = np.argsort(index, kind='mergesort')
+    index, values = index[order], values[order]
+    first = np.flatnonzero(np.r_[True, index[1:] != index[:-1]])
+    out[index[first]] += np.add.reduceat(values, first)
+
+def segment_positions(indptr, rows):
+    '''
+    positions in the CSR data arrays of all synapses of the given rows,
+    concatenated in row order, and the number of synapses of each row
+    '''
+    starts = indptr[rows]
+    counts = indptr[rows + 1] - starts
+    total = counts.sum()
+    if total == 0:
+        return np.zeros(0, dtype=np.int64), counts
+    offsets = np.cumsum(counts) - counts
+    pos = np.arange(total, dtype=np.int64)
+    pos += np.repeat(starts - offsets, counts)
+    return pos, counts
+
+
+class RingBufferDelayConnection(Connection):
+    '''
+    Sparse connection with heterogeneous delays, delivered through a
+    ring buffer of max_delay/dt + 1 rows.
+
+    Build it like a DelayConnection with connect_random (constant or
+    (min,max) uniform weights and delays) or connect (sparse weight and
+    delay matrices, e.g. from random_weights_delays).  Delays are
+    rounded to the nearest time step of the target clock, and at most
+    255 steps are supported.
+
+    After the first run (or compress) the synapses are available as
+    CSR arrays: indptr, indices, w (weights) and delay_steps, and W is
+    a scipy CSR matrix sharing those arrays.
+    '''
+    def __init__(self, source, target, state=0, max_delay=5*msecond):
+        self.source = source
+        self.target = target
+        self.state = state
+        if isinstance(state, str):
+            self.nstate = target.get_var_index(state)
+        else:
+            self.nstate = state
+        self._nstate_mod = None
+        self.delay = 0
+        self.iscompressed = False
+        self._blocks = []
+
+        self.dt = float(target.clock.dt)
+        self.max_delay_steps = int(round(float(max_delay) / self.dt))
+        if self.max_delay_steps > 255:
+            raise ValueError('max_delay is more than 255 time steps')
+        self.n_slots = self.max_delay_steps + 1
+        self._buffer = np.zeros((self.n_slots, len(target)))
+        self._flat_buffer = self._buffer.reshape(-1)
+        self._cur = 0
+
+        @network_operation(clock=target.clock, when='after_connections')
+        def delayed_propagate():
+            # deliver the input arriving now and free its slot
+            target._S[self.nstate] += self._buffer[self._cur]
+            self._buffer[self._cur] = 0.0
+            self._cur = (self._cur + 1) % self.n_slots
+        self.delayed_propagate = delayed_propagate
+        self.contained_objects = [delayed_propagate]
+
+    def connect(self, source=None, target=None, W=None, delay=None):
+        '''
+        connect P->Q with the sparse weight matrix W and the delay matrix
+        with the same nonzero structure (or a single delay value)
+        '''
+        P = source or self.source
+        Q = target or self.target
+        i0, j0 = self.origin(P, Q)
+        W = csr_matrix(W)
+        W.sort_indices()
+        if isinstance(delay, csr_matrix) or hasattr(delay, 'tocsr'):
+            D = csr_matrix(delay)
+            D.sort_indices()
+            if not (np.array_equal(D.indptr, W.indptr) and
+                    np.array_equal(D.indices, W.indices)):
+                raise ValueError('weight and delay matrices must have the '
+                                 'same nonzero structure')
+            d = D.data
+        else:
+            d = np.ones(W.nnz) * float(delay or 0)
+        self._add_block(i0, j0, W.indptr, W.indices, W.data, d)
+
+    def connect_random(self, source=None, target=None, p=1., weight=1.,
+                       delay=0*ms, seed=None, sparseness=None):
+        '''
+        connect exactly int(len(P)*len(Q)*p) random pairs of P->Q.
+        weight and delay are values or (min,max) uniform ranges.
+        '''
+        P = source or self.source
+        Q = target or self.target
+        if sparseness is not None: p = sparseness # synonym
+        i0, j0 = self.origin(P, Q)
+        indptr, indices, rng = sparse_rand_indices(len(P), len(Q), p,
+                                                   seed=seed)
+        nnz = len(indices)
+        def values(x):
+            if isinstance(x, tuple):
+                return float(x[0]) + float(x[1]-x[0]) * rng.rand(nnz)
+            return np.ones(nnz) * float(x)
+        self._add_block(i0, j0, indptr, indices, values(weight), values(delay))
+
+    def _add_block(self, i0, j0, indptr, indices, w, d):
+        self.iscompressed = False
+        rows = np.repeat(np.arange(len(indptr)-1), np.diff(indptr)) + i0
+        self._blocks.append((rows, indices + j0, np.asarray(w, dtype=float),
+                             np.asarray(d, dtype=float)))
+
+    def compress(self):
+        '''merge all blocks into the CSR arrays and quantize the delays'''
+        if self.iscompressed:
+            return
+        if self._blocks:
+            rows, cols, w, d = [np.concatenate(x) for x in zip(*self._blocks)]
+        else:
+            rows = cols = np.zeros(0, dtype=int)
+            w = d = np.zeros(0)
+        order = np.lexsort((cols, rows))
+        steps = np.round(d[order] / self.dt)
+        if len(steps) and (steps.min() < 0 or steps.max() > self.max_delay_steps):
+            raise ValueError('delays must be in [0, max_delay]')
+        counts = np.bincount(rows, minlength=len(self.source))
+        indptr = np.zeros(len(self.source) + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        self.set_arrays(indptr, cols[order], w[order], steps)
+
+    def set_arrays(self, indptr, indices, w, delay_steps):
+        '''use the given CSR arrays (rows sorted by column) as synapses'''
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.w = np.asarray(w, dtype=float)
+        self.delay_steps = np.asarray(delay_steps, dtype=np.uint8)
+        self.W = csr_matrix((self.w, self.indices, self.indptr),
+                            (len(self.source), len(self.target)), copy=False)
+        rows = np.repeat(np.arange(len(self.source)), np.diff(self.indptr))
+        self._blocks = [(rows, self.indices, self.w,
+                         self.delay_steps * self.dt)]
+        self.iscompressed = True
+
+    def propagate(self, spikes):
+        if not self.iscompressed:
+            self.compress()
+        if not len(spikes):
+            return
+        pos, counts = segment_positions(self.indptr, spikes)
+        if not len(pos):
+            return
+        slots = self.delay_steps[pos].astype(np.int64)
+        slots += self._cur
+        slots[slots >= self.n_slots] -= self.n_slots
+        flat = slots * len(self.target)
+        flat += self.indices[pos]
+        scatter_add(self._flat_buffer, flat, self.w[pos])
+
+    def do_propagate(self):
+        self.propagate(self.source.get_spikes(0))
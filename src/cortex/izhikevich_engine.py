@@ -0,0 +1,226 @@
+'''
+Hard-coded NumPy integration of the IzhikevichGroup equations
+
+Brian integrates IzhikevichGroup through its generic equation
+interpreter.  IzhikevichEngine replaces that state updater with a
+forward Euler step written out by hand for the v/u/ge/gi equations,
+working in place on the group's unitless state arrays with
+preallocated buffers.  Threshold detection and the v<-c, u<-u+d reset
+are done in the same pass.
+
+ExponentialIzhikevichEngine integrates the same equations in a way that
+stays accurate at dt = 1 ms, where Euler on the quadratic v equation
+loses spike timing:
+- ge and gi decay exactly, ge <- ge*exp(-dt/taue), and drive v with
+  their mean over the step,
+- with u and the input frozen over the step, the v equation is a
+  Riccati equation, solved exactly: below the saddle-node it relaxes
+  to its fixed point, above it the solution blows up, which is a spike,
+- u relaxes exactly towards b*v, u <- b*v + (u-b*v)*exp(-a*dt).
+Over single neurons of the usual firing classes, it is closer to a
+0.01 ms Euler reference at dt = 1 ms than Euler is at dt = 0.5 ms
+(see benchmarks/izhikevich_integrators.py).
+
+Because the reset happens before connections propagate, spikes should
+arrive through 'ge', 'gi' or 'I' (the IzhikevichGroup input channels),
+not directly on 'v'.
+'''
+import numpy as np
+from brian.stateupdater import StateUpdater
+from brian.threshold import Threshold
+
+# constants of the v equation in SI units (V, s, A)
+_V2 = 0.04e6        # 0.04/ms/mV
+_V1 = 5e3           # 5/ms
+_V0 = 140.          # 140*mV/ms
+_I_SCALE = 1e9      # 1/nF
+_G_SCALE = 1e3      # 1/ms
+
+
+class IzhikevichEngine(StateUpdater):
+    '''
+    Fused Euler step + threshold + reset for an IzhikevichGroup
+
+    P - the group, whose state arrays are bound once here
+    Vt - spike threshold
+    '''
+    def __init__(self, P, Vt):
+        self.Vt = float(Vt)
+        self.v, self.u = P.state_('v'), P.state_('u')
+        self.ge, self.gi = P.state_('ge'), P.state_('gi')
+        self.I = P.state_('I')
+        self.a, self.b = P.state_('a'), P.state_('b')
+        self.c, self.d = P.state_('c'), P.state_('d')
+        self.taue, self.taui = P.state_('taue'), P.state_('taui')
+        N = len(P)
+        self._dv, self._du, self._tmp = np.empty(N), np.empty(N), np.empty(N)
+        self.spikes = np.zeros(0, dtype=int)
+        self._nstates = P._S.shape[0]
+
+    def __len__(self):
+        '''
+        Number of state variables (NeuronGroup.reinit resets this many)
+        '''
+        return self._nstates
+
+    def __call__(self, P):
+        dt = P.clock._dt
+        v, u, ge, gi = self.v, self.u, self.ge, self.gi
+        dv, du, tmp = self._dv, self._du, self._tmp
+
+        # dv/dt = 0.04*v**2 + 5*v + 140 - u + I/nF + (ge-gi)/ms
+        np.multiply(v, _V2, out=dv)
+        dv += _V1
+        dv *= v
+        dv += _V0
+        dv -= u
+        np.multiply(self.I, _I_SCALE, out=tmp)
+        dv += tmp
+        np.subtract(ge, gi, out=tmp)
+        tmp *= _G_SCALE
+        dv += tmp
+        # du/dt = a*(b*v-u)
+        np.multiply(self.b, v, out=du)
+        du -= u
+        du *= self.a
+        # Euler step, ge/gi decay as ge*(1-dt/taue)
+        dv *= dt
+        v += dv
+        du *= dt
+        u += du
+        np.divide(dt, self.taue, out=tmp)
+        np.subtract(1., tmp, out=tmp)
+        ge *= tmp
+        np.divide(dt, self.taui, out=tmp)
+        np.subtract(1., tmp, out=tmp)
+        gi *= tmp
+
+        # threshold and reset
+        np.greater(v, self.Vt, out=dv)
+        self.spikes = spikes = np.flatnonzero(dv)
+        if len(spikes):
+            v[spikes] = self.c[spikes]
+            u[spikes] += self.d[spikes]
+
+
+class EngineThreshold(Threshold):
+    '''returns the spikes already found by an IzhikevichEngine'''
+    def __init__(self, engine):
+        self.engine = engine
+
+    def __call__(self, P):
+        return self.engine.spikes
+
+
+class ExponentialIzhikevichEngine(IzhikevichEngine):
+    '''
+    Exponential (exact for frozen u and input) step + threshold + reset
+    for an IzhikevichGroup, see the module docstring
+
+    P - the group, whose state arrays are bound once here
+    Vt - spike threshold
+    '''
+    def __init__(self, P, Vt):
+        IzhikevichEngine.__init__(self, P, Vt)
+        N = len(P)
+        self._x, self._q, self._g = np.empty(N), np.empty(N), np.empty(N)
+        self._blowup = np.empty(N, dtype=bool)
+        self._key = None
+
+    def _factors(self, dt):
+        '''
+        the decay factors exp(-a*dt), exp(-dt/taue), exp(-dt/taui) and
+        the factors turning ge, gi into their mean drive of v over a
+        step, recomputed only when dt or a, taue, taui change
+        '''
+        params = self.a, self.taue, self.taui
+        key = self._key
+        if key is None or key[0] != dt or not all(
+                np.array_equal(x, y) for x, y in zip(params, key[1:])):
+            self._key = (dt,) + tuple(x.copy() for x in params)
+            self._eu = np.exp(-dt * self.a)
+            self._ee = np.exp(-dt / self.taue)
+            self._ei = np.exp(-dt / self.taui)
+            # mean of ge*exp(-t/taue) over the step, times 1/ms
+            self._me = self.taue * (1. - self._ee) * (_G_SCALE / dt)
+            self._mi = self.taui * (1. - self._ei) * (_G_SCALE / dt)
+        return self._eu, self._ee, self._ei, self._me, self._mi
+
+    def __call__(self, P):
+        dt = P.clock._dt
+        v, u, ge, gi = self.v, self.u, self.ge, self.gi
+        x, q, g, tmp = self._x, self._q, self._g, self._tmp
+        blowup = self._blowup
+        eu, ee, ei, me, mi = self._factors(dt)
+
+        # dv/dt = A*v**2 + B*v + C, with u and the input frozen in C and
+        # ge, gi replaced by their mean over the step
+        C = self._du
+        np.multiply(self.I, _I_SCALE, out=C)
+        C += _V0
+        C -= u
+        np.multiply(ge, me, out=tmp)
+        C += tmp
+        np.multiply(gi, mi, out=tmp)
+        C -= tmp
+        ge *= ee
+        gi *= ei
+
+        # x = 2*A*v + B obeys dx/dt = (x**2 + q)/2 with q = 4*A*C - B**2,
+        # so x(dt) = (x + q*g)/(1 - x*g), with g = tanh(w*dt/2)/w,
+        # w = sqrt(-q) if q < 0 and g = tan(w*dt/2)/w, w = sqrt(q) if
+        # q > 0 (no fixed point: the neuron is on its way to a spike)
+        np.multiply(C, 4 * _V2, out=q)
+        q -= _V1 ** 2
+        w = tmp
+        np.absolute(q, out=w)
+        np.sqrt(w, out=w)
+        np.maximum(w, 1e-12, out=w)
+        np.multiply(w, .5 * dt, out=x)
+        np.tanh(x, out=g)
+        above = np.flatnonzero(q > 0)
+        far = above[:0]
+        if len(above):
+            k = x[above]
+            # tan(w*dt/2) is of no use past a quarter period, see below
+            far = above[k >= np.pi / 2]
+            g[above] = np.tan(np.minimum(k, np.pi / 2))
+        g /= w
+        np.multiply(v, 2 * _V2, out=x)
+        x += _V1
+        den = self._dv
+        np.multiply(x, g, out=den)
+        np.subtract(1., den, out=den)
+        # the solution reaches its pole within the step: a spike
+        np.less_equal(den, 0., out=blowup)
+        np.maximum(den, 1e-12, out=den)
+        q *= g
+        x += q
+        x /= den
+        if len(far):
+            # x(t) = w*tan(phi + w*t/2) with phi = arctan(x/w) in
+            # (-pi/2, pi/2): the pole is within the step only if
+            # phi + w*dt/2 >= pi/2, which from x < 0 can take up to
+            # w*dt/2 = pi
+            wf = w[far]
+            phase = np.arctan((2 * _V2 * v[far] + _V1) / wf)
+            phase += .5 * dt * wf
+            blowup[far] = phase >= np.pi / 2
+            x[far] = wf * np.tan(np.minimum(phase, np.pi / 2))
+
+        # u relaxes towards b*v, with v frozen at the start of the step
+        np.multiply(self.b, v, out=tmp)
+        u -= tmp
+        u *= eu
+        u += tmp
+
+        x -= _V1
+        np.divide(x, 2 * _V2, out=v)
+        v[blowup] = np.inf
+
+        # threshold and reset
+        np.greater(v, self.Vt, out=blowup)
+        self.spikes = spikes = np.flatnonzero(blowup)
+        if len(spikes):
+            v[spikes] = self.c[spikes]
+            u[spikes] += self.d[spikes]
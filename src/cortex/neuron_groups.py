@@ -7,6 +7,8 @@ from brian.library.IF import *
 from brian.neurongroup import *
 from brian import *
 from utils import IzhikevichReset
+from izhikevich_engine import IzhikevichEngine, EngineThreshold, \
+    ExponentialIzhikevichEngine
 
 
 class IzhikevichGroup(NeuronGroup):
@@ -15,7 +17,7 @@ class IzhikevichGroup(NeuronGroup):
     '''
     
     def __init__(self, N, a, b, c, d, taue, taui, Vt=30*mV, rand_init=True,
-                 **kwargs):
+                 engine='brian', **kwargs):
         '''
         Initializes a group of Izhikevich spiking neurons with the
         following parameters:
@@ -37,6 +39,13 @@ class IzhikevichGroup(NeuronGroup):
         1.) 'I' current input (nA)
         2.) 'ge' excitatory synaptic input with conductance 'taue'
         3.) 'gi' inhibitory synaptic input with conductance 'taui'
+        
+        engine selects how the equations are integrated:
+        - 'brian' -- Brian's generic state updater, threshold and reset
+        - 'numpy' -- IzhikevichEngine, a hard-coded in-place Euler step
+          with threshold and reset fused into it
+        - 'exponential' -- ExponentialIzhikevichEngine, the same with an
+          exact step for frozen u and input, accurate at dt = 1 ms
         '''
         
         self.eqs = Equations('''
@@ -54,9 +63,19 @@ class IzhikevichGroup(NeuronGroup):
                     ''')
 
         
-        NeuronGroup.__init__(self, N, self.eqs, threshold=Vt, reset=IzhikevichReset(c,d), **kwargs)
+        NeuronGroup.__init__(self, N, self.eqs, threshold=Vt, reset=IzhikevichReset('c','d'), **kwargs)
         
         self.set_state(a,b,c,d,taue,taui)
+        
+        engines = {'numpy': IzhikevichEngine,
+                   'exponential': ExponentialIzhikevichEngine}
+        if engine in engines:
+            self._state_updater = engines[engine](self, Vt)
+            self._threshold = EngineThreshold(self._state_updater)
+            self._resetfun = NoReset()
+        elif engine != 'brian':
+            raise ValueError("engine must be 'brian', 'numpy' or "
+                             "'exponential'")
             
         if rand_init:
             self.rand_init()
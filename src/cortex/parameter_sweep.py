@@ -0,0 +1,122 @@
+'''
+Batched single-neuron simulations of Izhikevich parameter sets
+
+izhikevich_sweep packs K (a, b, c, d) parameter sets into one
+IzhikevichGroup of K unconnected neurons with per-neuron parameter
+arrays, drives each neuron with its own input current, and runs them
+all in one vectorized simulation instead of K networks of one neuron.
+
+When the recorded traces of all K neurons would not fit in max_bytes,
+the parameter sets are split into shards of at most that size, run in
+a process pool.
+'''
+import multiprocessing
+import numpy as np
+from brian import *
+from neuron_groups import IzhikevichGroup
+
+
+def _shard_size(n_steps, n_samples, n_record, max_bytes):
+    '''parameter sets per shard to keep stimuli and traces in max_bytes'''
+    per_neuron = 8 * (n_steps + n_samples * n_record + 16)
+    return max(1, int(max_bytes // per_neuron))
+
+def _run_shard(args):
+    '''simulate one shard, all quantities unitless (SI)'''
+    params, stimulus, settings = args
+    K = len(params)
+    clock = Clock(dt=settings['dt']*second)
+    a, b, c, d = params.T
+    G = IzhikevichGroup(K, a/ms, b/ms, c*mV, d*mV/ms, 1*ms, 1*ms,
+                        Vt=settings['Vt']*volt, rand_init=False,
+                        engine=settings['engine'], clock=clock)
+    G.v = settings['v0']*volt
+    G.u = 0
+    # (steps, K): the current of all neurons in a step is contiguous
+    stimulus = np.ascontiguousarray(stimulus.T) * 1e-9
+    I = G.state_('I')
+    # everything runs on the one clock: with several clocks the order
+    # of simultaneous updates is not fixed
+    ratio = settings['stim_dt'] / settings['dt']
+    current = [-1]
+    @network_operation(clock=clock, when='start')
+    def set_input():
+        n = int(round(clock._t / clock._dt))
+        k = min(int(n / ratio + 1e-9), len(stimulus) - 1)
+        if k != current[0]:
+            I[:] = stimulus[k]
+            current[0] = k
+    M = SpikeMonitor(G)
+    timestep = max(1, int(round(settings['record_dt'] / settings['dt'])))
+    monitors = [StateMonitor(G, var, record=True, timestep=timestep,
+                             clock=clock) for var in settings['record']]
+    objects = [G, set_input, M] + monitors
+    net = Network(*objects)
+    net.run(settings['duration']*second)
+
+    if M.nspikes:
+        i, t = M.it
+        i, t = np.asarray(i, dtype=int), np.asarray(t, dtype=float)
+    else:
+        i, t = np.zeros(0, dtype=int), np.zeros(0)
+    order = np.argsort(i, kind='mergesort')
+    ends = np.cumsum(np.bincount(i, minlength=K))
+    spikes = np.split(t[order], ends[:-1])
+    traces = [np.asarray(m.values) for m in monitors]
+    times = np.asarray(monitors[0].times) if monitors else np.zeros(0)
+    return times, spikes, traces
+
+def izhikevich_sweep(params, stimulus, duration, dt=.1*ms, stim_dt=1*ms,
+                     record=('v',), record_dt=None, Vt=30*mV, v0=-80*mV,
+                     engine='numpy', max_bytes=2**30, processes=None):
+    '''
+    simulate K independent Izhikevich neurons for duration.
+
+    params -- (K, 4) array of (a, b, c, d) in the units of
+    plot_Izhikevich: a and b in 1/ms, c in mV and d in mV/ms
+    stimulus -- input current in nA, one value per stim_dt: an (n,)
+    array for all neurons or a (K, n) array, one row per neuron (the
+    last value holds after the end)
+    record -- state variables to record, every record_dt (dt by default,
+    rounded to a multiple of dt)
+    engine -- 'numpy' (IzhikevichEngine) or 'brian', see IzhikevichGroup
+    max_bytes -- memory budget of the stimuli and traces of one shard
+    processes -- size of the pool running the shards (all CPUs by
+    default); shards run in this process if there is only one
+
+    returns (times, spikes, traces): the times (s) of the recorded
+    samples, a list of K arrays of spike times (s), and a dict of
+    var: (K, len(times)) array of the traces (SI units)
+    '''
+    params = np.atleast_2d(np.asarray(params, dtype=float))
+    K = len(params)
+    stimulus = np.asarray(stimulus, dtype=float)
+    if stimulus.ndim == 1:
+        stimulus = np.tile(stimulus, (K, 1))
+    if stimulus.shape[0] != K:
+        raise ValueError('stimulus must have one row per parameter set')
+    record = list(record)
+    settings = dict(dt=float(dt), stim_dt=float(stim_dt),
+                    record=record, Vt=float(Vt), v0=float(v0),
+                    record_dt=float(record_dt or dt), engine=engine,
+                    duration=float(duration))
+    n_samples = int(np.ceil(settings['duration'] / settings['record_dt']))
+    size = _shard_size(stimulus.shape[1], n_samples, len(record),
+                       max_bytes)
+    shards = [(params[k:k + size], stimulus[k:k + size], settings)
+              for k in range(0, K, size)]
+    if len(shards) == 1 or processes == 1:
+        results = map(_run_shard, shards)
+    else:
+        pool = multiprocessing.Pool(processes)
+        try:
+            results = pool.map(_run_shard, shards, 1)
+        finally:
+            pool.close()
+            pool.join()
+
+    times = results[0][0]
+    spikes = [s for _, shard, _ in results for s in shard]
+    traces = dict((var, np.vstack([r[2][k] for r in results]))
+                  for k, var in enumerate(record))
+    return times, spikes, traces
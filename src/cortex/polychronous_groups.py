@@ -0,0 +1,384 @@
+'''
+Detection of polychronous groups (Izhikevich, 2006)
+
+A polychronous group is started by firing three anchor neurons at the
+times that make their spikes arrive together at a common postsynaptic
+(mother) neuron through strong synapses, and consists of the spikes
+that follow, each caused by spikes of the group through strong
+synapses.
+
+The search
+- indexes the strong synapses (w >= threshold) by postsynaptic target
+  and arrival delay,
+- for every mother neuron, keeps only the triplets of its strong inputs
+  of which at least min_inputs spikes converge within the jitter window
+  on a neuron other than the mother and the anchors, i.e. that can
+  cause a group spike besides the mother's,
+- simulates the remaining candidates on the strong synapses only, in a
+  process pool sharing the weight/delay arrays,
+- keeps the groups of at least min_size spikes and min_depth layers.
+
+Results are cached per candidate.  A later weight snapshot only
+re-simulates the candidates in which some neuron that spiked has a
+changed strong synapse, plus the new candidates.
+'''
+import itertools
+import multiprocessing
+from multiprocessing.sharedctypes import RawArray
+import numpy as np
+from brian import *
+from izhikevich_engine import _V2, _V1, _V0
+from delay_connection import segment_positions
+
+
+def connection_arrays(C):
+    '''
+    (indptr, indices, w, delay_steps) of a compressed
+    RingBufferDelayConnection or sparse DelayConnection.  w is the live
+    weight array, so later snapshots can be taken from it.
+    '''
+    C.compress()
+    if hasattr(C, 'delay_steps'):
+        return C.indptr, C.indices, C.w, C.delay_steps
+    dt = float(C.target.clock.dt)
+    steps = np.round(np.asarray(C.delayvec.alldata) / dt).astype(np.uint8)
+    return (np.asarray(C.W.rowind, dtype=np.int64),
+            np.asarray(C.W.allj, dtype=np.int32), C.W.alldata, steps)
+
+
+class PolychronousGroups(object):
+    '''
+    Compact table of polychronous groups
+
+    group k fires neurons[ptr[k]:ptr[k+1]] at offsets[ptr[k]:ptr[k+1]]
+    (seconds after the first anchor spike), and has size[k] spikes,
+    depth[k] layers, mother neuron mother[k] and anchors[k] (3 ids).
+    '''
+    def __init__(self, groups, dt):
+        '''groups is a list of ((mother, anchors), neurons, steps, depth)'''
+        n = len(groups)
+        self.size = np.array([len(g[1]) for g in groups], dtype=int)
+        self.ptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(self.size, out=self.ptr[1:])
+        if n:
+            self.neurons = np.concatenate([g[1] for g in groups]).astype(np.int32)
+            self.offsets = np.concatenate([g[2] for g in groups]) * dt
+        else:
+            self.neurons, self.offsets = np.zeros(0, np.int32), np.zeros(0)
+        self.depth = np.array([g[3] for g in groups], dtype=int)
+        self.mother = np.array([g[0][0] for g in groups], dtype=int)
+        self.anchors = np.array([[i for i, s in g[0][1]] for g in groups],
+                                dtype=int).reshape(n, 3)
+
+    def __len__(self):
+        return len(self.size)
+
+    def __getitem__(self, k):
+        '''(neuron ids, spike offsets) of group k'''
+        s = slice(self.ptr[k], self.ptr[k+1])
+        return self.neurons[s], self.offsets[s]
+
+    def __repr__(self):
+        if not len(self):
+            return '<0 polychronous groups>'
+        return '<%d polychronous groups, size %d-%d, depth %d-%d>' % (
+            len(self), self.size.min(), self.size.max(), self.depth.min(),
+            self.depth.max())
+
+
+class PolychronousGroupFinder(object):
+    '''
+    Searches the polychronous groups of a network of Izhikevich neurons
+    connected with delays, for successive weight snapshots.
+
+    indptr, indices, delay_steps - CSR structure and delays of the
+        excitatory connection (see connection_arrays); sources are the
+        first rows of the target group, as with Ge = G.subgroup(Ne)
+    a, b, c, d - per-neuron Izhikevich parameters of the target group
+    dt - time step of the delays and of the simulations
+    threshold - minimum weight of a strong synapse
+    window - jitter allowed between a spike and the arrivals causing it
+    min_inputs - number of group spikes needed to cause a group spike
+    min_size, min_depth - smallest group kept (min_depth >= 2)
+    duration - maximum simulated time per candidate
+    processes - size of the process pool, 1 to search in this process
+    '''
+    def __init__(self, indptr, indices, delay_steps, a, b, c, d, dt,
+                 threshold, window=2*ms, min_inputs=2, min_size=6,
+                 min_depth=3, duration=100*ms, Vt=30*mV, processes=1):
+        if min_depth < 2:
+            raise ValueError('min_depth must be at least 2')
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.delay_steps = np.asarray(delay_steps, dtype=np.int64)
+        self.pre = np.repeat(np.arange(len(self.indptr)-1),
+                             np.diff(self.indptr)).astype(np.int32)
+        self.params = dict(a=np.asarray(a, dtype=float),
+                           b=np.asarray(b, dtype=float),
+                           c=np.asarray(c, dtype=float),
+                           d=np.asarray(d, dtype=float))
+        self.N = len(self.params['a'])
+        self.dt = float(dt)
+        self.threshold = float(threshold)
+        self.window = int(round(float(window) / self.dt))
+        self.min_inputs = min_inputs
+        self.min_size = min_size
+        self.min_depth = min_depth
+        self.n_steps = int(round(float(duration) / self.dt))
+        self.Vt = float(Vt)
+        self.processes = processes
+        self._w_strong = None
+        self._cache = {}
+
+    @classmethod
+    def from_connection(cls, C, G, threshold, **kwds):
+        '''finder for connection C onto the IzhikevichGroup G'''
+        indptr, indices, w, delay_steps = connection_arrays(C)
+        return cls(indptr, indices, delay_steps, G.state_('a'),
+                   G.state_('b'), G.state_('c'), G.state_('d'),
+                   G.clock.dt, threshold, **kwds)
+
+    def find(self, w):
+        '''
+        polychronous groups for the weights w (aligned with indices),
+        reusing the results of the previous snapshot where possible
+        '''
+        w = np.asarray(w, dtype=float)
+        strong = w >= self.threshold
+        w_strong = np.where(strong, w, 0.)
+        if self._w_strong is None:
+            changed = None
+        else:
+            diff = np.flatnonzero(w_strong != self._w_strong)
+            changed = np.zeros(len(self.indptr)-1, dtype=bool)
+            changed[self.pre[diff]] = True
+        self._w_strong = w_strong
+
+        net = self._strong_network(strong, w)
+        keys = self.candidates(net)
+        cache = {}
+        todo = []
+        for key in keys:
+            result = self._cache.get(key)
+            if result is not None and changed is not None:
+                spiked = result[3]
+                if not changed[spiked[spiked < len(changed)]].any():
+                    cache[key] = result
+                    continue
+            todo.append(key)
+        for key, result in zip(todo, self._simulate_all(todo, net)):
+            cache[key] = result
+        self._cache = cache
+
+        groups = [(key,) + cache[key][:3] for key in keys
+                  if len(cache[key][0]) >= self.min_size and
+                  cache[key][2] >= self.min_depth]
+        return PolychronousGroups(groups, self.dt)
+
+    def _strong_network(self, strong, w):
+        '''CSR by source and index by target of the strong synapses'''
+        sp = np.flatnonzero(strong)
+        pre, post = self.pre[sp], self.indices[sp]
+        delay = self.delay_steps[sp]
+        n_pre = len(self.indptr) - 1
+        out_ptr = np.zeros(n_pre + 1, dtype=np.int64)
+        np.cumsum(np.bincount(pre, minlength=n_pre), out=out_ptr[1:])
+        order = np.lexsort((delay, post))
+        in_ptr = np.zeros(self.N + 1, dtype=np.int64)
+        np.cumsum(np.bincount(post, minlength=self.N), out=in_ptr[1:])
+        net = dict(out_ptr=out_ptr, out_post=post, out_delay=delay,
+                   out_w=w[sp], in_ptr=in_ptr, in_pre=pre[order],
+                   in_delay=delay[order])
+        net.update(self.params)
+        return net
+
+    def candidates(self, net):
+        '''
+        (mother, anchors) keys of the anchor triplets left after pruning,
+        anchors as ((id, fire step), ...) sorted by id
+        '''
+        keys = []
+        in_ptr, in_pre, in_delay = net['in_ptr'], net['in_pre'], net['in_delay']
+        for j in np.flatnonzero(np.diff(in_ptr) >= 3):
+            pres = in_pre[in_ptr[j]:in_ptr[j+1]]
+            delays = in_delay[in_ptr[j]:in_ptr[j+1]]
+            m = len(pres)
+            # fire times so that all inputs arrive at j together
+            fire = delays.max() - delays
+            members, target = self._convergent_sets(net, pres, fire, j)
+            if not len(target):
+                continue
+            triplets = np.array(list(itertools.combinations(range(m), 3)))
+            t0, t1, t2 = triplets.T
+            # a triplet is kept if min_inputs of its anchors converge on
+            # a neuron that is neither the mother nor one of the anchors
+            count = (members[:, t0].astype(np.int8) + members[:, t1] +
+                     members[:, t2])
+            inside = ((target[:, None] == t0) | (target[:, None] == t1) |
+                      (target[:, None] == t2))
+            keep = ((count >= self.min_inputs) & ~inside).any(axis=0)
+            for t in triplets[keep]:
+                f = fire[t] - fire[t].min()
+                keys.append((int(j), tuple(sorted((int(pres[k]), int(s))
+                                                  for k, s in zip(t, f)))))
+        return keys
+
+    def _convergent_sets(self, net, pres, fire, mother):
+        '''
+        sets of inputs of the mother whose spikes (fired at fire) arrive
+        at a common strong target other than the mother within the
+        jitter window, as a boolean (sets, inputs) membership matrix and
+        the target of each set as an index into pres (-1 if the target
+        is not an input of the mother)
+        '''
+        m = len(pres)
+        n_pre = len(net['out_ptr']) - 1
+        has_out = pres < n_pre
+        pos, counts = segment_positions(net['out_ptr'], pres[has_out])
+        owner = np.repeat(np.flatnonzero(has_out), counts)
+        target = net['out_post'][pos]
+        arrival = fire[owner] + net['out_delay'][pos]
+        keep = target != mother
+        owner, target, arrival = owner[keep], target[keep], arrival[keep]
+        order = np.lexsort((arrival, target))
+        owner, target, arrival = owner[order], target[order], arrival[order]
+        # the set starting at each arrival runs to the last arrival at the
+        # same target within the window
+        span = int(arrival.max()) + self.window + 1 if len(arrival) else 1
+        key = target.astype(np.int64) * span + arrival
+        end = np.searchsorted(key, key + self.window, 'right')
+        size = end - np.arange(len(key))
+        start = np.flatnonzero(size >= self.min_inputs)
+        size = size[start]
+        members = np.zeros((len(start), m), dtype=bool)
+        rows = np.repeat(np.arange(len(start)), size)
+        pos = np.arange(size.sum()) + np.repeat(start - (np.cumsum(size) -
+                                                         size), size)
+        members[rows, owner[pos]] = True
+        index = dict((int(i), k) for k, i in enumerate(pres))
+        target = np.array([index.get(int(i), -1) for i in target[start]],
+                          dtype=int)
+        return members, target
+
+    def _simulate_all(self, keys, net):
+        '''simulate the candidates, in a process pool if processes > 1'''
+        settings = dict(dt=self.dt, n_steps=self.n_steps, Vt=self.Vt,
+                        window=self.window, min_inputs=self.min_inputs)
+        if self.processes == 1 or len(keys) < 2:
+            return [simulate_candidate(key, net, settings) for key in keys]
+        shared = dict((name, _to_shared(x)) for name, x in net.items())
+        pool = multiprocessing.Pool(self.processes, _init_worker,
+                                    (shared, settings))
+        try:
+            chunk = max(1, len(keys) // (4*self.processes))
+            return pool.map(_simulate_in_worker, keys, chunk)
+        finally:
+            pool.close()
+            pool.join()
+
+
+def simulate_candidate(key, net, settings):
+    '''
+    fire the anchors of key = (mother, ((id, step),...)) in the network
+    of strong synapses net, and return the group they start as
+    (neurons, steps, depth, ids of all neurons that spiked)
+    '''
+    a, b, c, d = net['a'], net['b'], net['c'], net['d']
+    out_ptr, out_post = net['out_ptr'], net['out_post']
+    out_delay, out_w = net['out_delay'], net['out_w']
+    N = len(a)
+    n_pre = len(out_ptr) - 1
+    dt, Vt = settings['dt'], settings['Vt']
+    n_slots = int(out_delay.max()) + 1 if len(out_delay) else 1
+
+    anchors = key[1]
+    forced = {}
+    for i, s in anchors:
+        forced.setdefault(s, []).append(i)
+    v = np.ones(N) * -65e-3
+    u = b * v
+    pending = np.zeros((n_slots, N))
+    flat = pending.reshape(-1)
+    spike_ids, spike_steps = [], []
+    last_input = max(forced)
+    for t in xrange(settings['n_steps']):
+        cur = t % n_slots
+        dv = (_V2*v + _V1)*v + _V0 - u
+        du = a*(b*v - u)
+        v += dt*dv
+        u += dt*du
+        fired = np.flatnonzero(v > Vt)
+        if t in forced:
+            fired = np.union1d(fired, forced[t])
+        if len(fired):
+            spike_ids.append(fired)
+            spike_steps.append(np.ones(len(fired), dtype=int) * t)
+            rows = fired[fired < n_pre]
+            pos, counts = segment_positions(out_ptr, rows)
+            if len(pos):
+                slots = (out_delay[pos] + cur) % n_slots
+                np.add.at(flat, slots * N + out_post[pos], out_w[pos])
+                last_input = max(last_input, t + int(out_delay[pos].max()))
+        v += pending[cur]
+        pending[cur] = 0.
+        if len(fired):
+            v[fired] = c[fired]
+            u[fired] += d[fired]
+        if t > last_input + n_slots:
+            break
+
+    if spike_ids:
+        ids, steps = np.concatenate(spike_ids), np.concatenate(spike_steps)
+    else:
+        ids, steps = np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+    neurons, group_steps, depth = _extract_group(ids, steps, anchors, net,
+                                                 settings)
+    return neurons, group_steps, depth, np.unique(ids)
+
+def _extract_group(ids, steps, anchors, net, settings):
+    '''
+    keep the spikes caused by at least min_inputs earlier group spikes
+    arriving through strong synapses within the jitter window
+    '''
+    in_ptr, in_pre, in_delay = net['in_ptr'], net['in_pre'], net['in_delay']
+    window, min_inputs = settings['window'], settings['min_inputs']
+    anchor_spikes = set(anchors)
+    members = {}     # neuron -> [(step, layer), ...] of group spikes
+    neurons, group_steps, depth = [], [], 0
+    for i, s in anchors:
+        members.setdefault(i, []).append((s, 0))
+        neurons.append(i)
+        group_steps.append(s)
+    for j, t in zip(ids, steps):
+        if (j, t) in anchor_spikes:
+            continue
+        layers = []
+        for k in xrange(in_ptr[j], in_ptr[j+1]):
+            for s, layer in members.get(in_pre[k], ()):
+                if 0 <= t - (s + in_delay[k]) <= window:
+                    layers.append(layer)
+        if len(layers) >= min_inputs:
+            layer = max(layers) + 1
+            members.setdefault(j, []).append((t, layer))
+            neurons.append(j)
+            group_steps.append(t)
+            depth = max(depth, layer)
+    return (np.array(neurons, dtype=int), np.array(group_steps, dtype=int),
+            depth)
+
+def _to_shared(x):
+    '''copy an array into shared memory, return (buffer, dtype, size)'''
+    x = np.ascontiguousarray(x)
+    raw = RawArray('b', max(x.nbytes, 1))
+    np.frombuffer(raw, dtype=x.dtype, count=x.size)[:] = x
+    return raw, x.dtype, x.size
+
+_worker = {}
+
+def _init_worker(shared, settings):
+    _worker['net'] = dict((name, np.frombuffer(raw, dtype=dtype, count=size))
+                          for name, (raw, dtype, size) in shared.items())
+    _worker['settings'] = settings
+
+def _simulate_in_worker(key):
+    return simulate_candidate(key, _worker['net'], _worker['settings'])
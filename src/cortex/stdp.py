@@ -0,0 +1,170 @@
+'''
+Event-driven STDP on a RingBufferDelayConnection
+
+Brian's ExponentialSTDP keeps its traces in neuron groups that are
+integrated every step, and on a DelayConnection it records their recent
+values to look them up at the synaptic delays.  RingBufferSTDP only
+does work for the synapses of neurons that spiked: outgoing synapses
+are found through the connection's CSR rows, incoming synapses through
+a CSC index (column pointer + positions into the same weight array).
+
+Traces are stored with the time step of their last update and decayed
+when read.  The presynaptic trace is kept per synapse and updated when
+the spike arrives at the synapse (spike time + delay), which is what
+the delayed traces of ExponentialSTDP amount to; the postsynaptic trace
+is kept per target neuron.
+
+With weight_stats=True the total weight, row and column sums and a
+histogram of the weights (see cortex.weight_stats) are updated with
+each weight change, so monitoring them does not scan all synapses.
+'''
+import numpy as np
+from brian import *
+from delay_connection import segment_positions
+from weight_stats import WeightStats
+
+
+class RingBufferSTDP(NetworkOperation):
+    '''
+    Additive exponential STDP for a RingBufferDelayConnection, with the
+    arguments of ExponentialSTDP:
+
+        f(s) = Ap*wmax*exp(-s/taup) if s > 0
+        f(s) = Am*wmax*exp(s/taum) if s < 0
+
+    where s is the post spike time minus the arrival time of the pre
+    spike at the synapse.  interactions is 'all', 'nearest',
+    'nearest_pre' or 'nearest_post', and weights are clipped to
+    [wmin, wmax].  A pre spike arriving in the step of a post spike
+    counts as arriving before it.
+
+    With weight_stats=True, stats is a WeightStats of C over
+    [wmin, wmax] with stats_bins bins, kept up to date.
+    '''
+    def __init__(self, C, taup, taum, Ap, Am, interactions='all', wmin=0,
+                 wmax=None, clock=None, weight_stats=False, stats_bins=50):
+        if wmax is None:
+            raise ValueError('you must specify the maximum synaptic weight')
+        if interactions not in ('all', 'nearest', 'nearest_pre',
+                                'nearest_post'):
+            raise ValueError('unknown interaction type ' + interactions)
+        NetworkOperation.__init__(self, lambda: None,
+                                  clock=clock or C.target.clock,
+                                  when='after_connections')
+        if abs(float(self.clock.dt) - C.dt) > 1e-12:
+            raise ValueError('STDP clock must have the dt of the target clock')
+        self.C = C
+        self.wmin, self.wmax = float(wmin), float(wmax)
+        self.Ap, self.Am = Ap * self.wmax, Am * self.wmax
+        self.nearest_pre = interactions in ('nearest', 'nearest_pre')
+        self.nearest_post = interactions in ('nearest', 'nearest_post')
+        # trace decay per elapsed step is exp(-steps*dt/tau)
+        self._rate_pre = -C.dt / float(taup)
+        self._rate_post = -C.dt / float(taum)
+
+        self.A_post = np.zeros(len(C.target))
+        self.t_post = np.zeros(len(C.target), dtype=np.int64)
+        self._pending = [[] for _ in range(C.n_slots)]
+        self._cur = 0
+        self._step = 0
+        self._w = None
+        self._stats_bins = stats_bins if weight_stats else None
+        self._stats = None
+
+    @property
+    def stats(self):
+        '''the WeightStats of C (None without weight_stats)'''
+        if self._w is not self.C.w or not self.C.iscompressed:
+            self._bind()
+        return self._stats
+
+    def _bind(self):
+        '''(re)build the CSC index and per-synapse traces for C's arrays'''
+        C = self.C
+        C.compress()
+        self._w = C.w
+        order = np.argsort(C.indices, kind='mergesort')
+        counts = np.bincount(C.indices, minlength=len(C.target))
+        self.col_ptr = np.zeros(len(C.target) + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.col_ptr[1:])
+        self.col_pos = order.astype(np.int64)
+        self.A_pre = np.zeros(len(C.w))
+        self.t_pre = np.zeros(len(C.w), dtype=np.int64)
+        self._pending = [[] for _ in range(C.n_slots)]
+        if self._stats_bins:
+            self._stats = WeightStats(C, self._stats_bins,
+                                      (self.wmin, self.wmax))
+
+    def _decay(self, t, n, rate):
+        '''exp(-(n-t)*dt/tau) for the step timestamps t'''
+        x = (n - t).astype(float)
+        x *= rate
+        return np.exp(x, out=x)
+
+    def _add(self, pos, dw):
+        '''w[pos] += dw, clipped to [wmin, wmax]'''
+        old = self.C.w[pos]
+        dw += old
+        np.clip(dw, self.wmin, self.wmax, out=dw)
+        self.C.w[pos] = dw
+        if self._stats is not None:
+            self._stats.update(pos, old, dw)
+
+    def __call__(self):
+        C = self.C
+        if self._w is not C.w or not C.iscompressed:
+            self._bind()
+        n = self._step
+        self._step += 1
+
+        # queue the synapses of new pre spikes by arrival slot
+        spikes = C.source.get_spikes(0)
+        if len(spikes):
+            pos, counts = segment_positions(C.indptr, spikes)
+            if len(pos):
+                # n_slots <= 256, and a quicksort of small ints is much
+                # faster than a stable sort (order within a slot is free)
+                slots = C.delay_steps[pos].astype(np.int16)
+                slots += self._cur
+                slots[slots >= C.n_slots] -= C.n_slots
+                order = np.argsort(slots, kind='quicksort')
+                per_slot = np.bincount(slots, minlength=C.n_slots)
+                ends = np.cumsum(per_slot)
+                for s in np.flatnonzero(per_slot):
+                    self._pending[s].append(pos[order[ends[s]-per_slot[s]:ends[s]]])
+
+        # pre spikes arriving now: w += A_post, then update A_pre
+        arrived = self._pending[self._cur]
+        self._pending[self._cur] = []
+        self._cur = (self._cur + 1) % C.n_slots
+        if arrived:
+            pos = np.concatenate(arrived)
+            j = C.indices[pos]
+            dw = self._decay(self.t_post[j], n, self._rate_post)
+            dw *= self.A_post[j]
+            self._add(pos, dw)
+            if self.nearest_pre:
+                self.A_pre[pos] = self.Ap
+            else:
+                A = self._decay(self.t_pre[pos], n, self._rate_pre)
+                A *= self.A_pre[pos]
+                A += self.Ap
+                self.A_pre[pos] = A
+            self.t_pre[pos] = n
+
+        # post spikes: w += A_pre of incoming synapses, then update A_post
+        post = C.target.get_spikes(0)
+        if len(post):
+            pos = self.col_pos[segment_positions(self.col_ptr, post)[0]]
+            if len(pos):
+                dw = self._decay(self.t_pre[pos], n, self._rate_pre)
+                dw *= self.A_pre[pos]
+                self._add(pos, dw)
+            if self.nearest_post:
+                self.A_post[post] = self.Am
+            else:
+                A = self._decay(self.t_post[post], n, self._rate_post)
+                A *= self.A_post[post]
+                A += self.Am
+                self.A_post[post] = A
+            self.t_post[post] = n
@@ -0,0 +1,74 @@
+'''
+Running statistics of the weights of a RingBufferDelayConnection
+
+WeightStats keeps the total weight, the sum of each row (outgoing
+strength of each source neuron), the sum of each column (incoming
+strength of each target neuron) and a fixed-bin histogram.  They are
+computed once from the weights and then updated from every change,
+given as the positions of the changed synapses and their old and new
+values, so reading them is O(1) or O(N) instead of O(synapses).
+RingBufferSTDP(..., weight_stats=True) updates them as it applies its
+weight changes.
+'''
+import numpy as np
+from delay_connection import scatter_add
+
+
+class WeightStats(object):
+    '''
+    total, row_sums, col_sums and histogram (bins equal bins over
+    range, values outside range counted in the first/last bin) of the
+    weights C.w of a compressed RingBufferDelayConnection
+
+    an empty range, e.g. the default (min, max) of constant weights, is
+    widened by half its value (or .5 for zero) on each side
+    '''
+    def __init__(self, C, bins=50, range=None):
+        self.C = C
+        self.bins = bins
+        if range is None:
+            range = (C.w.min(), C.w.max()) if len(C.w) else (0., 1.)
+        lo, hi = float(range[0]), float(range[1])
+        if hi <= lo:
+            half = .5 * abs(lo) or .5
+            lo, hi = lo - half, lo + half
+        self.range = (lo, hi)
+        self.edges = np.linspace(self.range[0], self.range[1], bins + 1)
+        self._scale = bins / (self.range[1] - self.range[0])
+        self.recompute()
+
+    def recompute(self):
+        '''full pass over the weights (also removes rounding drift)'''
+        C = self.C
+        w = C.w
+        self.total = float(w.sum())
+        # source of each synapse, so that updates need not search indptr
+        self._rows = np.repeat(np.arange(len(C.source), dtype=np.int32),
+                               np.diff(C.indptr))
+        self.row_sums = np.bincount(self._rows, weights=w,
+                                    minlength=len(C.source))
+        self.col_sums = np.bincount(C.indices, weights=w,
+                                    minlength=len(C.target))
+        self.histogram = np.bincount(self._bin(w), minlength=self.bins)
+
+    def _bin(self, w):
+        k = ((w - self.range[0]) * self._scale).astype(np.int64)
+        return np.clip(k, 0, self.bins - 1, out=k)
+
+    def update(self, pos, old, new):
+        '''the synapses at positions pos changed from old to new'''
+        C = self.C
+        dw = new - old
+        self.total += dw.sum()
+        scatter_add(self.row_sums, self._rows[pos], dw)
+        scatter_add(self.col_sums, C.indices[pos], dw)
+        # most changes are small: only count the weights that change bin
+        b_old, b_new = self._bin(old), self._bin(new)
+        moved = b_old != b_new
+        if moved.any():
+            self.histogram -= np.bincount(b_old[moved], minlength=self.bins)
+            self.histogram += np.bincount(b_new[moved], minlength=self.bins)
+
+    @property
+    def mean(self):
+        return self.total / max(len(self.C.w), 1)
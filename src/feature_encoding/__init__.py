@@ -1 +1,2 @@
-from real_to_spike import *
\ No newline at end of file
+from real_to_spike import *
+from spike_cache import *
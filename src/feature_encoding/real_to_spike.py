@@ -55,7 +55,7 @@ class RealToSpikes(object):
             self.init = True
         self.RFs = ReceptiveFields(num_RFs, data=data, online=online)
         
-    def spikes(self, v, t, min_exc=.2):
+    def spikes(self, v, t, min_exc=.2, sparse=False):
         '''
         v is a 1-d numpy array -- a real-valued input vector
         describing sensory input to a system to be converted into
@@ -66,19 +66,171 @@ class RealToSpikes(object):
         
         min_exc in [0,1] is the minimum excitation/activation
         of a receptive field in order to register a spike.
+
+        sparse -- only evaluate the receptive fields near each value
+        that can reach min_exc (see ReceptiveFields.sparse_field),
+        which gives the same spikes for a fraction of the work when
+        there are many RFs.
         
         returns [(neuron_number,spike_time),...]
         '''  
-        r = self.RFs.response(v)
+        if sparse:
+            j, r = self.RFs.sparse_response(v, min_exc)
+        else:
+            r = self.RFs.response(v)
         if not self.init:
             print 'Waiting for one more input to generate spikes...'
             self.init = True
             self.n = v.shape[0]
             return []
+        if sparse:
+            return self.sparse_spike_times(j, r, t, min_exc)
         spike_times = self.linear_spike_times(r, t, min_exc)
         
         return spike_times
-    
+
+    def spikes_batch(self, X, t, min_exc=.2, chunk_size=None, sparse=False,
+                     cache=None):
+        '''
+        spikes of all the columns of X, an array of size
+        (num_features, num_samples), in one vectorized pass per chunk
+        of chunk_size samples (by default, chunks of about 8M RF
+        values).  t, min_exc and sparse are as in spikes.
+
+        with a SpikeCache, spikes encoded before with the same data,
+        receptive fields and parameters are loaded (memory-mapped)
+        from the cache instead, and new ones are stored in it.
+
+        The receptive fields are not moved while the batch is encoded;
+        in online mode they are first spread over the range of the
+        values seen so far and of X.
+
+        returns (offsets, neurons, times) in CSR layout: the spikes of
+        sample k are neurons[offsets[k]:offsets[k+1]] at the times
+        times[offsets[k]:offsets[k+1]], in the order of spikes
+        '''
+        X = np.asarray(X, dtype=float)
+        n, num_samples = X.shape
+        RFs = self.RFs
+        if RFs.online:
+            changed = RFs.new_max_min(X.min(axis=1))
+            changed |= RFs.new_max_min(X.max(axis=1))
+            if changed.any():
+                RFs.spread_RFs(rows=changed)
+        self.init = True
+        self.n = n
+        if cache is not None:
+            key = cache.key(self, X, t, min_exc)
+            spikes = cache.get(key)
+            if spikes is None:
+                spikes = cache.put(key, self.spikes_batch(X, t, min_exc,
+                                                          chunk_size, sparse))
+            return spikes
+        K = RFs.window_size(min_exc) if sparse else self.num_RFs
+        if chunk_size is None:
+            chunk_size = max(1, 2**23 // (n * K))
+        m = float(t)/(min_exc - 1.0)
+        b = t - m * min_exc
+        counts = np.zeros(num_samples, dtype=np.int64)
+        neurons, times = [], []
+        for k in range(0, num_samples, chunk_size):
+            x = X[:, k:k+chunk_size]
+            # (n, chunk, K) responses, as (chunk, n*K) rows
+            if sparse:
+                j, rf = RFs.sparse_field(x, min_exc)
+                ids = j + (np.arange(n) * self.num_RFs)[:, None, None]
+                ids = ids.transpose(1, 0, 2).reshape(x.shape[1], -1)
+            else:
+                rf = RFs.gaussian_field(x[..., None], RFs.C[:, None, :],
+                                        RFs.w)
+            s = m * rf.transpose(1, 0, 2).reshape(x.shape[1], -1) + b
+            sample, col = np.nonzero(s <= t)
+            counts[k:k+chunk_size] = np.bincount(sample,
+                                                 minlength=x.shape[1])
+            neuron = ids[sample, col] if sparse else col
+            neurons.append(neuron.astype(np.int32))
+            times.append(s[sample, col])
+        offsets = np.zeros(num_samples + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        if not neurons:
+            return offsets, np.zeros(0, dtype=np.int32), np.zeros(0)
+        return offsets, np.concatenate(neurons), np.concatenate(times)
+
+    def binned_spikes(self, X, t, dt, period=None, min_exc=.2,
+                      sparse=False, start=0, cache=None):
+        '''
+        spikes of X (a vector, or (num_features, num_samples) array of
+        vectors presented one every period, t by default) as two arrays
+        sorted by time step and neuron: neurons and steps, the time
+        step of each spike for a clock of step dt.
+
+        spike times are binned as SpikeGeneratorGroup does (the first
+        step at or after the spike), the presentation of sample k
+        starts at step start + k*round(period/dt).  min_exc and sparse
+        are as in spikes, cache as in spikes_batch.  see utils.SpikeArrayGroup for a group that
+        emits such spikes.
+        '''
+        X = np.asarray(X, dtype=float)
+        if X.ndim == 1:
+            X = X[:, None]
+        dt = float(dt)
+        period_steps = int(round(float(period if period is not None else t)
+                                 / dt))
+        offsets, neurons, times = self.spikes_batch(X, t, min_exc,
+                                                    sparse=sparse,
+                                                    cache=cache)
+        sample = np.repeat(np.arange(X.shape[1]), np.diff(offsets))
+        steps = np.ceil(times / dt).astype(np.int64)
+        steps += start + sample * period_steps
+        order = np.argsort(steps * (X.shape[0] * self.num_RFs) + neurons,
+                           kind='quicksort')
+        return neurons[order], steps[order]
+
+    def stream(self, vectors, t, dt, period=None, min_exc=.2, sparse=False,
+               start=0, block_size=100):
+        '''
+        generator of the spikes of a sequence of vectors (any iterable
+        of 1-d arrays) presented back to back, every period (t by
+        default), as binned_spikes does for an array of them.
+
+        yields blocks (neurons, steps, end), one per block_size
+        vectors: the sorted spikes with steps from the end of the
+        previous block up to end, in absolute steps from start.  the
+        last block has end None.  only one block is held in memory, so
+        the sequence can be of any length (see utils.prefetch and
+        utils.SpikeStreamGroup to encode and simulate it concurrently).
+        '''
+        dt = float(dt)
+        period_steps = int(round(float(period if period is not None else t)
+                                 / dt))
+        carry = np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int64)
+        end = start
+        block = []
+        vectors = iter(vectors)
+        while True:
+            v = next(vectors, None)
+            if v is not None:
+                block.append(v)
+                if len(block) < block_size:
+                    continue
+            if not block:
+                break
+            neurons, steps = self.binned_spikes(
+                np.column_stack(block), t, dt, period_steps * dt, min_exc,
+                sparse, start=end)
+            end += len(block) * period_steps
+            block = []
+            if len(carry[0]):
+                # spikes of the previous block at or after its end
+                neurons = np.concatenate((carry[0], neurons))
+                steps = np.concatenate((carry[1], steps))
+                order = np.lexsort((neurons, steps))
+                neurons, steps = neurons[order], steps[order]
+            cut = steps.searchsorted(end, 'left')
+            carry = neurons[cut:], steps[cut:]
+            yield neurons[:cut], steps[:cut], end
+        yield carry[0], carry[1], None
+
     def linear_spike_times(self, rf, t, min_exc):
         '''
         take a numpy array of size (n,self.num_RFs) (n is the len of the
@@ -99,12 +251,33 @@ class RealToSpikes(object):
         t = s[n] # times of spikes for neurons in n
 
         return zip(n,t)
+
+    def sparse_spike_times(self, j, rf, t, min_exc):
+        '''
+        linear_spike_times for the RF indices j and responses rf of
+        ReceptiveFields.sparse_field, both of size (n,K)
+        '''
+        m = float(t)/(min_exc - 1.0)
+        b = t - m * min_exc
+        s = m * rf + b
+        keep = s <= t
+        n = (j + np.arange(j.shape[0])[:, None] * self.num_RFs)[keep]
+        return zip(n, s[keep])
     
     def spike_raster(self, times):
-        '''raster plot of spike times'''
+        '''
+        raster plot of spike times, a list of (neuron, time) or a
+        (neurons, times) pair of arrays (see utils.raster for millions
+        of spikes)
+        '''
         pl.figure()
-        for neuron,time in times:
-            pl.plot(time,neuron,'o',color='b')
+        if isinstance(times, tuple):
+            neurons, times = times
+        else:
+            neurons = [neuron for neuron,_ in times]
+            times = [time for _,time in times]
+        # a single line of markers, not one artist per spike
+        pl.plot(times,neurons,'o',color='b',linestyle='None')
         pl.ylim([0,self.n*self.num_RFs])
         pl.xlabel('Time')
         pl.ylabel('Neuron Number')
@@ -144,24 +317,88 @@ class ReceptiveFields(object):
         return self.C, self.w
     
     def new_max_min(self, input):
-        '''calculate the new min,max values of the data seen so far'''
+        '''
+        calculate the new min,max values of the data seen so far
+
+        returns a boolean array of the positions whose range changed
+        '''
         if not self.init:
-            self.min, self.max = input, input.copy()
+            self.min, self.max = input.copy(), input.copy()
             self.init = True
-            return
-        self.max[self.max<input] = input[self.max<input]
-        self.min[input<self.min] = input[input<self.min]
+            return np.ones(input.shape, dtype=bool)
+        above, below = self.max<input, input<self.min
+        self.max[above] = input[above]
+        self.min[below] = input[below]
+        return above | below
         
+    def _observe(self, input):
+        '''in online mode, extend the RFs to the range of input'''
+        if self.online:
+            # after warm-up most inputs fall inside the range seen so
+            # far: only move the RFs of positions whose range changed
+            changed = self.new_max_min(input)
+            if changed.any():
+                self.spread_RFs(rows=changed)
+
     def response(self, input):
         '''
         input is an (n,) array to be converted into receptive field
         response values
         '''
-        if self.online:
-            self.new_max_min(input)
-            self.spread_RFs()
-            
+        self._observe(input)
         return self.gaussian_field(input[...,None], self.C, self.w)
+
+    def sparse_response(self, input, min_exc):
+        '''
+        response for the RFs of each position of input that can reach
+        min_exc, as the (j, r) of sparse_field
+        '''
+        self._observe(input)
+        return self.sparse_field(input, min_exc)
+
+    def window_size(self, min_exc):
+        '''
+        number of consecutive RFs of a position that include all those
+        with a response of at least min_exc to any value
+        '''
+        N = self.num_RFs
+        if not 0 < min_exc < 1:
+            return N
+        # the RFs are spaced by (max-min)/(N-2) = beta*w, and respond
+        # above min_exc within w*sqrt(-log(min_exc)) of their centre
+        span = (self.max - self.min)/(N-2.)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            reach = np.where(span > 0, self.w / span, 0)
+        K = int(np.ceil(2 * np.max(reach) * np.sqrt(-np.log(min_exc)))) + 3
+        return min(K, N)
+
+    def sparse_field(self, x, min_exc):
+        '''
+        x is an (n,) or (n,s) array
+
+        evaluates gaussian_field only in the window of window_size(min_exc)
+        RFs around each value (the RFs are evenly spaced, see spread_RFs),
+        all the others are below min_exc
+
+        returns (j, r), both of size x.shape + (K,): the RF indices of the
+        windows and the responses of those RFs
+        '''
+        N = self.num_RFs
+        K = self.window_size(min_exc)
+        lo, span = self.min, (self.max - self.min)/(N-2.)
+        extra = (1,) * (x.ndim - 1)
+        lo, span = lo.reshape(lo.shape + extra), span.reshape(span.shape + extra)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # x is closest to the centre of RF (x-min)/span + 1/2
+            first = np.where(span > 0, (x - lo)/span + .5 - K/2., 0)
+        first = np.clip(np.floor(first), 0, N - K).astype(np.int64)
+        j = first[..., None] + np.arange(K)
+        rows = np.arange(x.shape[0]).reshape((-1,) + extra + (1,))
+        C = self.C[rows, j]
+        w = self.w.reshape(self.w.shape + extra + (1,))
+        if np.array_equal(self.w, np.zeros_like(self.w)):
+            return j, np.zeros_like(C)
+        return j, np.exp( -((x[..., None] - C) / w ) ** 2.0)
     
     def gaussian_field(self, x, C, w):
         '''
@@ -176,20 +413,33 @@ class ReceptiveFields(object):
         
         return np.exp( -((x - C).T / w ) ** 2.0).T
     
-    def spread_RFs(self, beta=1.0):
+    def spread_RFs(self, beta=None, rows=None):
         '''
         beta -- an overlap parameter.  somewhere in [1.0,2.0]
-        supposedly works well
+        supposedly works well.  the last one given (1.0 at first) if
+        None
         
         set parameter vectors for the 'self.num_RFs' number
         of receptive fields as two arrays.
         
         this spreads the RFs evenly over the range [min,max]
+
+        rows -- positions (index or boolean array) whose RFs are
+        recomputed, the others are left as they are. all positions
+        if None, or if the RFs have not been spread yet.
         '''
         N = self.num_RFs
-        C = np.array([self.min + (2*(i+1)-3)/2. * (self.max-self.min)/(N-2.) for i in range(N)]).T
-        w = 1/beta * (self.max-self.min)/(N-2.)
-        self.C, self.w = C, w
+        if beta is None:
+            beta = getattr(self, 'beta', 1.0)
+        self.beta = beta
+        if rows is None or not hasattr(self, 'C'):
+            rows = slice(None)
+            self.C = np.empty(np.shape(self.min) + (N,))
+            self.w = np.empty(np.shape(self.min))
+        lo, span = self.min[rows], self.max[rows] - self.min[rows]
+        self.C[rows] = lo[..., None] + (2*np.arange(1, N+1) - 3)/2. * \
+            span[..., None]/(N-2.)
+        self.w[rows] = 1/beta * span/(N-2.)
 
     def plot_rfs(self, row=0, num_pts=1000):
         '''
@@ -0,0 +1,133 @@
+'''
+On-disk cache of encoded spike trains
+
+SpikeCache keeps the (offsets, neurons, times) arrays of
+RealToSpikes.spikes_batch in a directory, one sub-directory of .npy
+files per entry, named by a hash of the input array, the receptive
+fields (centres, widths, num_RFs, beta) and the encoding parameters t
+and min_exc.  Entries are memory-mapped when loaded, so a repeated run
+reads spikes only as they are used and encodes nothing.
+
+Several processes can share a cache: an entry is written in a private
+temporary directory and renamed into place, which is atomic, so readers
+never see partial entries (when two workers encode the same data, the
+first rename wins).  When the cache grows beyond max_bytes the least
+recently used entries are removed, under a file lock.
+'''
+import os
+import errno
+import fcntl
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+
+_ARRAYS = 'offsets', 'neurons', 'times'
+
+
+class SpikeCache(object):
+    '''
+    cache of encoded spikes in the directory path, of at most max_bytes
+    (1 GB by default).  pass it to RealToSpikes.spikes_batch (or
+    binned_spikes) as cache.
+    '''
+    def __init__(self, path, max_bytes=2**30):
+        self.path = path
+        self.max_bytes = max_bytes
+        if not os.path.isdir(path):
+            try:
+                os.makedirs(path)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+
+    def key(self, encoder, X, t, min_exc):
+        '''the name of the entry of X encoded by encoder'''
+        RFs = encoder.RFs
+        h = hashlib.sha1()
+        X = np.ascontiguousarray(X)
+        h.update(repr((X.dtype.str, X.shape, encoder.num_RFs,
+                       getattr(RFs, 'beta', 1.0), float(t),
+                       float(min_exc))))
+        h.update(X)
+        h.update(np.ascontiguousarray(RFs.C, dtype=float))
+        h.update(np.ascontiguousarray(RFs.w, dtype=float))
+        return h.hexdigest()
+
+    def _entry(self, key):
+        return os.path.join(self.path, key)
+
+    def get(self, key):
+        '''memory-mapped arrays of the entry key, or None'''
+        entry = self._entry(key)
+        try:
+            arrays = tuple(np.load(os.path.join(entry, name + '.npy'),
+                                   mmap_mode='r') for name in _ARRAYS)
+        except IOError:
+            return None
+        # the time of last use, for eviction
+        try:
+            os.utime(entry, None)
+        except OSError:
+            pass
+        return arrays
+
+    def put(self, key, arrays):
+        '''
+        store arrays as the entry key, return them memory-mapped (or as
+        they are, if the entry alone is larger than the cache)
+        '''
+        tmp = tempfile.mkdtemp(prefix='.tmp-', dir=self.path)
+        for name, a in zip(_ARRAYS, arrays):
+            np.save(os.path.join(tmp, name + '.npy'), a)
+        try:
+            os.rename(tmp, self._entry(key))
+        except OSError:
+            # another process stored it first
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.evict()
+        stored = self.get(key)
+        return tuple(arrays) if stored is None else stored
+
+    def entries(self):
+        '''(last use, bytes, key) of each entry'''
+        out = []
+        for key in os.listdir(self.path):
+            entry = self._entry(key)
+            if key.startswith('.') or not os.path.isdir(entry):
+                continue
+            try:
+                size = sum(os.path.getsize(os.path.join(entry, f))
+                           for f in os.listdir(entry))
+                out.append((os.path.getmtime(entry), size, key))
+            except OSError:
+                pass        # removed meanwhile
+        return out
+
+    def evict(self):
+        '''remove the least recently used entries above max_bytes'''
+        with open(os.path.join(self.path, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            entries = sorted(self.entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, key in entries:
+                if total <= self.max_bytes:
+                    break
+                # renamed first, so that it disappears at once; readers
+                # that mapped it keep their mapping
+                doomed = os.path.join(self.path, '.del-%s-%d' % (key,
+                                                                 os.getpid()))
+                try:
+                    os.rename(self._entry(key), doomed)
+                except OSError:
+                    continue
+                shutil.rmtree(doomed, ignore_errors=True)
+                total -= size
+
+    def clear(self):
+        '''remove all entries'''
+        max_bytes, self.max_bytes = self.max_bytes, -1
+        try:
+            self.evict()
+        finally:
+            self.max_bytes = max_bytes
@@ -5,8 +5,20 @@ Izhikevich - 2006 - Polychronization: Computation with Spikes
 author: bill lennon
 date: 18 June 2012
 
-TO DO:
-    - Find/track polychronous groups
+The excitatory weights are saved every group_clock tick of simulated
+time into snapshot_dir, and the polychronous groups of each snapshot
+are searched once the run is over (see cortex.polychronous_groups),
+so the search does not slow down the simulation.  Successive searches
+only re-simulate the candidates affected by the weight changes.
+
+The network state is checkpointed every checkpoint_period of simulated
+time into checkpoint_dir (see cortex.checkpoint).  After a crash,
+    python polychrony.py --resume
+rebuilds the network, reloads the last checkpoint and finishes the run.
+
+    python polychrony.py --profile
+times each operation of the network (see utils.profiling), prints the
+breakdown when the run ends and saves it as a JSON trace.
     
 RESULTS:
     - Oscillatory behavior emerges after several minutes of simulation!
@@ -14,11 +26,13 @@ RESULTS:
 from brian.library.IF import *
 from brian.neurongroup import *
 from brian import *
-from brian.experimental.realtime_monitor import RealtimeConnectionMonitor
 from scipy.sparse import rand as sprand
 from cortex import *
 from utils import *
+import os
+import sys
 import time
+from multiprocessing import cpu_count
 import matplotlib.pyplot as plt
 
 set_global_preferences(useweave=True)
@@ -28,10 +42,23 @@ start = time.time()
 ########################################################################
 # Network Parameters
 ########################################################################
-sim_clock = Clock(dt=0.5*ms)    # simulation clock
-input_clock = Clock(dt=1*ms)    # input current change clock
-mon_clock = Clock(dt=1*ms)      # monitor clock
-report_clock = Clock(dt=1000*ms)
+# each clock has its own order: when clocks are due at the same time,
+# Brian runs the lowest order first and otherwise picks one arbitrarily,
+# which would make runs (and resumed runs) take different paths
+input_clock = Clock(dt=1*ms, order=-1)  # input current change clock
+sim_clock = Clock(dt=0.5*ms, order=0)   # simulation clock
+mon_clock = Clock(dt=1*ms, order=1)     # monitor clock
+report_clock = Clock(dt=1000*ms, order=2)
+group_clock = Clock(dt=20000*ms, order=3)  # weight snapshot clock
+snapshot_dir = 'polychrony_weights'
+checkpoint_period = 10000*ms
+checkpoint_dir = 'polychrony_checkpoint'
+spike_logs = 'polychrony_exc.spikes', 'polychrony_inh.spikes'
+resume = '--resume' in sys.argv[1:]
+profile = '--profile' in sys.argv[1:]
+profile_file = 'polychrony_profile.json'
+sim_len = 200000*ms
+seed = 1            # the same network is rebuilt when resuming
 Ne, Ni = 800, 200   # number of excitatory/inhibitory neurons
 N = Ne + Ni
 smax = 10 * mV        # max synapse strength
@@ -45,6 +72,7 @@ plot_on = True
 ########################################################################
 # Neurons
 ########################################################################
+np.random.seed(seed)
 G = IzhikevichGroup(N, 'a', 0.2/ms, -65*mV, 'd', 1*ms, 1*ms, clock=sim_clock)        
 Ge = G.subgroup(Ne)
 Gi = G.subgroup(Ni)
@@ -56,11 +84,11 @@ Gi.a,Gi.d = 0.1/ms, 2*mV/ms
 # Connections
 ########################################################################
 # Ge -> G
-Ce = DelayConnection(Ge,G,max_delay=20*ms)
-Ce.connect_random(Ge,G,.05,weight=6.0*mV,delay=(0*ms,20*ms))
+Ce = RingBufferDelayConnection(Ge,G,max_delay=20*ms)
+Ce.connect_random(Ge,G,.05,weight=6.0*mV,delay=(0*ms,20*ms),seed=seed)
 
 Ci = DelayConnection(Gi,Ge,max_delay=1*ms)
-Ci.connect_random(Gi,Ge,.05,weight=-5.0*mV,delay=1*ms)
+Ci.connect_random(Gi,Ge,.05,weight=-5.0*mV,delay=1*ms,seed=seed+1)
 '''
 w,d = random_weights_delays(Ne,N,.05,max_weight=6.0*mV,max_delay=20*ms)
 Ce = DelayConnection(Ge,G,'ge', delay=d)
@@ -71,70 +99,113 @@ w,d = random_weights_delays(Ni,Ne,.05,max_weight=-5.0*mV,max_delay=1*ms)
 Ci = DelayConnection(Gi,Ge,'gi', delay=d)
 Ci.connect(Gi,Ge,w)
 '''
-stdp = ExponentialSTDP(Ce, tau_pre, tau_post, Ap, Am, wmax=smax,
-                       clock=sim_clock, interactions='nearest')
+stdp = RingBufferSTDP(Ce, tau_pre, tau_post, Ap, Am, wmax=smax,
+                      clock=sim_clock, interactions='nearest',
+                      weight_stats=True)
 
 
 ########################################################################
 # Input
 ########################################################################
-@network_operation(input_clock)
-def thalamic_input():
-    stim = np.zeros_like(G.I)
-    stim[np.random.randint(stim.shape[0])] = 20 * nA
-    G.I = stim
+# one random neuron gets 20 nA each ms (see utils.input_schedule)
+thalamic_input = InputSchedule(G, 'I', random_pulses(N, 20*nA, seed=seed),
+                               clock=input_clock)
 
 
 ########################################################################
 # Monitor
 ########################################################################
-Mse = SpikeMonitor(Ge)
+# spikes stream to append-only logs (see utils.spike_log)
+Mse = SpikeLogger(Ge, spike_logs[0], append=resume)
 Mve = StateMonitor(Ge, 'v', record=[0,Ne-1], clock=mon_clock)
 MIe = StateMonitor(Ge, 'I', record=[0,Ne-1], clock=mon_clock)
-Msi = SpikeMonitor(Gi)
+Msi = SpikeLogger(Gi, spike_logs[1], append=resume)
 Mvi = StateMonitor(Gi, 'v', record=[0,Ni-1], clock=mon_clock)
 MIi = StateMonitor(Gi, 'I', record=[0,Ni-1], clock=mon_clock)
 M = [Mse,Mve,MIe,Msi,Mvi,MIi]
 
-RT = RealtimeConnectionMonitor(Ce)
-
 ########################################################################
 # Plotting
 ########################################################################
+# weight totals and histograms are kept up to date by the STDP rule
+# (see cortex.weight_stats) instead of scanning all synapses
+# decimated frames are drawn by a separate process (see utils.live_plot),
+# frames are dropped rather than slowing down the simulation
 if plot_on:
-    ion()
-    figure(0,figsize=(18,10))
-    plot_args = dict(refresh=1000*ms, showlast=1000*ms)
-    subplot(221)
-    raster_plot(Mse, title='Exc Neurons - Firing Times', newfigure=False, **plot_args)
-    xlabel('time (ms)')
-    subplot(222)
-    Mve.plot(**plot_args)
-    title('Excitatory Neurons trace')
-    xlabel('time (s)')
-    ylabel('membrane potential (V)')
-    subplot(223)
-    raster_plot(Msi, title='Inh Neurons - Firing Times', newfigure=False, **plot_args)
-    xlabel('time (ms)')
-    subplot(224)
-    Mvi.plot(**plot_args)
-    title('Inhibitory Neurons trace')
-    xlabel('time (s)')
-    ylabel('membrane potential (V)')
-    subplots_adjust(hspace=0.25)
+    live = LivePlot(period=1000*ms)
+    live.raster(Ge, 'Exc Neurons - Firing Times')
+    live.trace(Ge, 'v', [0,Ne-1], title='Excitatory Neurons trace')
+    live.raster(Gi, 'Inh Neurons - Firing Times')
+    live.trace(Gi, 'v', [0,Ni-1], title='Inhibitory Neurons trace')
+    live.histogram(lambda: stdp.stats.histogram, (0, smax),
+                   bins=stdp.stats.bins, title='Excitatory weights',
+                   counts=True)
+    live.start()
 
 @network_operation(report_clock)
 def report_weights():
-    print 'Total excitatory synaptic value: ', np.sum(Ce.W.alldata)
+    print 'Total excitatory synaptic value: ', stdp.stats.total
+
+
+########################################################################
+# Polychronous groups
+########################################################################
+# the weights are saved to disk (so they survive a resume) and searched
+# after the run
+if not os.path.isdir(snapshot_dir):
+    os.makedirs(snapshot_dir)
+elif not resume:
+    for name in os.listdir(snapshot_dir):
+        os.remove(os.path.join(snapshot_dir, name))
+@network_operation(group_clock)
+def snapshot_weights():
+    t = int(round(group_clock.t/ms))
+    np.save(os.path.join(snapshot_dir, '%09d.npy' % t),
+            connection_arrays(Ce)[2])
 
 ########################################################################
 # Run simulation
 ########################################################################
-net = Network(G,M,Ce,Ci,stdp,thalamic_input,report_weights,RT)
+net = Network(G,M,Ce,Ci,stdp,thalamic_input,report_weights,snapshot_weights)
+if plot_on:
+    net.add(live)
+checkpoint = NetworkCheckpoint(checkpoint_dir, net, [G,Ce,Ci,stdp])
+net.add(checkpoint.every(checkpoint_period))
+t_start = 0*ms
+if resume:
+    t_start = checkpoint.restore() or 0*ms
+    print 'resuming from checkpoint at t = %s' % t_start
+    Mse.truncate(t_start)
+    Msi.truncate(t_start)
 print 'network built. took %s seconds' % (time.time()-start)
 print 'running...'
 start = time.time()
-net.run(200000*ms, report='text')
+if profile:
+    profiler = NetworkProfiler(net, names=dict(
+        G=G, Ce=Ce, Ci=Ci, stdp=stdp, thalamic_input=thalamic_input,
+        Mse=Mse, Mve=Mve, MIe=MIe, Msi=Msi, Mvi=Mvi, MIi=MIi))
+    profiler.run(sim_len - t_start, report='text')
+else:
+    net.run(sim_len - t_start, report='text')
 print 'done. took %s seconds' % (time.time()-start)
-ioff()
-show()
+if profile:
+    print profiler.table()
+    profiler.save(profile_file)
+Mse.close()
+Msi.close()
+if plot_on:
+    print 'dropped %d of %d plot frames' % (live.dropped,
+                                           live.dropped + live.frames)
+    live.stop()
+
+
+########################################################################
+# Search the weight snapshots
+########################################################################
+finder = PolychronousGroupFinder.from_connection(Ce, G, 0.95*smax,
+                                                 processes=cpu_count())
+for name in sorted(os.listdir(snapshot_dir)):
+    start = time.time()
+    groups = finder.find(np.load(os.path.join(snapshot_dir, name)))
+    print 'Polychronous groups at %d ms: %s (search took %.1f s)' % (
+        int(name[:-4]), groups, time.time()-start)
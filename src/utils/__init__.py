@@ -1 +1,9 @@
-from brian_utils import *
\ No newline at end of file
+from brian_utils import *
+from procedural import *
+from spike_log import *
+from live_plot import *
+from input_schedule import *
+from spike_input import *
+from raster import *
+from profiling import *
+from topology import *
@@ -1,16 +1,69 @@
 import numpy as np
 from brian import *
-from scipy.sparse import coo_matrix
+from scipy.sparse import csr_matrix, lil_matrix
 
 class IzhikevichReset(object):
     '''
     A two-variable reset:
       v<-c
       u<-u+d
+    
+    c and d can each be a scalar, an array with one value per neuron,
+    or the name of a state variable of the group (e.g. 'c').  The layout
+    is resolved once here and the matching update is bound, so a call
+    costs one index operation per variable and never raises.
     '''
     def __init__(self, c, d):
         self.c = c
         self.d = d
+        self._c = self._resolve(c)
+        self._d = self._resolve(d)
+        self._P = None
+
+    @staticmethod
+    def _resolve(x):
+        '''return a state variable name, a float or a float array'''
+        if isinstance(x, str):
+            return x
+        x = np.asarray(x, dtype=float)
+        if x.ndim == 0:
+            return float(x)
+        return x
+
+    def _bind(self, P):
+        '''
+        bind the unitless state arrays of P and choose the update
+        function for this parameter layout
+        '''
+        self._P = P
+        self._v, self._u = P.state_('v'), P.state_('u')
+        c = P.state_(self._c) if isinstance(self._c, str) else self._c
+        d = P.state_(self._d) if isinstance(self._d, str) else self._d
+        self._cval, self._dval = c, d
+        if isinstance(c, float) and isinstance(d, float):
+            self._update = self._update_scalar
+        elif isinstance(c, float):
+            self._update = self._update_scalar_c
+        elif isinstance(d, float):
+            self._update = self._update_scalar_d
+        else:
+            self._update = self._update_gather
+
+    def _update_scalar(self, spikes):
+        self._v[spikes] = self._cval
+        self._u[spikes] += self._dval
+
+    def _update_scalar_c(self, spikes):
+        self._v[spikes] = self._cval
+        self._u[spikes] += self._dval[spikes]
+
+    def _update_scalar_d(self, spikes):
+        self._v[spikes] = self._cval[spikes]
+        self._u[spikes] += self._dval
+
+    def _update_gather(self, spikes):
+        self._v[spikes] = self._cval[spikes]
+        self._u[spikes] += self._dval[spikes]
 
     def __call__(self, P):
         '''
@@ -19,57 +72,130 @@ class IzhikevichReset(object):
         spikes = P.LS.lastspikes()
         if len(spikes) == 0:
             return
+        if P is not self._P:
+            self._bind(P)
+        self._update(spikes)
+
+def sparse_rand_indices(n, m, p, seed=None, format='csr'):
+    '''
+    draw the structure of a random sparse (n,m) matrix with exactly
+    int(n*m*p) nonzero elements, returned as compressed index arrays
+    
+    returns (indptr, indices, rng) where indptr/indices are the CSR
+    arrays if format='csr' or the CSC arrays if format='csc', and rng
+    is the random number generator used (np.random if seed is None)
+    
+    unique linear indices are drawn without replacement by oversampling,
+    sorting and removing duplicates, so time and memory are O(nnz log nnz)
+    and independent of n*m.  for p > 0.5 the complement is drawn instead.
+    '''
+    rng = np.random if seed is None else np.random.RandomState(seed)
+    n, m = int(n), int(m)
+    total = n * m
+    k = int(total * p)
+    
+    if 2 * k > total:
+        # dense: knock out total-k elements of the full index range
+        mask = np.ones(total, dtype=bool)
+        mask[_unique_linear_indices(total, total - k, rng)] = False
+        ind = np.flatnonzero(mask)
+    else:
+        ind = _unique_linear_indices(total, k, rng)
+    
+    if format == 'csr':
+        major, minor = n, m
+    elif format == 'csc':
+        major, minor = m, n
+    else:
+        raise ValueError("format must be 'csr' or 'csc'")
+    # linear indices are sorted, so they are already in compressed order
+    counts = np.bincount(ind // minor, minlength=major)
+    indptr = np.zeros(major + 1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+    indices = (ind % minor).astype(np.int32)
+    return indptr, indices, rng
 
-        # ugly, but this takes care of multiple ways
-        # of instantiating neuron parameters c & d
-        try:
-            P.v[spikes] = P.c[spikes]
-            P.u[spikes] += P.d[spikes]
-        except IndexError:
-            P.v[spikes] = P.c
-            P.u[spikes] += P.d
-        except AttributeError:
-            try:
-                P.v[spikes] = self.c
-                P.u[spikes] += self.d
-            except IndexError:
-                P.v[spikes] = self.c[spikes]
-                P.u[spikes] += self.d[spikes]
+def _unique_linear_indices(total, k, rng):
+    '''
+    return k sorted unique integers drawn uniformly from [0,total)
+    '''
+    ind = np.empty(0, dtype=np.int64)
+    while ind.shape[0] < k:
+        need = k - ind.shape[0]
+        # oversample by the expected fraction of collisions
+        size = int(1.1 * need * total / float(total - k + 1)) + 16
+        draw = rng.randint(total, size=size).astype(np.int64)
+        ind = np.unique(np.concatenate((ind, draw)))
+    if ind.shape[0] > k:
+        # drop a random subset of the surplus so every index is equally likely
+        keep = rng.permutation(ind.shape[0])[:k]
+        keep.sort()
+        ind = ind[keep]
+    return ind
 
-def random_weights_delays(n,m,p,max_weight,max_delay):
+def random_weights_delays(n,m,p,max_weight,max_delay,seed=None):
     '''
     return two random sparse matrices where the nonzero
     elements align
     
     n,m - source,target population size
     p - probability of a nonzero connection, i.e. sparsity
+    seed - optional seed, for reproducible connectivity
     
     these are used in conjunction with DelayConnection
     to create a set of random synaptic weights and delays
     such that each nonzero random weight is paired with a
     nonzero random delay.
+    
+    weights are uniform in [0,max_weight), delays are whole
+    milliseconds uniform in [1*ms,max_delay], so a max_delay that is
+    not a whole number of ms is rounded down.  both matrices are
+    CSR and share the same indptr/indices arrays.
     '''
+    # whole ms that fit in max_delay, with slack for rounding in max_delay/ms
+    max_ms = int(np.floor(float(max_delay/ms) + 1e-9))
+    if max_ms < 1:
+        raise ValueError('max_delay must be at least 1*ms')
+    indptr, indices, rng = sparse_rand_indices(n, m, p, seed=seed)
+    nnz = indices.shape[0]
     
-    def _sparse_rand(n,m,p):
-        '''
-        generate a sparse random matrix of size (n,m) with
-        sparsity p
-        
-        scipy.sparse.rand doesn't work well
-        '''
-        uniq_ind = set()
-        # guaranteed exact sparsity value at sake of speed
-        while len(uniq_ind) < int(n*m*p):
-            i = np.random.randint(n, size=int(n*m*p*1.2))
-            j = np.random.randint(m, size=int(n*m*p*1.2))
-            uniq_ind = uniq_ind.union(set(zip(i,j)))
-        uniq_ind = list(uniq_ind)[0:int(n*m*p)]
-        row,col = zip(*uniq_ind)
-        data = np.random.rand(int(n*m*p))
-        return coo_matrix((data,(row,col)),(n,m))
-        
-    w = max_weight * _sparse_rand(n,m,p)
-    d = w.copy()
-    d.data = (max_delay-1.0*ms) * np.ceil(np.random.rand(d.data.shape[0])) + np.ones_like(d.data)*ms
+    w = csr_matrix((float(max_weight) * rng.rand(nnz), indices, indptr), (n,m))
+    delay_ms = np.floor(rng.rand(nnz) * max_ms) + 1.0
+    d = csr_matrix((delay_ms * float(ms), indices, indptr), (n,m))
+    
+    return w,d
+
+def connect_csr(C, P, Q, W, delay=None):
+    '''
+    connect (sub)groups P->Q of connection C with the sparse matrix W,
+    and for a DelayConnection optionally the matching delay matrix
     
-    return w,d.tolil()
+    Connection.connect turns a sparse W into a dense array before
+    inserting it, which does not fit in memory for large groups.  Here
+    the rows of W are written straight into the rows of C's sparse
+    construction matrix.
+    '''
+    i0, j0 = C.origin(P, Q)
+    _insert_rows(C.W, csr_matrix(W), i0, j0)
+    if delay is not None:
+        _insert_rows(C.delayvec, csr_matrix(delay), i0, j0)
+
+def _insert_rows(M, W, i0, j0):
+    '''insert csr W into lil-based M at (i0,j0), or fall back to M[...]=W'''
+    if not isinstance(M, lil_matrix):
+        M[i0:i0+W.shape[0], j0:j0+W.shape[1]] = W
+        return
+    if not W.has_sorted_indices:
+        W = W.copy()
+        W.sort_indices()
+    indptr = W.indptr
+    for i in np.flatnonzero(np.diff(indptr)):
+        ind = (W.indices[indptr[i]:indptr[i+1]] + j0).tolist()
+        data = W.data[indptr[i]:indptr[i+1]].tolist()
+        if M.rows[i0+i]:
+            merged = dict(zip(M.rows[i0+i], M.data[i0+i]))
+            merged.update(zip(ind, data))
+            ind = sorted(merged)
+            data = [merged[j] for j in ind]
+        M.rows[i0+i] = ind
+        M.data[i0+i] = data
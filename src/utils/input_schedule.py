@@ -0,0 +1,115 @@
+'''
+Precomputed schedules of external input
+
+An InputSchedule writes external drive (e.g. thalamic current) into a
+state variable of a group.  The drive is a table of events (step,
+neuron, amplitude), produced in blocks of steps ahead of time by a
+source: event_table for a fixed table, or a seeded generator such as
+random_pulses or gaussian_noise.  At each step the entries set by the
+previous step are cleared and those of the current step are written,
+in place, so the cost of a step is the number of stimulated neurons
+and the memory is one block of events, not steps x neurons.
+
+A source is a function source(step0, nsteps) returning the arrays
+(steps, neurons, amplitudes) of the events in [step0, step0+nsteps),
+sorted by step.  Generated blocks depend only on the seed and the
+block, so a run resumed from a checkpoint gets the same input.
+'''
+import numpy as np
+from brian import *
+
+
+def event_table(steps, neurons, amplitudes):
+    '''source for a fixed table of events'''
+    steps = np.asarray(steps, dtype=np.int64)
+    order = np.argsort(steps, kind='mergesort')
+    steps = steps[order]
+    neurons = np.asarray(neurons, dtype=np.int64)[order]
+    amplitudes = np.asarray(amplitudes, dtype=float)[order]
+    def source(step0, nsteps):
+        lo, hi = np.searchsorted(steps, [step0, step0 + nsteps])
+        return steps[lo:hi], neurons[lo:hi], amplitudes[lo:hi]
+    return source
+
+def _seed(seed):
+    return np.random.randint(2**31) if seed is None else seed
+
+def random_pulses(N, amplitude, count=1, seed=None):
+    '''
+    source of count neurons out of N (drawn with replacement) set to
+    amplitude at each step, as np.random.randint would pick them
+    '''
+    seed = _seed(seed)
+    amplitude = float(amplitude)
+    def source(step0, nsteps):
+        rng = np.random.RandomState([seed, step0])
+        steps = np.repeat(np.arange(step0, step0 + nsteps), count)
+        neurons = rng.randint(N, size=nsteps * count).astype(np.int32)
+        return steps, neurons, np.repeat(amplitude, len(steps))
+    return source
+
+def gaussian_noise(N, sigma, mean=0, seed=None):
+    '''source of independent normal input to all N neurons at each step'''
+    seed = _seed(seed)
+    sigma, mean = float(sigma), float(mean)
+    def source(step0, nsteps):
+        rng = np.random.RandomState([seed, step0])
+        steps = np.repeat(np.arange(step0, step0 + nsteps, dtype=np.int32), N)
+        neurons = np.tile(np.arange(N, dtype=np.int32), nsteps)
+        amplitudes = rng.randn(nsteps * N)
+        amplitudes *= sigma
+        amplitudes += mean
+        return steps, neurons, amplitudes
+    return source
+
+
+class InputSchedule(NetworkOperation):
+    '''
+    Writes the events of source into the variable var of group, one
+    step of clock at a time (e.g. Clock(dt=1*ms) for input that changes
+    every ms).  Amplitudes are in SI units (amp for a current).  Each
+    value holds until the next step, when it is reset to 0 unless it is
+    set again; several events of a neuron in one step do not add up.
+
+    Blocks of block steps are fetched from source as they are needed.
+    '''
+    def __init__(self, group, var, source, block=1000, clock=None):
+        NetworkOperation.__init__(self, lambda: None, clock=clock)
+        self.group = group
+        self.var = var
+        self.source = source
+        self.block = block
+        self._x = group.state_(var)
+        self._dt = float(self.clock.dt)
+        self.reinit()
+
+    def reinit(self):
+        self._block = None
+        # None: the entries of the previous step are found from source
+        self._prev = None
+
+    def _load(self, b):
+        steps, self._neurons, self._amplitudes = self.source(b * self.block,
+                                                             self.block)
+        self._bounds = np.searchsorted(
+            steps, np.arange(b * self.block, (b + 1) * self.block + 1))
+        self._block = b
+
+    def _events(self, n):
+        '''neurons and amplitudes of the events of step n'''
+        b = n // self.block
+        if b != self._block:
+            self._load(b)
+        k = n - b * self.block
+        lo, hi = self._bounds[k], self._bounds[k + 1]
+        return self._neurons[lo:hi], self._amplitudes[lo:hi]
+
+    def __call__(self):
+        n = int(round(self.clock._t / self._dt))
+        if self._prev is None:
+            # first step, or first after restoring the state of group
+            self._prev = self._events(n - 1)[0] if n else []
+        neurons, amplitudes = self._events(n)
+        self._x[self._prev] = 0
+        self._x[neurons] = amplitudes
+        self._prev = neurons
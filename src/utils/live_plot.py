@@ -0,0 +1,214 @@
+'''
+Out-of-process live plotting
+
+LivePlot collects small, decimated summaries of a running network and
+hands them to a separate plotting process once per period of simulated
+time:
+    raster      spike counts per (time bin, neuron bin)
+    trace       a state variable of a few neurons, sampled at a fixed
+                number of points per period
+    histogram   a histogram of an array (e.g. the weights of a
+                connection), in place of the full matrix, or bin counts
+                maintained elsewhere
+
+Frames are written into a few slots of shared memory; only slot numbers
+travel through the queues.  The simulation takes a free slot without
+waiting, and if the plotter is still busy with all of them the frame is
+dropped (counted in LivePlot.dropped), so rendering never blocks the
+integrator.
+'''
+import numpy as np
+import multiprocessing
+from Queue import Empty
+from brian import *
+
+
+class _SpikeCounter(SpikeMonitor):
+    '''adds the spikes of each step to counts[time bin, neuron bin]'''
+    def __init__(self, live, source, counts):
+        SpikeMonitor.__init__(self, source, record=False)
+        self.live = live
+        self.counts = counts
+        self.scale = float(counts.shape[1]) / len(source)
+
+    def propagate(self, spikes):
+        if not len(spikes):
+            return
+        tbins = self.counts.shape[0]
+        k = int((self.source.clock._t - self.live.frame_start) /
+                self.live.period * tbins)
+        k = min(max(k, 0), tbins - 1)
+        bins = (np.asarray(spikes) * self.scale).astype(int)
+        self.counts[k] += np.bincount(bins, minlength=self.counts.shape[1])
+
+
+class LivePlot(NetworkOperation):
+    '''
+    Live plots refreshed every period of simulated time (which is also
+    the time window shown).  Add panels with raster, trace and
+    histogram, call start() before the network runs and before any
+    figure is opened in this process, add the LivePlot to the network
+    and call stop() at the end.  With filename (e.g. 'frame%04d.png')
+    frames are saved instead of shown.
+    '''
+    def __init__(self, period=1000*ms, slots=3, filename=None,
+                 figsize=(18, 10)):
+        self.period = float(period)
+        NetworkOperation.__init__(self, lambda: None,
+                                  clock=Clock(dt=period, order=-1))
+        self.n_slots = slots
+        self.filename = filename
+        self.figsize = figsize
+        self.panels = []        # (kind, title, shape, extent)
+        self._sources = []      # live array of each panel (or function)
+        self.contained_objects = []
+        self.frame_start = 0.
+        self.frames = self.dropped = 0
+        self._process = None
+
+    def raster(self, group, title='', bins=(100, 100)):
+        '''spike counts of group in bins (time bins, neuron bins)'''
+        counts = np.zeros(bins)
+        self.contained_objects.append(_SpikeCounter(self, group, counts))
+        self.panels.append(('raster', title, bins, len(group)))
+        self._sources.append(counts)
+
+    def trace(self, group, var, indices, points=200, title=''):
+        '''var of the neurons indices of group, at points per period'''
+        values = np.zeros((len(indices), points))
+        x = group.state_(var)
+        indices = np.asarray(indices)
+        @network_operation(Clock(dt=self.period / points * second))
+        def sample(clock):
+            k = int(round((clock._t - self.frame_start) / self.period * points))
+            if 0 <= k < points:
+                values[:, k] = x[indices]
+        self.contained_objects.append(sample)
+        self.panels.append(('trace', title or var, values.shape, var))
+        self._sources.append(values)
+
+    def histogram(self, function, range, bins=50, title='', counts=False):
+        '''
+        histogram of the array returned by function(), over range; with
+        counts, function() returns the bin counts themselves (e.g. the
+        histogram of a WeightStats)
+        '''
+        range = (float(range[0]), float(range[1]))
+        self.panels.append(('histogram', title, (bins,), range))
+        if counts:
+            self._sources.append(function)
+        else:
+            self._sources.append(
+                lambda: np.histogram(function(), bins, range)[0])
+
+    def start(self):
+        '''allocate the shared slots and start the plotting process'''
+        size = sum(int(np.prod(shape)) for _, _, shape, _ in self.panels)
+        self._shared = [multiprocessing.RawArray('d', max(size, 1))
+                        for _ in range(self.n_slots)]
+        self._slots = [_slot_views(s, self.panels) for s in self._shared]
+        self._ready = multiprocessing.Queue()
+        self._free = multiprocessing.Queue()
+        for k in range(self.n_slots):
+            self._free.put(k)
+        self._process = multiprocessing.Process(
+            target=_plot_frames,
+            args=(self.panels, self._shared, self._ready, self._free,
+                  self.filename, self.figsize))
+        self._process.daemon = True
+        self._process.start()
+
+    def __call__(self):
+        t = self.clock._t
+        # no frame for the first call (or the first after a restore)
+        if abs(t - self.frame_start - self.period) < 1e-9:
+            self._publish(self.frame_start, t)
+        self.frame_start = t
+
+    def _publish(self, t0, t1):
+        try:
+            k = self._free.get_nowait()
+        except Empty:
+            k = None
+        if k is None or self._process is None:
+            self.dropped += 1
+        else:
+            for view, source in zip(self._slots[k], self._sources):
+                view[...] = source() if callable(source) else source
+            self._ready.put((k, t0, t1))
+            self.frames += 1
+        for source in self._sources:
+            if not callable(source):
+                source[...] = 0
+
+    def stop(self, wait=True):
+        '''
+        tell the plotter that the run is over; with wait, block until
+        its window is closed
+        '''
+        if self._process is None:
+            return
+        self._ready.put(None)
+        if wait:
+            self._process.join()
+        self._process = None
+
+
+def _slot_views(shared, panels):
+    '''numpy views of each panel in a shared slot'''
+    data = np.frombuffer(shared, dtype=float)
+    views, pos = [], 0
+    for _, _, shape, _ in panels:
+        n = int(np.prod(shape))
+        views.append(data[pos:pos + n].reshape(shape))
+        pos += n
+    return views
+
+
+def _plot_frames(panels, shared, ready, free, filename, figsize):
+    '''plotting process: draw each frame, then give its slot back'''
+    import matplotlib.pyplot as plt
+    if filename is not None:
+        plt.switch_backend('Agg')
+    slots = [_slot_views(s, panels) for s in shared]
+    if filename is None:
+        plt.ion()
+    fig = plt.figure(figsize=figsize)
+    rows = (len(panels) + 1) // 2
+    axes = [fig.add_subplot(rows, 2, k + 1) for k in range(len(panels))]
+    fig.subplots_adjust(hspace=0.35)
+    frame = 0
+    while True:
+        msg = ready.get()
+        if msg is None:
+            break
+        k, t0, t1 = msg
+        for ax, (kind, title, shape, extra), data in zip(axes, panels,
+                                                         slots[k]):
+            ax.cla()
+            if kind == 'raster':
+                ax.imshow(data.T, aspect='auto', origin='lower',
+                          cmap='gray_r', interpolation='nearest',
+                          extent=[t0*1e3, t1*1e3, 0, extra])
+                ax.set_xlabel('time (ms)')
+                ax.set_ylabel('neuron')
+            elif kind == 'trace':
+                t = np.linspace(t0, t1, shape[1], endpoint=False)
+                ax.plot(t, data.T)
+                ax.set_xlabel('time (s)')
+                ax.set_ylabel(extra)
+            else:
+                edges = np.linspace(extra[0], extra[1], shape[0] + 1)
+                ax.bar(edges[:-1], data, width=np.diff(edges), align='edge')
+                ax.set_ylabel('count')
+            ax.set_title(title)
+        if filename is not None:
+            fig.savefig(filename % frame)
+        else:
+            plt.pause(0.001)
+        # the artists refer to the slot's memory until drawn
+        free.put(k)
+        frame += 1
+    if filename is None:
+        plt.ioff()
+        plt.show()
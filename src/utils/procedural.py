@@ -0,0 +1,189 @@
+'''
+Procedural (on-the-fly) random connectivity
+
+The synapses of each source neuron are regenerated whenever they are
+needed from a counter-based hash of (seed, source id), so a random
+connection never has to be stored.  The same generator also builds
+ordinary sparse matrices, which is what makes a procedural network and
+its materialized twin bit-identical for a given seed.
+
+Targets of a row are drawn by geometric skipping: each pair (i,j) is
+connected independently with probability p, as in connect_random, and
+the cost of a row is proportional to its fan-out, not to the size of
+the target group.
+'''
+import numpy as np
+from brian import *
+from scipy.sparse import csr_matrix
+
+_GAMMA = np.uint64(0x9E3779B97F4A7C15)
+_M1 = np.uint64(0xBF58476D1CE4E5B9)
+_M2 = np.uint64(0x94D049BB133111EB)
+_WEIGHT_STREAM = np.uint64(0x5851F42D4C957F2D)
+
+
+def _mix(z):
+    '''splitmix64 finalizer on a uint64 array'''
+    z = (z ^ (z >> np.uint64(30))) * _M1
+    z = (z ^ (z >> np.uint64(27))) * _M2
+    return z ^ (z >> np.uint64(31))
+
+def _row_keys(seed, rows, stream=np.uint64(0)):
+    '''one 64 bit key per row, for the given seed and stream'''
+    s = _mix(np.array([seed], dtype=np.uint64) ^ stream)
+    return _mix(s ^ np.asarray(rows, dtype=np.uint64))
+
+def _uniform(keys, counters):
+    '''uniform doubles in (0,1], one for each (key,counter) pair'''
+    h = _mix(keys + (counters + np.uint64(1)) * _GAMMA)
+    return ((h >> np.uint64(11)) + np.uint64(1)) * 2.0**-53
+
+def _block_size(m, p):
+    '''number of draws per row and round, enough for most rows in one'''
+    f = p * m
+    return int(min(f + 3*np.sqrt(f) + 8, m + 1))
+
+def procedural_rows(seed, rows, m, p):
+    '''
+    regenerate the targets of the given rows
+
+    seed - connectivity seed
+    rows - source neuron ids (local to the source group)
+    m - target population size
+    p - probability of connection
+
+    returns (counts, indices): the number of targets of each row and
+    the concatenated, per-row sorted target ids
+    '''
+    rows = np.asarray(rows, dtype=np.uint64)
+    n = rows.shape[0]
+    if p <= 0 or m == 0 or n == 0:
+        return np.zeros(n, dtype=int), np.zeros(0, dtype=int)
+    keys = _row_keys(seed, rows)
+    B = _block_size(m, p)
+    draws = np.arange(B, dtype=np.uint64)
+    logq = np.log1p(-p) if p < 1 else -np.inf
+
+    last = -np.ones(n, dtype=np.int64)
+    counter = np.zeros(n, dtype=np.uint64)
+    active = np.arange(n)
+    found_rows, found_ind = [], []
+    while active.shape[0]:
+        u = _uniform(keys[active][:,None], counter[active][:,None] + draws)
+        step = np.floor(np.log(u) / logq).astype(np.int64) + 1
+        pos = last[active][:,None] + np.cumsum(step, axis=1)
+        valid = pos < m
+        r, k = np.nonzero(valid)
+        found_rows.append(active[r])
+        found_ind.append(pos[r,k])
+        last[active] = pos[:,-1]
+        counter[active] += np.uint64(B)
+        active = active[valid[:,-1]]
+
+    found_rows = np.concatenate(found_rows)
+    found_ind = np.concatenate(found_ind)
+    if len(found_ind) and len(found_rows) > 1:
+        # rows that needed several rounds: regroup them, keeping order
+        order = np.argsort(found_rows, kind='mergesort')
+        found_rows, found_ind = found_rows[order], found_ind[order]
+    return np.bincount(found_rows, minlength=n), found_ind
+
+def procedural_weights(seed, rows, counts, indices, weight):
+    '''
+    weights of the synapses returned by procedural_rows
+
+    weight is either a value, or a pair (min,max) in which case each
+    synapse (i,j) gets a uniform weight hashed from (seed,i,j)
+    '''
+    if isinstance(weight, tuple):
+        wmin, wmax = float(weight[0]), float(weight[1])
+        keys = np.repeat(_row_keys(seed, rows, _WEIGHT_STREAM), counts)
+        u = _uniform(keys, np.asarray(indices, dtype=np.uint64))
+        return wmin + (wmax-wmin)*(1.0-u)
+    return np.ones(len(indices)) * float(weight)
+
+def procedural_random_matrix(n, m, p, weight=1., seed=0, chunk=2**22):
+    '''
+    materialize a procedural random (n,m) connectivity block as a CSR
+    matrix, identical synapse for synapse to what ProceduralConnection
+    regenerates with the same arguments
+    '''
+    rows_per_chunk = max(1, chunk // _block_size(m, p))
+    counts, indices, data = [], [], []
+    for start in xrange(0, n, rows_per_chunk):
+        rows = np.arange(start, min(n, start+rows_per_chunk))
+        c, ind = procedural_rows(seed, rows, m, p)
+        counts.append(c)
+        indices.append(ind)
+        data.append(procedural_weights(seed, rows, c, ind, weight))
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    if n:
+        np.cumsum(np.concatenate(counts), out=indptr[1:])
+        indices, data = np.concatenate(indices), np.concatenate(data)
+    else:
+        indices, data = np.zeros(0, dtype=int), np.zeros(0)
+    return csr_matrix((data, indices, indptr), (n,m))
+
+
+class ProceduralConnection(Connection):
+    '''
+    A Connection whose random synapses are not stored.  On every spike
+    the targets and weights of the spiking neurons are regenerated from
+    their seed, so memory use does not depend on the number of synapses.
+
+    Only connect_random is supported.  Spikes are added to the target in
+    the same order as Connection does, so for the same seeds a network
+    built with procedural_random_matrix and Connection.connect gives
+    bit-identical results.
+    '''
+    def __init__(self, source, target, state=0):
+        self.source = source
+        self.target = target
+        self.state = state
+        if isinstance(state, str):
+            self.nstate = target.get_var_index(state)
+        else:
+            self.nstate = state
+        self._nstate_mod = None
+        self.delay = 0
+        self.iscompressed = True
+        self._blocks = []
+
+    def connect_random(self, source=None, target=None, p=1., weight=1.,
+                       seed=None, sparseness=None):
+        '''
+        Connects the neurons in group P to neurons in group Q with
+        probability p and the given weight, a value or a (min,max)
+        pair.  If seed is None one is drawn from numpy.random.
+        '''
+        P = source or self.source
+        Q = target or self.target
+        if sparseness is not None: p = sparseness # synonym
+        if seed is None:
+            seed = np.random.randint(2**31)
+        i0, j0 = self.origin(P, Q)
+        self._blocks.append((i0, len(P), j0, len(Q), p, weight, seed))
+
+    def compress(self):
+        pass
+
+    def propagate(self, spikes):
+        if not len(spikes):
+            return
+        sources, targets, weights = [], [], []
+        for i0, n, j0, m, p, weight, seed in self._blocks:
+            s = spikes[(spikes >= i0) & (spikes < i0 + n)] - i0
+            if not len(s):
+                continue
+            counts, ind = procedural_rows(seed, s, m, p)
+            sources.append(np.repeat(s + i0, counts))
+            targets.append(ind + j0)
+            weights.append(procedural_weights(seed, s, counts, ind, weight))
+        if not sources:
+            return
+        sources = np.concatenate(sources)
+        targets = np.concatenate(targets)
+        weights = np.concatenate(weights)
+        # add row by row in spike order, like Connection.propagate
+        order = np.argsort(sources, kind='mergesort')
+        np.add.at(self.target._S[self.nstate], targets[order], weights[order])
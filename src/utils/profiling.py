@@ -0,0 +1,284 @@
+'''
+Per-operation profiling of a Brian network
+
+NetworkProfiler wraps the work of one simulation step of a network in
+timers and counters.  This covers the state updater, threshold and reset
+of each group, the propagate of each connection, spike monitor and
+logger, and each network operation (STDP, state monitors, input
+schedules, ...).  For each operation it counts calls, total, mean and
+max time and the spikes processed, and it prints a breakdown table or
+saves a JSON trace.  The trace can be opened in chrome://tracing.
+
+Nothing is wrapped until attach, and detach restores the original
+methods, so a network that is not profiled runs at full speed.  Brian
+rebuilds its update schedule when objects are added to the network, so
+attach after the network is complete.
+'''
+import json
+import timeit
+from brian import *
+from brian.monitor import Monitor
+from brian.stdp import STDP
+from brian.connections import MultiConnection
+
+_clock = timeit.default_timer
+
+
+class _Entry(object):
+    '''counters of one profiled operation'''
+    def __init__(self, name, kind, counted=False):
+        self.name = name
+        self.kind = kind
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        # None for operations that do not see spikes
+        self.spikes = 0 if counted else None
+
+    @property
+    def mean(self):
+        return self.total / self.calls if self.calls else 0.0
+
+    def as_dict(self):
+        return {'name': self.name, 'kind': self.kind, 'calls': self.calls,
+                'total_s': self.total, 'mean_s': self.mean,
+                'max_s': self.max, 'spikes': self.spikes}
+
+
+class NetworkProfiler(object):
+    '''
+    profiler of the operations of the Brian network net.
+
+    names -- optional dict of name: object (group, connection, monitor or
+    network operation) used to label the operations of these objects
+    (e.g. dict(Ce=Ce, stdp=stdp)); the others are labelled by function
+    or class name.
+    max_events -- number of timed calls kept for the JSON trace (0: none)
+
+    use:
+        profiler = NetworkProfiler(net, names=dict(Ce=Ce))
+        profiler.attach()
+        profiler.run(1*second)
+        print profiler.table()
+        profiler.save('profile.json')
+        profiler.detach()
+    '''
+    def __init__(self, net, names=None, max_events=100000):
+        self.net = net
+        self.max_events = max_events
+        self._names = dict((id(obj), name) for name, obj in
+                           (names or {}).items())
+        self.entries = []
+        self.runs = []
+        self.events = []
+        self._patched = []
+        self._schedule = None
+        self._t0 = None
+
+    def _labels(self, objects):
+        '''
+        (name, kind) of each object and of the objects it contains, by
+        id; contained objects take the kind and name prefix of their
+        container (e.g. the delayed_propagate of a connection)
+        '''
+        labels, counts = {}, {}
+        def visit(obj, parent):
+            if id(obj) in labels:
+                return
+            name = self._names.get(id(obj))
+            if parent is None:
+                kind = self._kind(obj)
+                name = name or self._default_name(obj)
+            else:
+                kind = parent[1]
+                name = name or parent[0] + '.' + self._default_name(obj)
+            # identical names get a number
+            n = counts[name] = counts.get(name, 0) + 1
+            if n > 1:
+                name = '%s#%d' % (name, n)
+            labels[id(obj)] = (name, kind)
+            for child in getattr(obj, 'contained_objects', []):
+                visit(child, (name, kind))
+        contained = set(id(child) for obj in objects
+                        for child in getattr(obj, 'contained_objects', []))
+        for obj in objects:
+            if id(obj) not in contained:
+                visit(obj, None)
+        for obj in objects:
+            visit(obj, None)
+        return labels
+
+    @staticmethod
+    def _kind(obj):
+        if isinstance(obj, STDP) or 'STDP' in type(obj).__name__:
+            return 'stdp'
+        if isinstance(obj, Monitor):
+            return 'monitor'
+        if isinstance(obj, Connection):
+            return 'propagation'
+        if isinstance(obj, NeuronGroup):
+            return 'group'
+        return 'operation'
+
+    @staticmethod
+    def _default_name(obj):
+        if type(obj) is NetworkOperation and obj.function is not None:
+            return obj.function.__name__
+        return type(obj).__name__
+
+    def _entry(self, name, kind, counted=False):
+        entry = _Entry(name, kind, counted)
+        self.entries.append(entry)
+        return entry
+
+    def _timed(self, f, entry, count=None):
+        '''f wrapped in a timer of entry; count(args, result) -> spikes'''
+        events = self.events
+        max_events = self.max_events
+        def timed(*args):
+            start = _clock()
+            result = f(*args)
+            elapsed = _clock() - start
+            entry.calls += 1
+            entry.total += elapsed
+            if elapsed > entry.max:
+                entry.max = elapsed
+            if count is not None:
+                entry.spikes += count(args, result)
+            if len(events) < max_events:
+                events.append((entry, start, elapsed))
+            return result
+        return timed
+
+    def _patch(self, obj, attr, wrapper):
+        had = attr in obj.__dict__
+        self._patched.append((obj, attr, had, obj.__dict__.get(attr)))
+        setattr(obj, attr, wrapper)
+
+    def attach(self):
+        '''wrap the operations of the network in timers'''
+        if self._patched:
+            return
+        net = self.net
+        if not net.prepared:
+            net.prepare()
+        # the connections merged by prepare are profiled one by one
+        top = [obj for obj in net.groups + net.connections + net.operations
+               if not isinstance(obj, MultiConnection)]
+        for C in net.connections:
+            if isinstance(C, MultiConnection):
+                top.extend(C.connections)
+        labels = self._labels(top)
+
+        for G in net.groups:
+            name, kind = labels[id(G)]
+            names = [name + ' state update', name + ' threshold',
+                     name + ' reset']
+            kinds = ['state update', 'threshold', 'reset']
+            if kind != 'group':
+                kinds = [kind] * 3
+            self._patch(G, '_state_updater', self._timed(
+                G._state_updater, self._entry(names[0], kinds[0])))
+            self._patch(G, '_threshold', self._timed(
+                G._threshold, self._entry(names[1], kinds[1], True),
+                lambda args, spikes: len(spikes)))
+            self._patch(G, '_resetfun', self._timed(
+                G._resetfun, self._entry(names[2], kinds[2], True),
+                lambda args, _: len(args[0].LS.lastspikes())))
+        for C in top:
+            if isinstance(C, Connection):
+                name, kind = labels[id(C)]
+                self._patch(C, 'propagate', self._timed(
+                    C.propagate, self._entry(name, kind, True),
+                    lambda args, _: len(args[0])))
+
+        # network operations are called from the update schedule
+        self._schedule = dict((k, list(v)) for k, v in
+                              net._update_schedule.items())
+        ops = dict((id(op), op) for op in net.operations)
+        timed = {}
+        for fs in net._update_schedule.values():
+            for k, f in enumerate(fs):
+                if id(f) in ops:
+                    if id(f) not in timed:
+                        timed[id(f)] = self._timed(f, self._entry(
+                            *labels[id(f)]))
+                    fs[k] = timed[id(f)]
+
+    def detach(self):
+        '''restore the original operations of the network'''
+        for obj, attr, had, value in reversed(self._patched):
+            if had:
+                setattr(obj, attr, value)
+            else:
+                delattr(obj, attr)
+        self._patched = []
+        if self._schedule is not None:
+            self.net._update_schedule.clear()
+            self.net._update_schedule.update(self._schedule)
+            self._schedule = None
+
+    def run(self, duration, **kwds):
+        '''net.run(duration, **kwds), with its wall-clock time recorded'''
+        self.attach()
+        if self._t0 is None:
+            self._t0 = _clock()
+        start = _clock()
+        self.net.run(duration, **kwds)
+        self.runs.append({'duration_s': float(duration),
+                          'wall_s': _clock() - start})
+
+    def reset(self):
+        '''clear the counters, runs and events'''
+        for entry in self.entries:
+            entry.calls, entry.total, entry.max = 0, 0., 0.
+            if entry.spikes is not None:
+                entry.spikes = 0
+        self.runs = []
+        del self.events[:]
+        self._t0 = None
+
+    def table(self):
+        '''the breakdown of the time of the runs by operation, as text'''
+        wall = sum(r['wall_s'] for r in self.runs)
+        entries = sorted(self.entries, key=lambda e: -e.total)
+        lines = ['%-40s %-12s %9s %9s %9s %9s %6s %10s' % (
+            'operation', 'kind', 'calls', 'total s', 'mean us', 'max ms',
+            '%', 'spikes')]
+        for e in entries:
+            if not e.calls:
+                continue
+            lines.append('%-40s %-12s %9d %9.3f %9.1f %9.3f %6.1f %10s' % (
+                e.name[:40], e.kind, e.calls, e.total, e.mean * 1e6,
+                e.max * 1e3, 100. * e.total / wall if wall else 0.,
+                '-' if e.spikes is None else e.spikes))
+        profiled = sum(e.total for e in entries)
+        if wall:
+            lines.append('%-40s %-12s %9s %9.3f %9s %9s %6.1f' % (
+                '(scheduler and unprofiled)', '', '', wall - profiled, '',
+                '', 100. * (wall - profiled) / wall))
+        kinds = {}
+        for e in entries:
+            kinds[e.kind] = kinds.get(e.kind, 0.) + e.total
+        lines.append('by kind: ' + ', '.join('%s %.3f s' % (k, t) for t, k in
+                                             sorted(((t, k) for k, t in
+                                                     kinds.items()),
+                                                    reverse=True)))
+        lines.append('%d runs, %.3f s simulated in %.3f s' % (
+            len(self.runs), sum(r['duration_s'] for r in self.runs), wall))
+        return '\n'.join(lines)
+
+    def as_dict(self):
+        '''the runs and counters, and the timed calls as trace events'''
+        t0 = self._t0 or 0.
+        return {'runs': self.runs,
+                'operations': [e.as_dict() for e in self.entries],
+                'traceEvents': [{'name': e.name, 'cat': e.kind, 'ph': 'X',
+                                 'ts': (start - t0) * 1e6,
+                                 'dur': elapsed * 1e6, 'pid': 0, 'tid': 0}
+                                for e, start, elapsed in self.events]}
+
+    def save(self, path):
+        '''write as_dict as JSON to path'''
+        with open(path, 'w') as f:
+            json.dump(self.as_dict(), f)
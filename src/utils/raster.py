@@ -0,0 +1,143 @@
+'''
+Raster plots of many spikes
+
+raster draws spikes from (neuron ids, times) arrays, a SpikeMonitor or
+a SpikeLog, either as one vectorized line of markers or, above a budget
+of max_points spikes, as an image of spike counts per (time bin,
+neuron bin).  Spikes are read in chunks and binned with bincount, so
+the memory is one chunk and the drawing cost is the same for a thousand
+or a billion spikes.  For a SpikeLog only the chunks of the time
+window are read (see utils.spike_log).
+'''
+import numpy as np
+from brian import *
+from spike_log import SpikeLog
+
+_CHUNK = 2**22
+
+
+def _chunks(source, tmin, tmax, imin, imax):
+    '''(neuron ids, times in s) of the spikes of source, in chunks'''
+    if isinstance(source, SpikeLog):
+        window = source.window(tmin, tmax)
+        for k in range(window.start, window.stop, _CHUNK):
+            records = source.data[k:min(k + _CHUNK, window.stop)]
+            yield _select(records['i'], records['step'] * source.dt,
+                          None, None, imin, imax)
+        return
+    if isinstance(source, SpikeMonitor):
+        i, t = source.it if source.nspikes else ([], [])
+    else:
+        i, t = source
+    i, t = np.asarray(i), np.asarray(t, dtype=float)
+    for k in range(0, len(i), _CHUNK):
+        yield _select(i[k:k + _CHUNK], t[k:k + _CHUNK], tmin, tmax, imin,
+                      imax)
+
+def _select(i, t, tmin, tmax, imin, imax):
+    keep = np.ones(len(i), dtype=bool)
+    for x, lo, hi in ((t, tmin, tmax), (i, imin, imax)):
+        if lo is not None:
+            keep &= x >= float(lo)
+        if hi is not None:
+            keep &= x < float(hi)
+    if keep.all():
+        return i, t
+    return i[keep], t[keep]
+
+def _count(source, tmin, tmax, imin, imax):
+    '''number of spikes to draw, read only if it cannot be known'''
+    if isinstance(source, SpikeLog) and imin is None and imax is None:
+        window = source.window(tmin, tmax)
+        return window.stop - window.start
+    return sum(len(i) for i, _ in _chunks(source, tmin, tmax, imin, imax))
+
+def _range(source, tmin, tmax, imin, imax):
+    '''tmin, tmax, imin, imax, with the missing ones from the data'''
+    if imin is None:
+        imin = 0
+    if imax is None:
+        if isinstance(source, SpikeLog):
+            imax = source.N
+        elif isinstance(source, SpikeMonitor):
+            imax = len(source.source)
+    if isinstance(source, SpikeLog):
+        # the records are in time order: the ends of the window are
+        # its first and last record
+        window = source.window(tmin, tmax)
+        if window.stop > window.start:
+            steps = source.data['step']
+            if tmin is None:
+                tmin = steps[window.start] * source.dt
+            if tmax is None:
+                tmax = (steps[window.stop - 1] + 1) * source.dt
+    if tmin is None or tmax is None or imax is None:
+        lo, hi, top = np.inf, -np.inf, 0
+        for i, t in _chunks(source, tmin, tmax, imin, imax):
+            if len(i):
+                lo, hi = min(lo, t.min()), max(hi, t.max())
+                top = max(top, i.max() + 1)
+        tmin = lo if tmin is None else tmin
+        # the window is [tmin, tmax): keep the last spike in it
+        tmax = np.nextafter(hi, np.inf) if tmax is None else tmax
+        imax = top if imax is None else imax
+    return float(tmin), float(tmax), int(imin), int(imax)
+
+
+def raster(source, tmin=None, tmax=None, imin=None, imax=None,
+           max_points=200000, bins=(1000, 500), mode='auto',
+           newfigure=False, title=None, **plotoptions):
+    '''
+    raster plot (time in ms) of the spikes of source, a (neuron ids,
+    times in s) pair of arrays, a SpikeMonitor or a SpikeLog, in the
+    window [tmin, tmax) for the neurons [imin, imax).
+
+    mode -- 'points': one marker per spike, or a regular subset of
+    max_points of them; 'image': spike counts in bins (time bins,
+    neuron bins); 'auto': points up to max_points spikes, else image.
+    plotoptions go to pylab.plot or pylab.imshow.
+    '''
+    import pylab
+    if newfigure:
+        pylab.figure()
+    n = _count(source, tmin, tmax, imin, imax)
+    if mode == 'auto':
+        mode = 'points' if n <= max_points else 'image'
+    if mode == 'points':
+        stride = max(1, int(np.ceil(float(n) / max_points)))
+        i, t, skip = [], [], 0
+        for ci, ct in _chunks(source, tmin, tmax, imin, imax):
+            # keep every stride-th spike across chunks
+            i.append(ci[skip::stride])
+            t.append(ct[skip::stride])
+            skip = (skip - len(ci)) % stride
+        i = np.concatenate(i) if i else np.zeros(0)
+        t = np.concatenate(t) if t else np.zeros(0)
+        plotoptions.setdefault('marker', '.')
+        plotoptions.setdefault('markersize', 2)
+        plotoptions.setdefault('linestyle', 'None')
+        pylab.plot(t * 1e3, i, **plotoptions)
+    elif mode == 'image':
+        tmin, tmax, imin, imax = _range(source, tmin, tmax, imin, imax)
+        tbins = bins[0]
+        nbins = min(bins[1], max(imax - imin, 1))
+        tscale = tbins / max(tmax - tmin, 1e-12)
+        nscale = float(nbins) / max(imax - imin, 1)
+        counts = np.zeros(tbins * nbins)
+        for i, t in _chunks(source, tmin, tmax, imin, imax):
+            tk = np.clip(((t - tmin) * tscale).astype(int), 0, tbins - 1)
+            nk = np.clip(((i - imin) * nscale).astype(int), 0, nbins - 1)
+            counts += np.bincount(nk * tbins + tk, minlength=len(counts))
+        plotoptions.setdefault('cmap', 'gray_r')
+        plotoptions.setdefault('interpolation', 'nearest')
+        pylab.imshow(counts.reshape(nbins, tbins), aspect='auto',
+                     origin='lower', extent=[tmin * 1e3, tmax * 1e3, imin,
+                                             imax], **plotoptions)
+    else:
+        raise ValueError('unknown raster mode ' + mode)
+    pylab.xlabel('Time (ms)')
+    pylab.ylabel('Neuron number')
+    if tmin is not None and tmax is not None:
+        pylab.xlim(float(tmin) * 1e3, float(tmax) * 1e3)
+    if title is not None:
+        pylab.title(title)
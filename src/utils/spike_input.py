@@ -0,0 +1,136 @@
+'''
+Input groups fed from spike arrays
+
+SpikeArrayGroup emits spikes given as two arrays, neuron ids and time
+steps, sorted by step (e.g. from RealToSpikes.binned_spikes).  A
+pointer into the arrays advances with the clock, so a step costs the
+spikes of that step, and no (neuron, time) tuples are ever built.
+SpikeGeneratorGroup, by contrast, unpacks lists of tuples, sorts them
+into a record array and keeps an offset for every time step up to the
+last spike.
+
+SpikeStreamGroup does the same for a stream of spike blocks (e.g. from
+RealToSpikes.stream), fetching the next block when the clock reaches
+the end of the current one, and prefetch produces the blocks in a
+background thread so that encoding overlaps with the simulation.
+'''
+import sys
+import threading
+import Queue
+import numpy as np
+from brian import *
+
+
+def spike_steps(neurons, times, dt):
+    '''
+    bin spike times (in seconds) to steps of dt as SpikeGeneratorGroup
+    does, and sort by step and neuron: returns (neurons, steps)
+    '''
+    neurons = np.asarray(neurons, dtype=np.int32)
+    steps = np.ceil(np.asarray(times, dtype=float) / float(dt))
+    steps = steps.astype(np.int64)
+    order = np.lexsort((neurons, steps))
+    return neurons[order], steps[order]
+
+
+class _ArrayThreshold(Threshold):
+    '''the spikes of the current step of a SpikeArrayGroup'''
+    def __init__(self, neurons, steps):
+        self.set_spikes(neurons, steps)
+
+    def set_spikes(self, neurons, steps):
+        self.neurons = np.asarray(neurons)
+        self.steps = np.asarray(steps, dtype=np.int64)
+        self.reinit()
+
+    def reinit(self):
+        self._ptr = 0
+
+    def __call__(self, P):
+        n = int(round(P.clock._t / float(P.clock.dt)))
+        steps, lo = self.steps, self._ptr
+        # the pointer is at step n unless the clock jumped (e.g. reinit
+        # or a restored checkpoint): then look it up again
+        if (lo < len(steps) and steps[lo] < n) or \
+                (lo > 0 and steps[lo - 1] >= n):
+            lo = steps.searchsorted(n, 'left')
+        hi = lo
+        if hi < len(steps) and steps[hi] == n:
+            hi = steps.searchsorted(n, 'right')
+        self._ptr = hi
+        # brian's spike queue takes int64 indices
+        return self.neurons[lo:hi].astype(int)
+
+
+class SpikeArrayGroup(NeuronGroup):
+    '''
+    Group of N neurons firing the spikes neurons[k] at the time steps
+    steps[k] of clock, with steps sorted (see spike_steps).  The arrays
+    are used as they are, without copies; set_spikes replaces them.
+    '''
+    def __init__(self, N, neurons, steps, clock=None):
+        NeuronGroup.__init__(self, N, model=LazyStateUpdater(),
+                             threshold=_ArrayThreshold(neurons, steps),
+                             clock=clock)
+
+    def set_spikes(self, neurons, steps):
+        self._threshold.set_spikes(neurons, steps)
+
+    def reinit(self):
+        NeuronGroup.reinit(self)
+        self._threshold.reinit()
+
+
+def prefetch(iterable, depth=1):
+    '''
+    iterate over iterable in a background thread, at most depth items
+    ahead of the consumer; exceptions are raised in the consumer
+    '''
+    queue = Queue.Queue(maxsize=depth)
+    done = object()
+    def fill():
+        try:
+            for item in iterable:
+                queue.put((item, None))
+            queue.put((done, None))
+        except Exception:
+            queue.put((done, sys.exc_info()))
+    thread = threading.Thread(target=fill)
+    thread.daemon = True
+    thread.start()
+    while True:
+        item, error = queue.get()
+        if item is done:
+            if error is not None:
+                raise error[0], error[1], error[2]
+            return
+        yield item
+
+
+class _StreamThreshold(_ArrayThreshold):
+    '''an _ArrayThreshold that moves on to the next block at its end'''
+    def __init__(self, blocks):
+        self.blocks = iter(blocks)
+        self.end = 0
+        _ArrayThreshold.__init__(self, [], [])
+
+    def __call__(self, P):
+        n = int(round(P.clock._t / float(P.clock.dt)))
+        while self.end is not None and n >= self.end:
+            neurons, steps, self.end = next(self.blocks,
+                                            ([], [], None))
+            self.set_spikes(neurons, steps)
+        return _ArrayThreshold.__call__(self, P)
+
+
+class SpikeStreamGroup(NeuronGroup):
+    '''
+    Group of N neurons firing the spikes of blocks, an iterator of
+    (neurons, steps, end) as yielded by RealToSpikes.stream: the sorted
+    spikes of the steps before end (None for the last block).  Blocks
+    are consumed once, in time order, so the group cannot be rerun.
+    '''
+    def __init__(self, N, blocks, clock=None):
+        NeuronGroup.__init__(self, N, model=LazyStateUpdater(),
+                             threshold=_StreamThreshold(blocks),
+                             clock=clock)
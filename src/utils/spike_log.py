@@ -0,0 +1,213 @@
+'''
+Append-only binary spike logs
+
+SpikeLogger is a SpikeMonitor that keeps (neuron, step) pairs in a
+fixed-size numpy block instead of a Python list, and appends the block
+to a file as one chunk whenever it fills up (or on flush).  SpikeLog
+memory-maps such a file and answers time-window and neuron-range
+queries; a per-chunk index of first/last time steps narrows each query
+to the chunks that can contain it, so only those pages are read.
+
+File layout:
+    <path>        64 byte header (magic, dt, number of neurons), then
+                  records of (int32 neuron, int32 step) in time order
+    <path>.idx    one int64 row per chunk: first record, number of
+                  records, first step, last step
+
+A chunk is written and flushed before its index row, so a log cut short
+by a crash is still consistent up to its last indexed chunk.
+'''
+import os
+import struct
+import numpy as np
+from brian import *
+
+SPIKE_RECORD = np.dtype([('i', '<i4'), ('step', '<i4')])
+_MAGIC = 'SPIKELOG'
+_HEADER = 64
+
+
+def _read_header(path):
+    with open(path, 'rb') as f:
+        header = f.read(_HEADER)
+    if header[:8] != _MAGIC:
+        raise ValueError('%s is not a spike log' % path)
+    dt, n = struct.unpack('<dq', header[8:24])
+    return dt, n
+
+
+def _read_index(path):
+    index = np.fromfile(path + '.idx', dtype='<i8')
+    return index[:len(index) // 4 * 4].reshape(-1, 4)
+
+
+class SpikeLogger(SpikeMonitor):
+    '''
+    Records the spikes of source to the spike log path.
+
+    block_size is the number of spikes buffered in memory (and the
+    largest chunk of the file).  With append=True an existing log is
+    continued, e.g. after resuming from a checkpoint (see truncate).
+    Call flush() to write the buffered spikes, close() at the end.
+    '''
+    def __init__(self, source, path, block_size=2**16, append=False):
+        SpikeMonitor.__init__(self, source, record=False)
+        self.path = path
+        self.dt = float(source.clock.dt)
+        self._block = np.empty(block_size, dtype=SPIKE_RECORD)
+        self._n = 0
+        if append and os.path.exists(path):
+            dt, n = _read_header(path)
+            if abs(dt - self.dt) > 1e-12 or n != len(source):
+                raise ValueError('%s was recorded with another dt or size'
+                                 % path)
+            index = _read_index(path)
+            self._records = int(index[-1, 0] + index[-1, 1]) if len(index) else 0
+            self.nspikes = self._records
+        else:
+            header = _MAGIC + struct.pack('<dq', self.dt, len(source))
+            with open(path, 'wb') as f:
+                f.write(header.ljust(_HEADER, '\0'))
+            open(path + '.idx', 'wb').close()
+            self._records = 0
+        self._data = open(path, 'r+b')
+        self._data.seek(_HEADER + self._records * SPIKE_RECORD.itemsize)
+        self._index = open(path + '.idx', 'ab')
+
+    def propagate(self, spikes):
+        n = len(spikes)
+        if not n:
+            return
+        self.nspikes += n
+        step = int(round(self.source.clock._t / self.dt))
+        while len(spikes):
+            k = min(len(spikes), len(self._block) - self._n)
+            chunk = self._block[self._n:self._n + k]
+            chunk['i'] = spikes[:k]
+            chunk['step'] = step
+            self._n += k
+            spikes = spikes[k:]
+            if self._n == len(self._block):
+                self.flush()
+
+    def flush(self):
+        '''append the buffered spikes to the file as one chunk'''
+        if self._data is None or not self._n:
+            return
+        block = self._block[:self._n]
+        block.tofile(self._data)
+        self._data.flush()
+        os.fsync(self._data.fileno())
+        row = np.array([self._records, self._n, block['step'][0],
+                        block['step'][-1]], dtype='<i8')
+        row.tofile(self._index)
+        self._index.flush()
+        self._records += self._n
+        self._n = 0
+
+    def truncate(self, t):
+        '''drop the logged spikes at times >= t'''
+        self.flush()
+        log = SpikeLog(self.path)
+        keep = log.window(tmax=t).stop
+        index = log.index[log.index[:, 0] < keep].copy()
+        if len(index):
+            last = index[-1]
+            last[1] = keep - last[0]
+            last[3] = log.data['step'][keep - 1]
+        del log
+        self._index.close()
+        index.astype('<i8').tofile(self.path + '.idx')
+        self._index = open(self.path + '.idx', 'ab')
+        self._data.truncate(_HEADER + keep * SPIKE_RECORD.itemsize)
+        self._data.seek(_HEADER + keep * SPIKE_RECORD.itemsize)
+        self._records = self.nspikes = keep
+
+    def close(self):
+        self.flush()
+        if self._data is not None:
+            self._data.close()
+            self._index.close()
+            self._data = self._index = None
+
+    def reinit(self):
+        self.flush()
+
+
+class SpikeLog(object):
+    '''
+    Read-only, memory-mapped view of a spike log.
+
+    data is the record array (fields 'i' and 'step'), index the chunk
+    index.  Times are in seconds; call refresh() to see chunks appended
+    since the log was opened.
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.dt, self.N = _read_header(path)
+        self.refresh()
+
+    def refresh(self):
+        self.index = _read_index(self.path)
+        n = int(self.index[:, 1].sum())
+        if n:
+            self.data = np.memmap(self.path, dtype=SPIKE_RECORD, mode='r',
+                                  offset=_HEADER, shape=(n,))
+        else:
+            self.data = np.zeros(0, dtype=SPIKE_RECORD)
+
+    def __len__(self):
+        return len(self.data)
+
+    def _step(self, t, default):
+        if t is None:
+            return default
+        return int(np.ceil(float(t) / self.dt - 1e-6))
+
+    def window(self, tmin=None, tmax=None):
+        '''slice of data with the spikes in [tmin, tmax)'''
+        s0 = self._step(tmin, 0)
+        s1 = self._step(tmax, np.iinfo(np.int32).max)
+        first, last = self.index[:, 2], self.index[:, 3]
+        # chunks are in time order: find those overlapping [s0, s1)
+        c0 = np.searchsorted(last, s0, 'left')
+        c1 = np.searchsorted(first, s1, 'left')
+        if c0 >= c1:
+            return slice(0, 0)
+        lo = int(self.index[c0, 0])
+        hi = int(self.index[c1 - 1, 0] + self.index[c1 - 1, 1])
+        steps = self.data['step'][lo:hi]
+        return slice(lo + int(np.searchsorted(steps, s0, 'left')),
+                     lo + int(np.searchsorted(steps, s1, 'left')))
+
+    def spikes(self, tmin=None, tmax=None, imin=None, imax=None):
+        '''
+        (neuron ids, times in seconds) of the spikes in [tmin, tmax)
+        of the neurons in [imin, imax)
+        '''
+        records = self.data[self.window(tmin, tmax)]
+        i, step = records['i'], records['step']
+        if imin is not None or imax is not None:
+            keep = np.ones(len(i), dtype=bool)
+            if imin is not None:
+                keep &= i >= imin
+            if imax is not None:
+                keep &= i < imax
+            i, step = i[keep], step[keep]
+        return np.array(i), step * self.dt
+
+    def times(self, i, tmin=None, tmax=None):
+        '''spike times of neuron i in [tmin, tmax)'''
+        return self.spikes(tmin, tmax, i, i + 1)[1]
+
+
+def log_raster_plot(log, tmin=None, tmax=None, imin=None, imax=None,
+                    newfigure=False, title=None, **plotoptions):
+    '''
+    raster plot (time in ms) of a window of a SpikeLog, in the manner
+    of raster_plot, reading only the chunks of that window (see
+    utils.raster for the options, e.g. max_points)
+    '''
+    from raster import raster
+    raster(log, tmin, tmax, imin, imax, newfigure=newfigure, title=title,
+           **plotoptions)
@@ -0,0 +1,135 @@
+'''
+Distance-limited connectivity between cells placed in space
+
+Cells are placed uniformly in a box (place_cells), and spatial_connect
+connects each source to targets within a radius only, each pair within
+the radius independently with the same probability.  That probability
+is chosen so that the mean convergence is the p*N_src of a random
+connection with probability p, and the mean divergence its p*N_tgt.
+The box is periodic, so cells near its faces have as many partners in
+range as cells in its middle, and these means hold for every cell.
+
+Pairs are found through SpatialGrid, a uniform grid of cells at least
+as large as the radius: the partners of a point lie in the 27 grid
+cells around it.  The candidates of the 27 cells are not enumerated
+but sampled with the connection probability by geometric skipping,
+before the distance test.  So the time and memory of a build are
+O(N x local fan-out), never O(N_src x N_tgt).  The result is a CSR
+matrix, ready for connect_csr.
+'''
+import numpy as np
+from brian import *
+from scipy.sparse import csr_matrix
+
+
+def place_cells(n, box, seed=None):
+    '''
+    n positions (an (n, 3) array, in metres) drawn uniformly in the box
+    [0, box)^3; box is a length or a (x, y, z) tuple of lengths
+    '''
+    rng = np.random if seed is None else np.random.RandomState(seed)
+    return rng.rand(int(n), 3) * _box(box)
+
+def _box(box):
+    return np.array([float(x) for x in (box if np.ndim(box) else [box]*3)])
+
+
+class SpatialGrid(object):
+    '''
+    index of points (an (n, 3) array) in the periodic box [0, box)^3,
+    in a grid of cells of at least cell_size on each side
+    '''
+    def __init__(self, positions, box, cell_size):
+        self.positions = np.asarray(positions, dtype=float)
+        self.box = _box(box)
+        self.shape = np.maximum(1, np.floor(self.box / float(cell_size)))
+        self.shape = self.shape.astype(np.int64)
+        self.cell = self.box / self.shape
+        ids = self._ids(self._cells(self.positions))
+        # points sorted by cell, and the first point of each cell
+        self.order = np.argsort(ids, kind='mergesort')
+        counts = np.bincount(ids, minlength=int(np.prod(self.shape)))
+        self.start = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.start[1:])
+        # the distinct neighbour cells (fewer than 27 in a thin grid)
+        steps = [np.arange(-1, 2) if n >= 3 else np.arange(n)
+                 for n in self.shape]
+        self.offsets = np.array([(x, y, z) for x in steps[0]
+                                 for y in steps[1] for z in steps[2]])
+
+    def _cells(self, points):
+        cells = np.floor(points / self.cell).astype(np.int64)
+        return np.minimum(cells % self.shape, self.shape - 1)
+
+    def _ids(self, cells):
+        nx, ny, nz = self.shape
+        return (cells[:, 0] * ny + cells[:, 1]) * nz + cells[:, 2]
+
+    def sample(self, points, p, radius, rng=np.random):
+        '''
+        (k, i) pairs of points[k] and indexed points i at most radius
+        (<= cell size) apart, in the periodic box, each pair taken
+        independently with probability p, sorted by k
+        '''
+        points = np.asarray(points, dtype=float)
+        if not len(points) or not len(self.positions) or p <= 0:
+            return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+        around = self._cells(points)[:, None, :] + self.offsets
+        ids = self._ids((around % self.shape).reshape(-1, 3))
+        first = self.start[ids]
+        counts = self.start[ids + 1] - first
+        ends = np.cumsum(counts)
+        # Bernoulli(p) over the concatenated candidates of all points:
+        # the gaps between taken candidates are geometric
+        total = int(ends[-1])
+        taken = []
+        last = -1
+        while last < total:
+            size = int(p * (total - last) + 3 * np.sqrt(p * total) + 16)
+            gaps = rng.geometric(p, size) if p < 1 else np.ones(size, int)
+            pos = last + np.cumsum(gaps)
+            taken.append(pos[pos < total])
+            last = pos[-1]
+        pos = np.concatenate(taken)
+        cell = np.searchsorted(ends, pos, 'right')
+        i = self.order[first[cell] + pos - (ends[cell] - counts[cell])]
+        k = cell // len(self.offsets)
+        # distance in the periodic box (minimum image)
+        d = self.positions[i] - points[k]
+        d -= self.box * np.round(d / self.box)
+        near = (d * d).sum(1) <= float(radius) ** 2
+        return k[near], i[near]
+
+
+def spatial_connect(source_positions, target_positions, box, p, radius,
+                    weight=1., seed=None, chunk=2**20):
+    '''
+    distance-limited random connectivity between cells in the periodic
+    box, as an (N_src, N_tgt) CSR matrix of the given weight, with the
+    mean convergence p*N_src and divergence p*N_tgt of a random
+    connection with probability p.  each pair of cells within radius is
+    connected with probability p*V/(4/3*pi*radius**3), V the volume of
+    the box, and all of them are if that is above 1.
+    '''
+    rng = np.random if seed is None else np.random.RandomState(seed)
+    n, m = len(source_positions), len(target_positions)
+    volume = np.prod(_box(box))
+    ball = min(4. / 3 * np.pi * float(radius) ** 3, volume)
+    p_local = min(1., p * volume / ball)
+    grid = SpatialGrid(target_positions, box, radius)
+    # sources in chunks of about chunk grid cells and sampled targets
+    per_source = len(grid.offsets) * m / float(np.prod(grid.shape))
+    step = max(1, int(chunk / (len(grid.offsets) + p_local * per_source)))
+    rows, cols = [], []
+    for i0 in xrange(0, n, step):
+        i, j = grid.sample(source_positions[i0:i0 + step], p_local, radius,
+                           rng)
+        order = np.lexsort((j, i))
+        rows.append(i[order] + i0)
+        cols.append(j[order])
+    rows = np.concatenate(rows) if rows else np.zeros(0, dtype=int)
+    cols = np.concatenate(cols) if cols else np.zeros(0, dtype=int)
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+    return csr_matrix((np.ones(len(cols)) * float(weight),
+                       cols.astype(np.int32), indptr), (n, m))